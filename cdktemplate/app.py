@@ -4,23 +4,206 @@
 # SPDX-License-Identifier: MIT-0
 
 from aws_cdk import core
-import os
+import functools
+import importlib
+import sys
+import time
 
-os.environ["AMAZON_REVIEWS_BUCKET_ARN"] = "arn:aws:s3:::amazon-reviews-pds"
-os.environ["ROLE_NAME_PREFIX"] = "SageMakerStudio_"
-os.environ["ATHENA_QUERY_BUCKET_PREFIX"] = "sagemaker-audit-control-query-results-"
+from sagemaker_studio_audit_control.amazon_reviews_schema import PARTITION_KEYS
+from sagemaker_studio_audit_control.config import AuditControlConfig
+from sagemaker_studio_audit_control.user_manifest import load_user_manifest, USER_MANIFEST_PATH
+from sagemaker_studio_audit_control.sharding import USERS_PER_TEMPLATE, PROFILES_PER_TEMPLATE, plan_shards, shard_stack_id, shard_template_name, check_template_limits
 
-os.environ["NESTED_STACK_URL_PREFIX"] = "https://aws-ml-blog.s3.amazonaws.com/artifacts/sagemaker-studio-audit-control/"
+app = core.App()
+config = AuditControlConfig.from_context(app.node)
 
-from sagemaker_studio_audit_control.sagemaker_studio_audit_control_stack import SageMakerStudioAuditControlStack
-from sagemaker_studio_audit_control.amazon_reviews_dataset_stack  import AmazonReviewsDatasetStack
-from sagemaker_studio_audit_control.data_scientist_users_stack import DataScientistUsersStack
-from sagemaker_studio_audit_control.sagemaker_studio_stack import SageMakerStudioStack
+def context_flag(name):
+	return str(app.node.try_get_context(name)).lower() == "true"
 
-app = core.App()
-SageMakerStudioAuditControlStack(app, "sagemaker-studio-audit-control")
-AmazonReviewsDatasetStack(app, "amazon-reviews-dataset-stack")
-DataScientistUsersStack(app, "data-scientist-users-stack")
-SageMakerStudioStack(app, "sagemaker-studio-stack")
+# Print the import, shard planning and build time of every stack to stderr with "-c report_timing=true".
+report_timing = context_flag("report_timing")
+
+def timed(name):
+	"""Decorator printing the time taken by the first call of a function when report_timing is set."""
+	def decorator(function):
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			start = time.time()
+			result = function(*args, **kwargs)
+			if report_timing:
+				print("%s: %.2fs" % (name, time.time() - start), file = sys.stderr)
+			return result
+		return wrapper
+	return decorator
+
+def stack_class(module_name, class_name):
+	"""Imports a stack class the first time it is needed."""
+	start = time.time()
+	module = importlib.import_module("sagemaker_studio_audit_control." + module_name)
+	if report_timing:
+		print("import %s: %.2fs" % (module_name, time.time() - start), file = sys.stderr)
+	return getattr(module, class_name)
+
+@functools.lru_cache()
+def users():
+	return load_user_manifest(app.node.try_get_context("user_manifest") or USER_MANIFEST_PATH)
+
+# Split users across nested stacks when they do not fit in a single template.
+# Manifests up to the static bounds of sharding.py always fit, so they are not measured. Larger
+# ones are measured with the user with the longest column list as the cost of one user.
+# "-c measure_shards=true" measures them whatever their size, e.g. to compare synth times.
+
+def static_capacity(capacity):
+	return 0 if context_flag("measure_shards") else capacity
+
+@functools.lru_cache()
+@timed("shards data-scientist-users-stack")
+def user_shards():
+	return plan_shards(users(),
+		lambda scope, shard_users: stack_class("data_scientist_users_stack", "DataScientistUsersStack")(scope, "data-scientist-users-stack", users = shard_users, config = config),
+		max(users(), key = lambda user: len(user.columns), default = None),
+		static_capacity(USERS_PER_TEMPLATE))
+
+@functools.lru_cache()
+@timed("shards sagemaker-studio-stack")
+def profile_shards():
+	return plan_shards(users(),
+		lambda scope, shard_users: stack_class("sagemaker_studio_stack", "SageMakerStudioStack")(scope, "sagemaker-studio-stack", users = shard_users, config = config),
+		max(users(), key = lambda user: len(user.columns), default = None),
+		static_capacity(PROFILES_PER_TEMPLATE))
+
+# Partitions of the Amazon Reviews table: the static product_category list by default, or
+# discovered from the bucket listing with "-c partition_discovery=true". The cached listing is
+# refreshed once a day, or as soon as the ETag of the object given with
+# "-c partition_etag_key=<key>" changes.
+
+@functools.lru_cache()
+def discovered_partitions():
+	if not context_flag("partition_discovery"):
+		return None
+	from sagemaker_studio_audit_control.partition_discovery import cached_discover_partitions
+	return cached_discover_partitions(
+		bucket = config.amazon_reviews_bucket_name,
+		prefix = "parquet/",
+		partition_keys = PARTITION_KEYS,
+		etag_key = app.node.try_get_context("partition_etag_key"))
+
+def partitions():
+	if discovered_partitions() is None:
+		return None
+	from sagemaker_studio_audit_control import partition_discovery
+	return partition_discovery.partition_values(discovered_partitions())
+
+def partition_locations():
+	if discovered_partitions() is None:
+		return None
+	from sagemaker_studio_audit_control import partition_discovery
+	return partition_discovery.partition_locations(discovered_partitions(), PARTITION_KEYS)
+
+# With "-c hashed_templates=true", the nested stack templates are synthesized into template_assets/
+# under content-hash names and the parent stack points at those names. Templates whose inputs
+# did not change are reused from the previous build without being synthesized. Adding
+# "-c publish_templates=true" uploads the new templates to nested_stack_url_prefix.
+
+def template_urls():
+	if not context_flag("hashed_templates"):
+		return None
+
+	from sagemaker_studio_audit_control.template_assets import TemplateAssets
+	AmazonReviewsDatasetStack = stack_class("amazon_reviews_dataset_stack", "AmazonReviewsDatasetStack")
+	DataScientistUsersStack = stack_class("data_scientist_users_stack", "DataScientistUsersStack")
+	SageMakerStudioStack = stack_class("sagemaker_studio_stack", "SageMakerStudioStack")
+
+	template_assets = TemplateAssets(extra_files = [app.node.try_get_context("user_manifest") or USER_MANIFEST_PATH])
+	urls = {}
+
+	urls["AmazonReviewsDatasetStack"] = config.nested_stack_url_prefix + template_assets.build(
+		"AmazonReviewsDatasetStack",
+		lambda scope: AmazonReviewsDatasetStack(scope, "amazon-reviews-dataset-stack",
+			partitions = partitions(),
+			partition_locations = partition_locations(),
+			config = config),
+		partitions = partitions(), partition_locations = partition_locations(), config = config)
+
+	for index, shard_users in enumerate(user_shards()):
+		urls[shard_template_name("DataScientistUsersStack", index)] = config.nested_stack_url_prefix + template_assets.build(
+			shard_template_name("DataScientistUsersStack", index),
+			lambda scope, index = index, shard_users = shard_users: DataScientistUsersStack(scope, "data-scientist-users-stack",
+				users = shard_users,
+				create_shared_resources = index == 0,
+				config = config),
+			users = shard_users, index = index, config = config)
+
+	for index, shard_users in enumerate(profile_shards()):
+		urls[shard_template_name("SageMakerStudioStack", index)] = config.nested_stack_url_prefix + template_assets.build(
+			shard_template_name("SageMakerStudioStack", index),
+			lambda scope, index = index, shard_users = shard_users: SageMakerStudioStack(scope, "sagemaker-studio-stack",
+				users = shard_users,
+				create_domain = index == 0,
+				config = config),
+			users = shard_users, index = index, config = config)
+
+	if context_flag("publish_templates"):
+		from sagemaker_studio_audit_control.template_assets import s3_location
+		template_assets.publish(*s3_location(config.nested_stack_url_prefix))
+
+	return urls
+
+# Stack registry: each entry builds one stack (or all shards of it) into the app.
+
+def build_amazon_reviews_dataset_stack():
+	AmazonReviewsDatasetStack = stack_class("amazon_reviews_dataset_stack", "AmazonReviewsDatasetStack")
+	AmazonReviewsDatasetStack(app, "amazon-reviews-dataset-stack",
+		partitions = partitions(),
+		partition_locations = partition_locations(),
+		config = config)
+
+def build_data_scientist_users_stack():
+	DataScientistUsersStack = stack_class("data_scientist_users_stack", "DataScientistUsersStack")
+	for index, shard_users in enumerate(user_shards()):
+		DataScientistUsersStack(app, shard_stack_id("data-scientist-users-stack", index),
+			users = shard_users,
+			create_shared_resources = index == 0,
+			config = config)
+
+def build_sagemaker_studio_stack():
+	SageMakerStudioStack = stack_class("sagemaker_studio_stack", "SageMakerStudioStack")
+	for index, shard_users in enumerate(profile_shards()):
+		SageMakerStudioStack(app, shard_stack_id("sagemaker-studio-stack", index),
+			users = shard_users,
+			create_domain = index == 0,
+			config = config)
+
+def build_sagemaker_studio_audit_control_stack():
+	SageMakerStudioAuditControlStack = stack_class("sagemaker_studio_audit_control_stack", "SageMakerStudioAuditControlStack")
+	SageMakerStudioAuditControlStack(app, "sagemaker-studio-audit-control",
+		users = users(),
+		user_shards = user_shards(),
+		profile_shards = profile_shards(),
+		template_urls = template_urls(),
+		config = config)
+
+STACKS = {
+	"sagemaker-studio-audit-control": build_sagemaker_studio_audit_control_stack,
+	"amazon-reviews-dataset-stack": build_amazon_reviews_dataset_stack,
+	"data-scientist-users-stack": build_data_scientist_users_stack,
+	"sagemaker-studio-stack": build_sagemaker_studio_stack
+}
+
+# Only the stacks listed in "-c stacks=<name>,<name>" are imported and built (all of them by default).
+
+selected_stacks = app.node.try_get_context("stacks")
+selected_stacks = selected_stacks.split(",") if selected_stacks else list(STACKS)
+
+for name in selected_stacks:
+	if name not in STACKS:
+		raise ValueError("Unknown stack %s. Valid stacks: %s" % (name, ", ".join(STACKS)))
+	start = time.time()
+	STACKS[name]()
+	if report_timing:
+		print("build %s: %.2fs" % (name, time.time() - start), file = sys.stderr)
 
-app.synth()
\ No newline at end of file
+start = time.time()
+check_template_limits(app.synth())
+if report_timing:
+	print("synth: %.2fs" % (time.time() - start), file = sys.stderr)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import datetime
+import glob
+import sys
+import tempfile
+import time
+
+from sagemaker_studio_audit_control.audit.ingest import IngestManifest, ingest, list_local_objects, list_s3_objects, s3_fetcher
+from sagemaker_studio_audit_control.audit.rollups import AUDITED_ACCESS_RETENTION_DAYS, AuditRollups, REPORTS
+from sagemaker_studio_audit_control.audit.sql import ColumnExtractor
+from sagemaker_studio_audit_control.query.results import COMPACT_AFTER_DAYS, ResultCompactor, apply_lifecycle
+
+AUDIT_DB_PATH = "audit.db"
+
+def ingest_command(args):
+	manifest = IngestManifest(args.db)
+	rollups = AuditRollups(manifest.db)
+
+	detector = None
+	if args.templates:
+		from sagemaker_studio_audit_control.audit.grants import GrantIndex
+		from sagemaker_studio_audit_control.audit.violations import ViolationDetector
+		detector = ViolationDetector(GrantIndex.from_templates(sorted(p for pattern in args.templates for p in glob.glob(pattern))))
+
+	store = None
+	stored = []
+	if args.store:
+		from sagemaker_studio_audit_control.audit.store import AuditStore, WRITE_BATCH_SIZE
+		store = AuditStore(args.store)
+
+	def before_save():
+		# Writes to the store are idempotent: records written before an interrupted run are skipped when it is repeated.
+		rollups.flush()
+		rollups.prune(args.retention_days)
+		if store is not None:
+			store.write(stored)
+			stored.clear()
+
+	# Downloaded log objects are deleted once read, and the temporary directory at the end of the run.
+	fetch = None
+	download_dir = None
+	if args.source.startswith("s3://"):
+		bucket, _, prefix = args.source[len("s3://"):].partition("/")
+		objects = list_s3_objects(bucket, prefix)
+		if args.download_dir is None:
+			download_dir = tempfile.TemporaryDirectory()
+		fetch = s3_fetcher(bucket, args.download_dir or download_dir.name)
+	else:
+		objects = list_local_objects(args.source)
+
+	start = time.time()
+	count = 0
+	try:
+		for record in ingest(manifest, objects, fetch = fetch, processes = args.processes, before_save = before_save,
+				column_resolver = ColumnExtractor().columns):
+			if not rollups.add(record):
+				continue
+			if detector is not None:
+				violation = detector.check(record)
+				if violation is not None:
+					rollups.add_violation(violation)
+			if store is not None:
+				stored.append(record)
+				if len(stored) >= WRITE_BATCH_SIZE:
+					store.write(stored)
+					stored.clear()
+			count += 1
+	finally:
+		if download_dir is not None:
+			download_dir.cleanup()
+
+	manifest.close()
+	print("%d audit records ingested in %.1f s" % (count, time.time() - start), file = sys.stderr)
+
+def report_command(args):
+	manifest = IngestManifest(args.db)
+	rollups = AuditRollups(manifest.db)
+	start = time.time()
+	columns, rows = rollups.report(args.report, start = args.start, end = args.end, limit = args.limit)
+	elapsed = time.time() - start
+	print("\t".join(columns))
+	for row in rows:
+		print("\t".join(str(value) for value in row))
+	print("%d rows in %.1f ms" % (len(rows), elapsed * 1000), file = sys.stderr)
+	manifest.close()
+
+def lifecycle_command(args):
+	apply_lifecycle(args.bucket)
+	print("Lifecycle configuration applied to %s" % args.bucket, file = sys.stderr)
+
+def compact_command(args):
+	stats = ResultCompactor(args.bucket).compact(args.older_than_days)
+	print("%(Queries)d query results (%(Objects)d objects) of %(Days)d days compacted" % stats, file = sys.stderr)
+
+def lookup_command(args):
+	day = datetime.datetime.strptime(args.day, "%Y-%m-%d").date() if args.day else None
+	files = ResultCompactor(args.bucket).lookup(args.query_execution_id, day)
+	if files is None:
+		print("Query %s is not archived" % args.query_execution_id, file = sys.stderr)
+		sys.exit(1)
+	for name, content in sorted(files.items()):
+		print("%s\t%d bytes" % (name, len(content)))
+
+def main(args = None):
+	parser = argparse.ArgumentParser(description = "Audit data access of the SageMaker Studio data scientists.")
+	parser.add_argument("--db", default = AUDIT_DB_PATH, help = "SQLite file with the ingest manifest and the rollups")
+	commands = parser.add_subparsers(dest = "command")
+	commands.required = True
+
+	ingest_parser = commands.add_parser("ingest", help = "ingest new CloudTrail log files and update the rollups")
+	ingest_parser.add_argument("source", help = "local directory or s3://bucket/prefix of the trail")
+	ingest_parser.add_argument("--templates", nargs = "*", help = "synthesized templates with the Lake Formation grants, e.g. cdk.out/*.template.json")
+	ingest_parser.add_argument("--download-dir", help = "where to download S3 log objects (each is deleted once read; default: a temporary directory)")
+	ingest_parser.add_argument("--processes", type = int, help = "log parsing processes (default: one per CPU)")
+	ingest_parser.add_argument("--retention-days", type = int, default = AUDITED_ACCESS_RETENTION_DAYS,
+		help = "days the eventIDs of the accesses counted are kept, before the latest day, to skip duplicates")
+	ingest_parser.add_argument("--store", help = "directory of the Parquet audit store to append the new audit records to (requires pyarrow)")
+	ingest_parser.set_defaults(function = ingest_command)
+
+	report_parser = commands.add_parser("report", help = "print a report from the rollups")
+	report_parser.add_argument("report", choices = sorted(REPORTS))
+	report_parser.add_argument("--start", default = "0000-00-00", help = "first day (YYYY-MM-DD)")
+	report_parser.add_argument("--end", default = "9999-99-99", help = "last day (YYYY-MM-DD)")
+	report_parser.add_argument("--limit", type = int, default = 20, help = "rows of top-queries")
+	report_parser.set_defaults(function = report_command)
+
+	lifecycle_parser = commands.add_parser("results-lifecycle", help = "apply the lifecycle rules to the Athena query results bucket")
+	lifecycle_parser.add_argument("bucket", help = "e.g. sagemaker-audit-control-query-results-<region>-<account>")
+	lifecycle_parser.set_defaults(function = lifecycle_command)
+
+	compact_parser = commands.add_parser("compact-results", help = "archive old query results into per-day Parquet files")
+	compact_parser.add_argument("bucket")
+	compact_parser.add_argument("--older-than-days", type = int, default = COMPACT_AFTER_DAYS)
+	compact_parser.set_defaults(function = compact_command)
+
+	lookup_parser = commands.add_parser("lookup-result", help = "list the archived result files of a query execution")
+	lookup_parser.add_argument("bucket")
+	lookup_parser.add_argument("query_execution_id")
+	lookup_parser.add_argument("--day", help = "day the query ran (YYYY-MM-DD), to read its index directly")
+	lookup_parser.set_defaults(function = lookup_command)
+
+	args = parser.parse_args(args)
+	args.function(args)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Offline model of the partition lookup of query planning, with partitions registered in the Glue
+Data Catalog and with partition projection (the PartitionProjection parameter of the
+amazon-reviews-dataset-stack). With catalog partitions, the planner pages through GetPartitions
+with the pushed-down predicate; a mocked catalog answers each page after a fixed latency and
+evaluates the predicate over every partition of the table. With projection, the planner
+enumerates the enum values of the table properties, applies the predicate and substitutes the
+survivors into storage.location.template, without any call. The table is partitioned by
+product_category and day, for 1000 to 100000 partitions. Run from the cdktemplate directory:
+
+	python benchmarks/partition_planning_benchmark.py --partitions 1000 10000 100000 --latency 0.05
+"""
+
+import argparse
+import datetime
+import itertools
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, PROJECT_DIR)
+
+from sagemaker_studio_audit_control.amazon_reviews_schema import PARTITION_LIST
+from sagemaker_studio_audit_control.partition_discovery import partition_locations, projection_values
+
+PARTITION_KEYS = ["product_category", "day"]
+LOCATION = "s3://amazon-reviews-pds/parquet/"
+# GetPartitions returns at most 1000 partitions per page.
+PAGE_SIZE = 1000
+LATENCY = 0.05
+
+def days(count: int) -> list:
+	start = datetime.date(2015, 1, 1)
+	return [(start + datetime.timedelta(days = i)).isoformat() for i in range(count)]
+
+def table_partitions(count: int) -> dict:
+	"""Partitions of the table by path, as discover_partitions returns them: every category for as many days as needed."""
+	categories = PARTITION_LIST
+	values = itertools.product(days(-(-count // len(categories))), categories)
+	return { "product_category=%s/day=%s" % (category.replace("&", "%26"), day): [category, day]
+		for day, category in itertools.islice(values, count) }
+
+# Predicates of the queries, on the partition values by key.
+QUERIES = [
+	("all partitions", lambda p: True),
+	("one category", lambda p: p["product_category"] == "Books"),
+	("one month", lambda p: p["day"].startswith("2015-01")),
+	("one category, one day", lambda p: p["product_category"] == "Books" and p["day"] == "2015-01-15")
+]
+
+class MockCatalog(object):
+	"""Glue GetPartitions over registered partitions, each page answered after latency seconds."""
+
+	def __init__(self, partitions: dict, latency: float):
+		self.partitions = [(LOCATION + path, values) for path, values in sorted(partitions.items())]
+		self.latency = latency
+		self.calls = 0
+
+	def get_partitions(self, predicate, NextToken = 0):
+		self.calls += 1
+		time.sleep(self.latency)
+		matches = []
+		position = NextToken
+		while position < len(self.partitions) and len(matches) < PAGE_SIZE:
+			location, values = self.partitions[position]
+			if predicate(dict(zip(PARTITION_KEYS, values))):
+				matches.append({ "Values": values, "StorageDescriptor": { "Location": location } })
+			position += 1
+		response = { "Partitions": matches }
+		if position < len(self.partitions):
+			response["NextToken"] = position
+		return response
+
+def plan_catalog(catalog: MockCatalog, predicate) -> list:
+	locations = []
+	token = 0
+	while token is not None:
+		page = catalog.get_partitions(predicate, NextToken = token)
+		locations.extend(p["StorageDescriptor"]["Location"] for p in page["Partitions"])
+		token = page.get("NextToken")
+	return locations
+
+def projection_parameters(partitions: dict) -> dict:
+	"""Table properties written by the stack for projection."""
+	values = sorted(partitions.values())
+	parameters = { "storage.location.template": LOCATION + "/".join("%s=${%s}" % (key, key) for key in PARTITION_KEYS) }
+	for key, enum in zip(PARTITION_KEYS, projection_values(values, partition_locations(partitions, PARTITION_KEYS), PARTITION_KEYS)):
+		parameters["projection.%s.values" % key] = ",".join(enum)
+	return parameters
+
+def plan_projection(parameters: dict, predicate) -> list:
+	enums = [parameters["projection.%s.values" % key].split(",") for key in PARTITION_KEYS]
+	locations = []
+	for values in itertools.product(*enums):
+		projected = dict(zip(PARTITION_KEYS, values))
+		# Values are projected as they appear in the paths: the predicate sees them unquoted.
+		if predicate({ key: value.replace("%26", "&") for key, value in projected.items() }):
+			location = parameters["storage.location.template"]
+			for key, value in projected.items():
+				location = location.replace("${%s}" % key, value)
+			locations.append(location)
+	return locations
+
+def main():
+	parser = argparse.ArgumentParser(description = "Compare the partition lookup of query planning with catalog partitions and with projection.")
+	parser.add_argument("--partitions", type = int, nargs = "+", default = [1000, 10000, 100000])
+	parser.add_argument("--latency", type = float, default = LATENCY, help = "seconds per GetPartitions page")
+	args = parser.parse_args()
+
+	print("%10s %-24s %10s %8s %12s %14s" % ("partitions", "query", "matched", "pages", "catalog ms", "projection ms"))
+	for count in args.partitions:
+		partitions = table_partitions(count)
+		catalog = MockCatalog(partitions, args.latency)
+		parameters = projection_parameters(partitions)
+		for name, predicate in QUERIES:
+			catalog.calls = 0
+			start = time.time()
+			from_catalog = plan_catalog(catalog, predicate)
+			catalog_time = time.time() - start
+
+			start = time.time()
+			projected = plan_projection(parameters, predicate)
+			projection_time = time.time() - start
+
+			# The product of the enums may hold combinations that were never written: projection
+			# plans them too, and Athena finds no files there.
+			assert set(from_catalog) <= set(projected)
+			print("%10d %-24s %10d %8d %12.1f %14.1f" % (count, name, len(from_catalog), catalog.calls,
+				1000 * catalog_time, 1000 * projection_time))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Wall-clock time of the batch user profile handler (lambda/sagemaker_studio_profile_batch.py)
+creating 10, 100 and 500 profiles with each MaxConcurrency, against a stubbed SageMaker client
+that answers every call after a fixed latency. The handler's rate limiter is kept, so beyond a
+few workers the time is bound by REQUESTS_PER_SECOND rather than by the latency. Run from the
+cdktemplate directory:
+
+	python benchmarks/profile_batch_benchmark.py --profiles 10 100 --concurrency 1 10 50
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import types
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(PROJECT_DIR, "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+# cfnresponse is provided by CloudFormation to inline functions only.
+sys.modules.setdefault("cfnresponse", types.ModuleType("cfnresponse"))
+
+import sagemaker_studio_profile_batch as batch
+
+LATENCY = 0.2
+
+class SlowSageMaker(object):
+	"""SageMaker client creating user profiles after latency seconds, with the peak of concurrent calls."""
+
+	def __init__(self, latency: float):
+		self.latency = latency
+		self.lock = threading.Lock()
+		self.active = 0
+		self.peak = 0
+
+	def create_user_profile(self, DomainId, UserProfileName, Tags, UserSettings):
+		with self.lock:
+			self.active += 1
+			self.peak = max(self.peak, self.active)
+		time.sleep(self.latency)
+		with self.lock:
+			self.active -= 1
+		return { "UserProfileArn": "arn:aws:sagemaker:us-east-1:123456789012:user-profile/%s/%s" % (DomainId, UserProfileName) }
+
+def profiles(count: int) -> list:
+	return [{ "UserProfileName": "user-%d" % i, "StudioUserId": str(i), "ExecutionRole": "arn:aws:iam::123456789012:role/user-%d" % i }
+		for i in range(count)]
+
+def create_time(count: int, max_concurrency: int, latency: float, requests_per_second: float) -> tuple:
+	fake = SlowSageMaker(latency)
+	batch.client = fake
+	batch.rate_limiter = batch.RateLimiter(requests_per_second)
+	start = time.time()
+	results = batch.run_batch(batch.create_profile, "d-benchmark", profiles(count), { "MaxConcurrency": max_concurrency }, None)
+	elapsed = time.time() - start
+	assert all(success for success, _ in results.values())
+	return elapsed, fake.peak
+
+def main():
+	parser = argparse.ArgumentParser(description = "Time the batch creation of user profiles per MaxConcurrency.")
+	parser.add_argument("--profiles", type = int, nargs = "+", default = [10, 100, 500])
+	parser.add_argument("--concurrency", type = int, nargs = "+", default = [1, 5, 10, 25, 50])
+	parser.add_argument("--latency", type = float, default = LATENCY, help = "seconds per SageMaker call")
+	parser.add_argument("--requests-per-second", type = float, default = batch.REQUESTS_PER_SECOND)
+	args = parser.parse_args()
+
+	print("%10s %12s %10s %14s %12s" % ("profiles", "concurrency", "wall s", "profiles/s", "peak calls"))
+	for count in args.profiles:
+		for max_concurrency in args.concurrency:
+			elapsed, peak = create_time(count, max_concurrency, args.latency, args.requests_per_second)
+			print("%10d %12d %10.2f %14.1f %12d" % (count, max_concurrency, elapsed, count / elapsed, peak))
+
+if __name__ == "__main__":
+	main()
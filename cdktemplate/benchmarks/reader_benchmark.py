@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Events per second and peak RSS of reading a CloudTrail corpus with audit.reader.read_files, for
+each number of processes. The corpus is written by the traffic simulator, about 1M events by
+default, as gzip log files of five minutes. The corpus is written and each read runs in its own
+process, so that the peak RSS of a read is its own; the peak of the worker processes is
+reported apart. Run from the cdktemplate directory:
+
+	python benchmarks/reader_benchmark.py --events 1000000 --processes 1 2 4 8
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, PROJECT_DIR)
+
+from sagemaker_studio_audit_control.audit.simulator import TrafficSimulator, parse_date
+
+START = "2021-03-01"
+DAY = 24 * 60 * 60
+
+class CountingSimulator(TrafficSimulator):
+	"""Simulator counting the records it writes, duplicates included."""
+
+	records = 0
+
+	def write_file(self, directory: str, delivery: float, records: list) -> str:
+		self.records += len(records)
+		return super().write_file(directory, delivery, records)
+
+def write_corpus(directory: str, events: int) -> dict:
+	"""Writes days of busy traffic until the corpus holds events records; returns the paths and the record count."""
+	simulator = CountingSimulator(sessions_per_day = 400, queries_per_session = 20, noise_ratio = 3.0,
+		duplicate_rate = 0.05, violation_rate = 0.1, seed = 1)
+	paths = []
+	day = parse_date(START)
+	while simulator.records < events:
+		paths.extend(simulator.write(directory, day, day + DAY))
+		day += DAY
+	return { "Paths": paths, "Records": simulator.records }
+
+def peak_rss(who) -> float:
+	"""Peak RSS in MiB (ru_maxrss is in kilobytes on Linux)."""
+	return resource.getrusage(who).ru_maxrss / 1024
+
+def run_read(corpus: dict, processes: int) -> dict:
+	from sagemaker_studio_audit_control.audit.reader import read_files
+
+	baseline = peak_rss(resource.RUSAGE_SELF)
+	start = time.time()
+	matched = sum(1 for _ in read_files(corpus["Paths"], processes = processes))
+	elapsed = time.time() - start
+	return { "Matched": matched, "Seconds": elapsed, "PeakRssMiB": peak_rss(resource.RUSAGE_SELF) - baseline,
+		"WorkerPeakRssMiB": peak_rss(resource.RUSAGE_CHILDREN) }
+
+def measure(directory: str, processes: int) -> dict:
+	output = subprocess.run([sys.executable, __file__, "--measure", str(processes), "--corpus", directory],
+		check = True, stdout = subprocess.PIPE, universal_newlines = True).stdout
+	return json.loads(output)
+
+def main():
+	parser = argparse.ArgumentParser(description = "Measure the CloudTrail reader per number of processes.")
+	parser.add_argument("--events", type = int, default = 1000000)
+	parser.add_argument("--processes", type = int, nargs = "+", default = [1, 2, 4, os.cpu_count() or 1])
+	parser.add_argument("--runs", type = int, default = 1)
+	parser.add_argument("--measure", type = int, help = argparse.SUPPRESS)
+	parser.add_argument("--corpus", help = argparse.SUPPRESS)
+	parser.add_argument("--write-corpus", action = "store_true", help = argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.write_corpus:
+		corpus = write_corpus(os.path.join(args.corpus, "logs"), args.events)
+		with open(os.path.join(args.corpus, "corpus.json"), "w") as fp:
+			json.dump(corpus, fp)
+		return
+	if args.measure:
+		with open(os.path.join(args.corpus, "corpus.json")) as fp:
+			corpus = json.load(fp)
+		print(json.dumps(run_read(corpus, args.measure)))
+		return
+
+	with tempfile.TemporaryDirectory() as directory:
+		subprocess.run([sys.executable, __file__, "--write-corpus", "--corpus", directory, "--events", str(args.events)], check = True)
+		with open(os.path.join(directory, "corpus.json")) as fp:
+			corpus = json.load(fp)
+		size = sum(os.path.getsize(path) for path in corpus["Paths"])
+		print("%d events in %d files, %.0f MiB compressed" % (corpus["Records"], len(corpus["Paths"]), size / 2 ** 20))
+
+		print("%10s %12s %12s %14s %20s" % ("processes", "events/s", "audited/s", "peak RSS MiB", "worker peak RSS MiB"))
+		for processes in sorted(set(args.processes)):
+			results = [measure(directory, processes) for _ in range(args.runs)]
+			best = min(results, key = lambda r: r["Seconds"])
+			print("%10d %12.0f %12.0f %14.0f %20.0f" % (processes, corpus["Records"] / best["Seconds"], best["Matched"] / best["Seconds"],
+				max(r["PeakRssMiB"] for r in results), max(r["WorkerPeakRssMiB"] for r in results)))
+
+if __name__ == "__main__":
+	main()
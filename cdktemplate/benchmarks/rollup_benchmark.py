@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Report latency of audit.rollups.AuditRollups against a full scan of the access history, over
+a synthetic year of traffic from the traffic simulator. The audit records are added to the
+rollups as audit.py ingest adds them, and to a table with one row per access, which the same
+reports then group in full on every run (what answering them from the logs, or from a history
+table, costs). Both live in one SQLite file; the rows of each table are reported too. Run from the
+cdktemplate directory:
+
+	python benchmarks/rollup_benchmark.py --days 365 --sessions-per-day 20
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, PROJECT_DIR)
+
+from sagemaker_studio_audit_control.audit.correlation import correlate
+from sagemaker_studio_audit_control.audit.rollups import REPORTS, AuditRollups
+from sagemaker_studio_audit_control.audit.simulator import TrafficSimulator, parse_date
+from sagemaker_studio_audit_control.audit.sql import ColumnExtractor, fingerprint
+
+START = "2021-01-01"
+DAY = 24 * 60 * 60
+
+HISTORY_SCHEMA = """
+CREATE TABLE access_history (
+	access_event_id TEXT,
+	day TEXT NOT NULL,
+	principal TEXT NOT NULL,
+	user_name TEXT NOT NULL,
+	database_name TEXT NOT NULL,
+	table_name TEXT NOT NULL,
+	columns TEXT NOT NULL,
+	fingerprint TEXT,
+	query_string TEXT,
+	query_time TEXT
+);
+"""
+
+# The reports of audit.rollups.REPORTS, grouped from the access history.
+FULL_SCAN_REPORTS = {
+	"daily-access": """
+		SELECT day, user_name, principal, database_name, table_name, COUNT(*) AS accesses FROM access_history
+		WHERE day BETWEEN :start AND :end
+		GROUP BY day, user_name, principal, database_name, table_name
+		ORDER BY day, user_name, database_name, table_name""",
+	"columns-by-role": """
+		SELECT principal, database_name, table_name, json_each.value AS column_name, COUNT(*) AS accesses
+		FROM access_history, json_each(access_history.columns)
+		WHERE day BETWEEN :start AND :end
+		GROUP BY principal, database_name, table_name, column_name
+		ORDER BY principal, database_name, table_name, accesses DESC""",
+	"top-queries": """
+		SELECT COUNT(*) AS executions, principal, MAX(query_time) AS last_seen, MAX(query_string) AS sample FROM access_history
+		WHERE fingerprint IS NOT NULL
+		GROUP BY fingerprint, principal
+		ORDER BY executions DESC
+		LIMIT :limit"""
+}
+
+def audit_records(days: int, sessions_per_day: int, seed: int):
+	simulator = TrafficSimulator(sessions_per_day = sessions_per_day, noise_ratio = 0, duplicate_rate = 0.05, seed = seed)
+	start = parse_date(START)
+	records = (record for _, record in simulator.events(start, start + days * DAY))
+	return correlate(records, column_resolver = ColumnExtractor().columns)
+
+def load(db: sqlite3.Connection, days: int, sessions_per_day: int, seed: int) -> dict:
+	"""Adds a synthetic period to the rollups and to the access history; returns the counts and times."""
+	db.executescript(HISTORY_SCHEMA)
+	rollups = AuditRollups(db)
+	history = []
+	accesses = 0
+	rollup_seconds = 0.0
+	start = time.time()
+	for record in audit_records(days, sessions_per_day, seed):
+		before = time.time()
+		added = rollups.add(record)
+		rollup_seconds += time.time() - before
+		if not added:
+			continue
+		accesses += 1
+		history.append((record.access_event_id, record.access_time[:10], record.role_name or record.principal_arn or "",
+			record.user_name or "", record.database or "", record.table or "", json.dumps(list(record.columns)),
+			fingerprint(record.query_string) if record.query_string else None, record.query_string, record.query_time or record.access_time))
+	before = time.time()
+	rollups.flush()
+	rollups.prune()
+	db.commit()
+	rollup_seconds += time.time() - before
+	db.executemany("INSERT INTO access_history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", history)
+	db.commit()
+	return { "Accesses": accesses, "Seconds": time.time() - start, "RollupSeconds": rollup_seconds }
+
+def table_rows(db: sqlite3.Connection, table: str) -> int:
+	return db.execute("SELECT COUNT(*) FROM %s" % table).fetchone()[0]
+
+def timed(db: sqlite3.Connection, query: str, parameters: dict, runs: int) -> tuple:
+	"""(best seconds, rows) of runs of a query."""
+	best = None
+	for _ in range(runs):
+		start = time.time()
+		rows = db.execute(query, parameters).fetchall()
+		elapsed = time.time() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return best, len(rows)
+
+def main():
+	parser = argparse.ArgumentParser(description = "Measure the reports from the rollups against full scans of the access history.")
+	parser.add_argument("--days", type = int, default = 365)
+	parser.add_argument("--sessions-per-day", type = int, default = 20)
+	parser.add_argument("--runs", type = int, default = 5)
+	parser.add_argument("--seed", type = int, default = 0)
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as directory:
+		db = sqlite3.connect(os.path.join(directory, "audit.db"))
+		loaded = load(db, args.days, args.sessions_per_day, args.seed)
+		print("%d accesses over %d days, generated and loaded in %.1f s (%.1f s adding to the rollups)" % (
+			loaded["Accesses"], args.days, loaded["Seconds"], loaded["RollupSeconds"]))
+		print("rows: %s" % ", ".join("%s %d" % (table, table_rows(db, table))
+			for table in ["access_history", "audited_access", "table_access", "column_access", "query_shape"]))
+
+		end = (parse_date(START) + (args.days - 1) * DAY)
+		last_day = time.strftime("%Y-%m-%d", time.gmtime(end))
+		last_month = time.strftime("%Y-%m-%d", time.gmtime(end - 29 * DAY))
+		print("%-16s %-8s %14s %14s %10s %8s" % ("report", "range", "rollups ms", "full scan ms", "speedup", "rows"))
+		for name in sorted(FULL_SCAN_REPORTS):
+			for label, start in [("all days", START), ("30 days", last_month)]:
+				if name == "top-queries" and label != "all days":
+					continue
+				parameters = { "start": start, "end": last_day, "limit": 20 }
+				rollup, rows = timed(db, REPORTS[name], parameters, args.runs)
+				scan, scan_rows = timed(db, FULL_SCAN_REPORTS[name], parameters, args.runs)
+				assert rows == scan_rows, (name, rows, scan_rows)
+				print("%-16s %-8s %14.2f %14.2f %9.0fx %8d" % (name, label, rollup * 1000, scan * 1000, scan / rollup, rows))
+		db.close()
+
+if __name__ == "__main__":
+	main()
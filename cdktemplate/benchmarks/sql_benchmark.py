@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Queries per second of audit.sql.ColumnExtractor on the query strings of the traffic simulator,
+with its fingerprint and parse caches (the default size, and smaller ones) and without them
+(maxsize 0), and the hit rate of each cache. Every query is resolved as the correlator
+resolves it: the columns of the Amazon Reviews table it references. Run from the cdktemplate
+directory:
+
+	python benchmarks/sql_benchmark.py --queries 100000 --cache-sizes 10000 100
+"""
+
+import argparse
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, PROJECT_DIR)
+
+from sagemaker_studio_audit_control.amazon_reviews_schema import AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE
+from sagemaker_studio_audit_control.audit.simulator import TrafficSimulator
+from sagemaker_studio_audit_control.audit.sql import CACHE_SIZE, ColumnExtractor
+
+def query_strings(count: int, violation_rate: float, seed: int) -> list:
+	"""Query strings of the simulated users, as StartQueryExecution records them."""
+	simulator = TrafficSimulator(violation_rate = violation_rate, seed = seed)
+	return [simulator.query_string(simulator.users[i % len(simulator.users)]) for i in range(count)]
+
+def hit_rate(info) -> float:
+	lookups = info.hits + info.misses
+	return info.hits / lookups if lookups else 0.0
+
+def run(queries: list, maxsize: int) -> dict:
+	extractor = ColumnExtractor(maxsize = maxsize)
+	start = time.time()
+	for query in queries:
+		extractor.columns(query, AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE)
+	elapsed = time.time() - start
+	info = extractor.cache_info()
+	return { "Seconds": elapsed, "Fingerprint": hit_rate(info["Fingerprint"]), "Parse": hit_rate(info["Parse"]) }
+
+def main():
+	parser = argparse.ArgumentParser(description = "Measure the column extraction of audited queries, with and without caches.")
+	parser.add_argument("--queries", type = int, default = 100000)
+	parser.add_argument("--cache-sizes", type = int, nargs = "+", default = [CACHE_SIZE, 100])
+	parser.add_argument("--violation-rate", type = float, default = 0.1)
+	parser.add_argument("--seed", type = int, default = 0)
+	args = parser.parse_args()
+
+	queries = query_strings(args.queries, args.violation_rate, args.seed)
+	print("%d queries, %d distinct strings" % (len(queries), len(set(queries))))
+	print("%-16s %12s %18s %12s" % ("caches", "queries/s", "fingerprint hits", "parse hits"))
+	for maxsize in args.cache_sizes + [0]:
+		result = run(queries, maxsize)
+		name = "maxsize=%d" % maxsize if maxsize else "uncached"
+		print("%-16s %12.0f %17.1f%% %11.1f%%" % (name, len(queries) / result["Seconds"],
+			100 * result["Fingerprint"], 100 * result["Parse"]))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Wall time of "python app.py" (what cdk synth runs) for the default build, for the build with the
+shard capacities measured as before the static bounds (-c measure_shards=true) and for each stack
+alone (-c stacks=<name>). Then, for generated manifests of 10, 100 and 1000 users passed as
+-c user_manifest=<path>, the synth time and the resources and bytes of every template against
+the CloudFormation limits of 500 resources and 1 MB per template. Run from the cdktemplate directory:
+
+	python benchmarks/synth_benchmark.py --runs 5 --users 10 100 1000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, PROJECT_DIR)
+
+from sagemaker_studio_audit_control.amazon_reviews_schema import AMAZON_REVIEWS_COLUMNS
+from sagemaker_studio_audit_control.user_manifest import USER_MANIFEST_PATH
+
+MAX_RESOURCES = 500
+MAX_TEMPLATE_BYTES = 1024 * 1024
+
+VARIANTS = [
+	("default", {}),
+	("measure_shards", { "measure_shards": "true" }),
+	("stacks=sagemaker-studio-audit-control", { "stacks": "sagemaker-studio-audit-control" }),
+	("stacks=amazon-reviews-dataset-stack", { "stacks": "amazon-reviews-dataset-stack" }),
+	("stacks=data-scientist-users-stack", { "stacks": "data-scientist-users-stack" }),
+	("stacks=sagemaker-studio-stack", { "stacks": "sagemaker-studio-stack" })
+]
+
+def synth(context: dict, outdir: str) -> float:
+	"""Runs the app as "cdk synth -c <key>=<value>" does, through CDK_CONTEXT_JSON; returns the wall time."""
+	env = dict(os.environ, CDK_CONTEXT_JSON = json.dumps(context), CDK_OUTDIR = outdir,
+		JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION = "1")
+	start = time.time()
+	subprocess.run([sys.executable, "app.py"], cwd = PROJECT_DIR, env = env, check = True,
+		stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+	return time.time() - start
+
+def synth_time(context: dict) -> float:
+	with tempfile.TemporaryDirectory() as outdir:
+		return synth(context, outdir)
+
+def write_manifest(path: str, count: int) -> None:
+	"""Writes a manifest of the default users followed by generated ones, alternating full and column access."""
+	with open(USER_MANIFEST_PATH) as fp:
+		users = json.load(fp)["users"][:count]
+	columns = [c["name"] for c in AMAZON_REVIEWS_COLUMNS]
+	for i in range(len(users), count):
+		user = { "name": "data-scientist-%04d" % i, "access": "full" }
+		if i % 2:
+			user.update(access = "columns", columns = columns[:2 + i % (len(columns) - 2)])
+		users.append(user)
+	with open(path, "w") as fp:
+		json.dump({ "users": users }, fp, indent = "\t")
+
+def template_sizes(outdir: str) -> list:
+	"""(template file, resources, bytes) of every template in the cloud assembly."""
+	sizes = []
+	for name in sorted(os.listdir(outdir)):
+		if name.endswith(".template.json"):
+			path = os.path.join(outdir, name)
+			with open(path) as fp:
+				resources = len(json.load(fp).get("Resources", {}))
+			sizes.append((name, resources, os.path.getsize(path)))
+	return sizes
+
+def manifest_report(count: int, runs: int) -> None:
+	with tempfile.TemporaryDirectory() as directory:
+		manifest = os.path.join(directory, "users.json")
+		write_manifest(manifest, count)
+		times = []
+		for run in range(runs):
+			outdir = os.path.join(directory, "cdk.out.%d" % run)
+			times.append(synth({ "user_manifest": manifest }, outdir))
+		print()
+		print("user_manifest with %d users: median %.2f s, min %.2f s" % (count, statistics.median(times), min(times)))
+		print("%-50s %10s %8s %12s %8s" % ("template", "resources", "of 500", "bytes", "of 1 MB"))
+		for name, resources, size in template_sizes(outdir):
+			flag = "  over the limit" if resources > MAX_RESOURCES or size > MAX_TEMPLATE_BYTES else ""
+			print("%-50s %10d %7.0f%% %12d %7.0f%%%s" % (name, resources, 100 * resources / MAX_RESOURCES,
+				size, 100 * size / MAX_TEMPLATE_BYTES, flag))
+
+def main():
+	parser = argparse.ArgumentParser(description = "Time the synthesis of the CDK app.")
+	parser.add_argument("--runs", type = int, default = 3)
+	parser.add_argument("--users", type = int, nargs = "*", default = [10, 100, 1000],
+		help = "sizes of the generated user manifests")
+	args = parser.parse_args()
+
+	print("%-40s %10s %10s" % ("variant", "median s", "min s"))
+	for name, context in VARIANTS:
+		times = [synth_time(context) for _ in range(args.runs)]
+		print("%-40s %10.2f %10.2f" % (name, statistics.median(times), min(times)))
+
+	for count in args.users:
+		manifest_report(count, args.runs)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Rows per second and peak RSS of reading a large amazon_reviews_parquet extract into pandas
+through GetQueryResults paging (AthenaClient.read_sql) and through UNLOAD to Parquet
+(AthenaClient.read_sql with unload = True, and iter_batches). A local fixture stands in for S3:
+the Parquet files an UNLOAD writes, and the JSON pages GetQueryResults returns for the same rows,
+one page per line. The fixture is written and each path runs in its own process, so that the
+peak RSS of a path is its own; it is reported above the RSS of the imports. Run from
+the cdktemplate directory:
+
+	python benchmarks/unload_benchmark.py --rows 500000
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, PROJECT_DIR)
+
+from sagemaker_studio_audit_control.amazon_reviews_schema import AMAZON_REVIEWS_COLUMNS, PARTITION_LIST
+from sagemaker_studio_audit_control.query.athena import AthenaClient
+from sagemaker_studio_audit_control.query import unload
+
+# GetQueryResults returns at most 1000 rows per page.
+PAGE_SIZE = 1000
+# Athena writes an UNLOAD as several files of row groups.
+ROWS_PER_FILE = 100000
+
+ATHENA_TYPES = { "string": "varchar", "int": "integer", "bigint": "bigint" }
+PRUNED_COLUMNS = ["product_id", "star_rating", "helpful_votes", "review_date"]
+
+def columns() -> list:
+	return AMAZON_REVIEWS_COLUMNS + [{ "name": "product_category", "type": "string" }]
+
+def fixture_rows(count: int, seed: int = 0):
+	"""Yields rows shaped like the Amazon Reviews table."""
+	rng = random.Random(seed)
+	words = ["great", "product", "works", "as", "expected", "poor", "quality", "would", "buy", "again", "fast", "shipping"]
+	for i in range(count):
+		yield {
+			"marketplace": "US",
+			"customer_id": str(rng.randrange(10 ** 8)),
+			"review_id": "R%013d" % i,
+			"product_id": "B%09d" % rng.randrange(10 ** 6),
+			"product_parent": str(rng.randrange(10 ** 9)),
+			"product_title": " ".join(rng.choice(words) for _ in range(rng.randint(3, 10))),
+			"star_rating": rng.randint(1, 5),
+			"helpful_votes": rng.randint(0, 50),
+			"total_votes": rng.randint(0, 60),
+			"vine": rng.choice(["Y", "N"]),
+			"verified_purchase": rng.choice(["Y", "N"]),
+			"review_headline": " ".join(rng.choice(words) for _ in range(rng.randint(2, 6))),
+			"review_body": " ".join(rng.choice(words) for _ in range(rng.randint(10, 80))),
+			"review_date": 15000 + rng.randrange(3000),
+			"year": rng.randint(2005, 2015),
+			"product_category": rng.choice(PARTITION_LIST)
+		}
+
+def write_fixture(directory: str, count: int) -> None:
+	"""Writes the UNLOAD output (parquet/) and the GetQueryResults pages (pages.jsonl) of count rows."""
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+
+	types = { "string": pa.string(), "int": pa.int32(), "bigint": pa.int64() }
+	schema = pa.schema([(c["name"], types[c["type"]]) for c in columns()])
+	info = [{ "Name": c["name"], "Type": ATHENA_TYPES[c["type"]] } for c in columns()]
+	names = [c["name"] for c in columns()]
+
+	os.makedirs(os.path.join(directory, "parquet"))
+	with open(os.path.join(directory, "pages.jsonl"), "w") as pages:
+		rows = []
+		part = 0
+		page = [{ "Data": [{ "VarCharValue": name } for name in names] }]
+
+		def write_part():
+			pq.write_table(pa.Table.from_pylist(rows, schema = schema), os.path.join(directory, "parquet", "%05d" % part),
+				compression = "snappy")
+
+		for row in fixture_rows(count):
+			rows.append(row)
+			page.append({ "Data": [{ "VarCharValue": str(row[name]) } for name in names] })
+			if len(page) == PAGE_SIZE:
+				pages.write(json.dumps({ "ResultSet": { "ResultSetMetadata": { "ColumnInfo": info }, "Rows": page } }) + "\n")
+				page = []
+			if len(rows) == ROWS_PER_FILE:
+				write_part()
+				rows = []
+				part += 1
+		if page:
+			pages.write(json.dumps({ "ResultSet": { "ResultSetMetadata": { "ColumnInfo": info }, "Rows": page } }) + "\n")
+		if rows:
+			write_part()
+
+class LocalPaginator(object):
+	"""get_query_results paginator reading the pages of the fixture, decoded as boto3 decodes the responses."""
+
+	def __init__(self, path: str):
+		self.path = path
+
+	def paginate(self, QueryExecutionId):
+		with open(self.path) as fp:
+			for line in fp:
+				yield json.loads(line)
+
+class LocalAthena(object):
+	"""Athena client whose queries succeed at once, with the results of the fixture."""
+
+	def __init__(self, directory: str):
+		self.directory = directory
+
+	def start_query_execution(self, **request):
+		return { "QueryExecutionId": "benchmark" }
+
+	def get_query_execution(self, QueryExecutionId):
+		return { "QueryExecution": { "QueryExecutionId": QueryExecutionId, "StatementType": "DML", "Status": { "State": "SUCCEEDED" } } }
+
+	def get_paginator(self, name):
+		return LocalPaginator(os.path.join(self.directory, "pages.jsonl"))
+
+class LocalSts(object):
+
+	def get_caller_identity(self):
+		return { "Arn": "arn:aws:sts::123456789012:assumed-role/benchmark/benchmark" }
+
+def run_path(path: str, directory: str) -> int:
+	"""Reads the fixture through one path; returns the number of rows read."""
+	client = AthenaClient(athena = LocalAthena(directory), sts = LocalSts(), s3_staging_dir = "s3://benchmark/queries")
+	# The UNLOAD itself runs in Athena: reads go to the Parquet files of the fixture.
+	client.unload = lambda query, database = None, location = None: os.path.join(directory, "parquet")
+	query = "SELECT * FROM amazon_reviews_db.amazon_reviews_parquet"
+	if path == "paging":
+		return len(client.read_sql(query, use_cache = False))
+	if path == "unload":
+		return len(client.read_sql(query, unload = True))
+	if path == "unload-pruned":
+		return len(client.read_sql(query, unload = True, columns = PRUNED_COLUMNS))
+	if path == "batches":
+		return sum(len(batch.to_pandas()) for batch in client.iter_batches(query, batch_size = unload.BATCH_SIZE))
+	raise ValueError("Unknown path %s" % path)
+
+PATHS = ["paging", "unload", "unload-pruned", "batches"]
+
+def peak_rss() -> float:
+	"""Peak RSS of the process in MiB (ru_maxrss is in kilobytes on Linux)."""
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(path: str, directory: str) -> dict:
+	output = subprocess.run([sys.executable, __file__, "--measure", path, "--fixture", directory],
+		check = True, stdout = subprocess.PIPE, universal_newlines = True).stdout
+	return json.loads(output)
+
+def main():
+	parser = argparse.ArgumentParser(description = "Compare reading query results through paging and through UNLOAD to Parquet.")
+	parser.add_argument("--rows", type = int, default = 200000)
+	parser.add_argument("--runs", type = int, default = 1)
+	parser.add_argument("--measure", choices = PATHS, help = argparse.SUPPRESS)
+	parser.add_argument("--fixture", help = argparse.SUPPRESS)
+	parser.add_argument("--write-fixture", action = "store_true", help = argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.write_fixture:
+		write_fixture(args.fixture, args.rows)
+		return
+	if args.measure:
+		import pandas
+		import pyarrow.dataset
+		baseline = peak_rss()
+		start = time.time()
+		rows = run_path(args.measure, args.fixture)
+		elapsed = time.time() - start
+		print(json.dumps({ "Rows": rows, "Seconds": elapsed, "PeakRssMiB": peak_rss() - baseline }))
+		return
+
+	with tempfile.TemporaryDirectory() as directory:
+		subprocess.run([sys.executable, __file__, "--write-fixture", "--fixture", directory, "--rows", str(args.rows)], check = True)
+		print("%-16s %10s %12s %14s" % ("path", "rows", "rows/s", "peak RSS MiB"))
+		for path in PATHS:
+			results = [measure(path, directory) for _ in range(args.runs)]
+			best = min(results, key = lambda r: r["Seconds"])
+			print("%-16s %10d %12.0f %14.0f" % (path, best["Rows"], best["Rows"] / best["Seconds"], max(r["PeakRssMiB"] for r in results)))
+
+if __name__ == "__main__":
+	main()
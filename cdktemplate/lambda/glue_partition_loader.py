@@ -0,0 +1,83 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import cfnresponse
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+glue = boto3.client("glue")
+
+CREATE_BATCH_SIZE = 100
+DELETE_BATCH_SIZE = 25
+MAX_WORKERS = 8
+
+def handler(event, context):
+	print("Received event: %s" % {k: v for k, v in event.items() if k != "ResourceProperties"})
+	props = event["ResourceProperties"]
+	old_props = event.get("OldResourceProperties", {})
+	request_type = event["RequestType"]
+	data = {}
+	try:
+		new = partitions(props) if request_type != "Delete" else {}
+		old = {}
+		if request_type == "Delete" or (request_type == "Update" and table_id(props) == table_id(old_props)):
+			old = partitions(props if request_type == "Delete" else old_props)
+		added = [new[k] for k in new if k not in old]
+		removed = [old[k] for k in old if k not in new]
+		data = {"Added": len(added), "Removed": len(removed)}
+		print("Adding %d and removing %d partitions." % (len(added), len(removed)))
+		run(create_batch, props, added, CREATE_BATCH_SIZE)
+		run(delete_batch, props, removed, DELETE_BATCH_SIZE)
+		cfnresponse.send(event, context, cfnresponse.SUCCESS, data, table_id(props))
+	except Exception as e:
+		print("Unexpected error: %s" % e)
+		cfnresponse.send(event, context, cfnresponse.FAILED, data, table_id(props))
+
+def table_id(props):
+	return "%s:%s.%s" % (props.get("CatalogId"), props.get("DatabaseName"), props.get("TableName"))
+
+def partitions(props):
+	result = {}
+	for values in props["Partitions"]:
+		values = values if isinstance(values, list) else [values]
+		result["/".join(values)] = values
+	return result
+
+def location(props, values):
+	"""Path of a partition under Location: the listed path if it differs from the one built from the values (e.g. URL-encoded)."""
+	keys = props["PartitionKeys"]
+	return props.get("PartitionLocations", {}).get("/".join(values)) or "/".join("%s=%s" % kv for kv in zip(keys, values))
+
+def run(batch_function, props, values_list, batch_size):
+	batches = [values_list[i:i + batch_size] for i in range(0, len(values_list), batch_size)]
+	with ThreadPoolExecutor(max_workers = MAX_WORKERS) as executor:
+		errors = [e for errors in executor.map(lambda b: batch_function(props, b), batches) for e in errors]
+	if errors:
+		raise ClientError({"Error": {"Code": "PartitionErrors", "Message": str(errors[:10])}}, batch_function.__name__)
+
+def create_batch(props, batch):
+	response = glue.batch_create_partition(
+		CatalogId = props["CatalogId"],
+		DatabaseName = props["DatabaseName"],
+		TableName = props["TableName"],
+		PartitionInputList = [{
+			"Values": values,
+			"StorageDescriptor": {
+				"Location": props["Location"] + location(props, values),
+				"InputFormat": props["InputFormat"],
+				"SerdeInfo": {
+					"SerializationLibrary": props["SerializationLibrary"],
+					"Parameters": props.get("SerdeParameters", {})
+				}
+			}
+		} for values in batch])
+	return [e for e in response.get("Errors", []) if e["ErrorDetail"]["ErrorCode"] != "AlreadyExistsException"]
+
+def delete_batch(props, batch):
+	response = glue.batch_delete_partition(
+		CatalogId = props["CatalogId"],
+		DatabaseName = props["DatabaseName"],
+		TableName = props["TableName"],
+		PartitionsToDelete = [{"Values": values} for values in batch])
+	return [e for e in response.get("Errors", []) if e["ErrorDetail"]["ErrorCode"] != "EntityNotFoundException"]
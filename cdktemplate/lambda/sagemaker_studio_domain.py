@@ -2,18 +2,47 @@
 # SPDX-License-Identifier: MIT-0
 
 import json
+import os
 import cfnresponse
 import boto3
 import time
 from botocore.exceptions import ClientError
+from status_poller import wait_for_status, PollTimeout
 
 sm = boto3.client("sagemaker")
-
-SLEEP_INTERVAL = 10
-TIMEOUT_OFFSET = SLEEP_INTERVAL + 1
+lambda_client = boto3.client("lambda")
+events = boto3.client("events")
+
+# How a domain operation that outlives one invocation is carried on:
+#   "schedule" - check once per invocation and let an EventBridge rule re-trigger the function, so no time is spent sleeping.
+#   "reinvoke" - poll until this invocation is about to time out, then invoke the function again asynchronously.
+#   "none"     - poll within a single invocation and fail on timeout.
+# "schedule" needs events:PutRule, PutTargets, RemoveTargets and DeleteRule on the sagemaker-domain-* rules and
+# lambda:AddPermission and RemovePermission on the function; "reinvoke" needs lambda:InvokeFunction on the function.
+CONTINUATION_MODE = os.environ.get("CONTINUATION_MODE", "schedule")
+CONTINUATION_SCHEDULE = "rate(1 minute)"
+
+# CloudFormation waits up to one hour for a custom resource response.
+CONTINUATION_DEADLINE_SECONDS = 3500
+
+OPERATIONS = {
+	"Create": {
+		"success_states": ["InService"],
+		"pending_states": ["Pending"],
+		"not_found_status": None
+	},
+	"Delete": {
+		"success_states": ["Deleted"],
+		"pending_states": ["Deleting", "Pending", "InService"],
+		"not_found_status": "Deleted"
+	}
+}
 
 def handler(event, context):
 	print("Received event: %s." % event)
+
+	if "Continuation" in event: return continue_operation(event, context)
+
 	request_type = event["RequestType"]
 
 	if request_type == "Create": return create_resource(event, context)
@@ -37,31 +66,14 @@ def create_resource(event, context):
 			# AppNetworkAccessType = "VpcOnly",
 		)
 		domain_id = sm_domain["DomainArn"].split("/")[1]
-		domain_status = sm.describe_domain(DomainId = domain_id)["Status"]
-		response_data = {"DomainId" : domain_id}
-
-		while domain_status != "InService":
-
-			if context.get_remaining_time_in_millis() < TIMEOUT_OFFSET:
-				print("Lambda Function about to time out. Aborting.")
-				cfnresponse.send(event, context, cfnresponse.FAILED, response_data)
-
-			if domain_status == "Pending":
-				print("Waiting for InService status.")
-				time.sleep(SLEEP_INTERVAL)
-				domain_status = sm.describe_domain(DomainId = domain_id)["Status"]
-			elif domain_status == "Deleting":
-				print("Create Domain Failed. Domain being deleted by another process.")
-				cfnresponse.send(event, context, cfnresponse.FAILED, response_data)
-			else: #domain_status == "Failed" or Unknown
-				print("Create Domain Failed. Status: %s" % domain_status)
-				cfnresponse.send(event, context, cfnresponse.FAILED, response_data)
-
-		cfnresponse.send(event, context, cfnresponse.SUCCESS, response_data)
 
 	except ClientError as e:
 		print("Unexpected error: %s." % e)
 		cfnresponse.send(event, context, cfnresponse.FAILED, {})
+		return
+
+	start_continuation(event, "Create", domain_id)
+	return continue_operation(event, context)
 
 def update_resource(event, context):
 	try:
@@ -73,7 +85,6 @@ def update_resource(event, context):
 		cfnresponse.send(event, context, cfnresponse.FAILED, {})
 
 def delete_resource(event, context):
-	domain_id = ""
 	try:
 		print("Received Delete event")
 		domains = sm.list_domains()["Domains"]
@@ -82,25 +93,9 @@ def delete_resource(event, context):
 			print("Resource not found. Nothing to do.")
 			cfnresponse.send(event, context, cfnresponse.SUCCESS, {})
 			return
-		else:
-			domain_id = domains[0]["DomainId"]
-			sm.delete_domain( DomainId = domain_id, RetentionPolicy={ 'HomeEfsFileSystem': 'Delete'} )
 
-		print("Checking Delete status.")
-		domain_status = sm.describe_domain(DomainId = domain_id)["Status"]
-
-		while True:
-			if context.get_remaining_time_in_millis() < TIMEOUT_OFFSET:
-				print("Lambda Function about to time out. Aborting.")
-				cfnresponse.send(event, context, cfnresponse.FAILED, {})
-
-			if domain_status in ["Deleting", "Pending", "InService"] :
-				print("Waiting for Deletion.")
-				time.sleep(SLEEP_INTERVAL)
-				domain_status = sm.describe_domain(DomainId = domain_id)["Status"]
-			else: # "Failed" or Unknown
-				print("Delete Domain Failed. Status: %s" % domain_status)
-				cfnresponse.send(event, context, cfnresponse.FAILED, {})
+		domain_id = domains[0]["DomainId"]
+		sm.delete_domain( DomainId = domain_id, RetentionPolicy={ 'HomeEfsFileSystem': 'Delete'} )
 
 	except ClientError as e:
 
@@ -109,4 +104,130 @@ def delete_resource(event, context):
 			cfnresponse.send(event, context, cfnresponse.SUCCESS, {})
 		else:
 			print("Unexpected error: %s." % e)
-			cfnresponse.send(event, context, cfnresponse.FAILED, {})
\ No newline at end of file
+			cfnresponse.send(event, context, cfnresponse.FAILED, {})
+		return
+
+	print("Checking Delete status.")
+	start_continuation(event, "Delete", domain_id)
+	return continue_operation(event, context)
+
+# Continuation of long-running domain operations
+
+def start_continuation(event, operation, domain_id):
+	event["Continuation"] = {
+		"Operation": operation,
+		"DomainId": domain_id,
+		"Deadline": int(time.time()) + CONTINUATION_DEADLINE_SECONDS,
+		"Invocation": 0
+	}
+
+def continue_operation(event, context):
+	"""
+	Checks the domain saved in event["Continuation"] and either sends the single
+	CloudFormation response or hands the operation over to a later invocation.
+	"""
+	state = event["Continuation"]
+	operation = state["Operation"]
+	domain_id = state["DomainId"]
+	response_data = {"DomainId" : domain_id} if operation == "Create" else {}
+
+	try:
+		domain_status = wait_for_status(
+			lambda: sm.describe_domain(DomainId = domain_id)["Status"],
+			context,
+			max_attempts = 1 if CONTINUATION_MODE == "schedule" else None,
+			**OPERATIONS[operation]
+		)
+
+	except PollTimeout as e:
+		if CONTINUATION_MODE != "none" and time.time() < state["Deadline"]:
+			print("%s Domain still in progress. Status: %s. Continuing later." % (operation, e.last_status))
+			try:
+				schedule_continuation(event, context)
+			except ClientError as e:
+				print("Unable to continue %s Domain: %s." % (operation, e))
+				# Nothing will invoke the function again: remove what was scheduled and respond now.
+				if CONTINUATION_MODE == "schedule" and not remove_continuation(event, context):
+					remove_rule(continuation_rule_name(event))
+				state["Invocation"] = 0
+				return finish_operation(event, context, cfnresponse.FAILED, response_data, reason = str(e))
+			return
+		print("%s Domain timed out. Aborting. %s" % (operation, e))
+		return finish_operation(event, context, cfnresponse.FAILED, response_data)
+
+	except ClientError as e:
+		print("Unexpected error: %s." % e)
+		return finish_operation(event, context, cfnresponse.FAILED, response_data)
+
+	if domain_status in OPERATIONS[operation]["success_states"]:
+		print("%s Domain succeeded. Status: %s" % (operation, domain_status))
+		return finish_operation(event, context, cfnresponse.SUCCESS, response_data)
+	elif domain_status == "Deleting":
+		print("%s Domain Failed. Domain being deleted by another process." % operation)
+	else: #domain_status == "Failed" or Unknown
+		print("%s Domain Failed. Status: %s" % (operation, domain_status))
+
+	return finish_operation(event, context, cfnresponse.FAILED, response_data)
+
+def schedule_continuation(event, context):
+	state = event["Continuation"]
+	state["Invocation"] += 1
+
+	if CONTINUATION_MODE == "schedule":
+		if state["Invocation"] > 1:
+			# The rule created by the first invocation keeps firing until the operation settles.
+			return
+		rule_name = continuation_rule_name(event)
+		rule_arn = events.put_rule(Name = rule_name, ScheduleExpression = CONTINUATION_SCHEDULE)["RuleArn"]
+		lambda_client.add_permission(
+			FunctionName = context.invoked_function_arn,
+			StatementId = rule_name,
+			Action = "lambda:InvokeFunction",
+			Principal = "events.amazonaws.com",
+			SourceArn = rule_arn
+		)
+		events.put_targets(Rule = rule_name, Targets = [{
+			"Id": "continuation",
+			"Arn": context.invoked_function_arn,
+			"Input": json.dumps(event)
+		}])
+	else:
+		lambda_client.invoke(
+			FunctionName = context.invoked_function_arn,
+			InvocationType = "Event",
+			Payload = json.dumps(event)
+		)
+
+def finish_operation(event, context, response_status, response_data, reason = None):
+	if CONTINUATION_MODE == "schedule" and event["Continuation"]["Invocation"] > 0:
+		if not remove_continuation(event, context):
+			print("Continuation %s already finished. Nothing to do." % continuation_rule_name(event))
+			return
+	cfnresponse.send(event, context, response_status, response_data, reason = reason)
+
+def remove_continuation(event, context):
+	"""
+	Removes the continuation rule. EventBridge may deliver a scheduled invocation more than once,
+	so the permission of the rule doubles as the marker of a pending operation: only the
+	invocation that removes it sends the response. Returns False if it was already removed.
+	"""
+	rule_name = continuation_rule_name(event)
+	try:
+		lambda_client.remove_permission(FunctionName = context.invoked_function_arn, StatementId = rule_name)
+	except ClientError as e:
+		if e.response["Error"]["Code"] == "ResourceNotFoundException":
+			return False
+		print("Unable to remove continuation permission %s: %s." % (rule_name, e))
+
+	remove_rule(rule_name)
+	return True
+
+def remove_rule(rule_name):
+	try:
+		events.remove_targets(Rule = rule_name, Ids = ["continuation"])
+		events.delete_rule(Name = rule_name)
+	except ClientError as e:
+		print("Unable to remove continuation rule %s: %s." % (rule_name, e))
+
+def continuation_rule_name(event):
+	return "sagemaker-domain-" + event["RequestId"]
@@ -1,17 +1,13 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-import json
 import cfnresponse
 import boto3
-import time
 from botocore.exceptions import ClientError
+from status_poller import wait_for_status, PollTimeout
 
 client = boto3.client("sagemaker")
 
-SLEEP_INTERVAL = 5
-TIMEOUT_OFFSET = SLEEP_INTERVAL + 1
-
 def handler(event, context):
 
 	print("Received event: %s" % event)
@@ -77,6 +73,7 @@ def delete_resource(event, context):
 	domain_id = event["ResourceProperties"]["DomainId"]
 	user_profile_name = event["ResourceProperties"]["UserProfileName"]
 	response_data = { "UserProfileName" : user_profile_name }
+	response_status = cfnresponse.FAILED
 
 	try:
 		print("Received delete event.")
@@ -87,26 +84,28 @@ def delete_resource(event, context):
 		)
 
 		print("Checking Delete status.")
-		user_profile_status = client.describe_user_profile( DomainId = domain_id, UserProfileName = user_profile_name)["Status"]
-
-		while True:
-			if context.get_remaining_time_in_millis() < TIMEOUT_OFFSET:
-				print("Lambda Function about to time out. Aborting.")
-				cfnresponse.send(event, context, cfnresponse.FAILED, response_data)
+		user_profile_status = wait_for_status(
+			lambda: client.describe_user_profile( DomainId = domain_id, UserProfileName = user_profile_name)["Status"],
+			context,
+			success_states = ["Deleted"],
+			pending_states = ["Deleting", "Pending", "InService"],
+			not_found_status = "Deleted"
+		)
 
-			if user_profile_status in ["Deleting", "Pending", "InService"] :
-				print("Waiting for Deletion.")
-				time.sleep(SLEEP_INTERVAL)
-				user_profile_status = client.describe_user_profile( DomainId = domain_id, UserProfileName = user_profile_name)["Status"]
-			else: #domain_status == "Failed"
-				print("Delete User Profile Failed.")
-				cfnresponse.send(event, context, cfnresponse.FAILED, response_data)
+		if user_profile_status == "Deleted":
+			print("User Profile successfully deleted.")
+			response_status = cfnresponse.SUCCESS
+		else: #user_profile_status == "Failed"
+			print("Delete User Profile Failed. Status: %s" % user_profile_status)
 
+	except PollTimeout as e:
+		print("Lambda Function about to time out. Aborting. %s" % e)
 	except ClientError as e:
 
 		if e.response['Error']['Code'] == 'ResourceNotFound':
 			print("User Profile successfully deleted.")
-			cfnresponse.send(event, context, cfnresponse.SUCCESS, response_data)
+			response_status = cfnresponse.SUCCESS
 		else:
 			print("Unexpected error: %s" % e)
-			cfnresponse.send(event, context, cfnresponse.FAILED, response_data)
+
+	cfnresponse.send(event, context, response_status, response_data)
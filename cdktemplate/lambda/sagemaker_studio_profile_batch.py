@@ -0,0 +1,237 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import threading
+import time
+import cfnresponse
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from status_poller import wait_for_status, next_delay, is_throttling_error, PollTimeout
+
+DEFAULT_MAX_CONCURRENCY = 10
+MAX_CONCURRENCY_LIMIT = 50
+
+# Calls per second shared by all worker threads, kept below the SageMaker control plane limits.
+REQUESTS_PER_SECOND = 8
+MAX_THROTTLING_RETRIES = 8
+
+# CloudFormation rejects custom resource responses larger than 4096 bytes.
+MAX_RESPONSE_DATA_SIZE = 3500
+
+client = boto3.client("sagemaker", config = Config(max_pool_connections = MAX_CONCURRENCY_LIMIT))
+
+class RateLimiter(object):
+	"""Token bucket shared by the worker threads."""
+
+	def __init__(self, rate, clock = time.monotonic, sleep = time.sleep):
+		self.rate = rate
+		self.clock = clock
+		self.sleep = sleep
+		self.tokens = rate
+		self.updated = clock()
+		self.lock = threading.Lock()
+
+	def acquire(self):
+		while True:
+			with self.lock:
+				now = self.clock()
+				self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+				self.updated = now
+				if self.tokens >= 1:
+					self.tokens -= 1
+					return
+				wait = (1 - self.tokens) / self.rate
+			self.sleep(wait)
+
+rate_limiter = RateLimiter(REQUESTS_PER_SECOND)
+
+def handler(event, context):
+
+	print("Received event: %s" % event)
+	request_type = event["RequestType"]
+	try:
+		if request_type == "Create": return create_resource(event, context)
+		elif request_type == "Update": return update_resource(event, context)
+		elif request_type == "Delete": return delete_resource(event, context)
+		else :
+			# Unknown RequestType
+			print("Invalid request type: %s." % request_type)
+			cfnresponse.send(event, context, cfnresponse.FAILED, {}, physical_resource_id(event))
+	except Exception as e:
+		# Without a response CloudFormation waits for an hour before failing the resource.
+		print("Unexpected error: %s" % e)
+		cfnresponse.send(event, context, cfnresponse.FAILED, {}, physical_resource_id(event))
+
+def create_resource(event, context):
+	properties = event["ResourceProperties"]
+	results = run_batch(create_profile, properties["DomainId"], properties["UserProfiles"], properties, context)
+	send_results(event, context, results)
+
+def update_resource(event, context):
+	properties = event["ResourceProperties"]
+	old_properties = event["OldResourceProperties"]
+
+	profiles = profiles_by_name(properties["UserProfiles"])
+	old_profiles = profiles_by_name(old_properties["UserProfiles"])
+
+	if properties["DomainId"] != old_properties["DomainId"]:
+		# Profiles cannot move between domains. The old ones are removed when CloudFormation deletes the old resource.
+		results = run_batch(create_profile, properties["DomainId"], list(profiles.values()), properties, context)
+		send_results(event, context, results)
+		return
+
+	created = [p for name, p in profiles.items() if name not in old_profiles]
+	updated = [p for name, p in profiles.items() if name in old_profiles and p != old_profiles[name]]
+	deleted = [p for name, p in old_profiles.items() if name not in profiles]
+
+	print("Creating %d, updating %d and deleting %d user profiles." % (len(created), len(updated), len(deleted)))
+
+	results = {}
+	results.update(run_batch(create_profile, properties["DomainId"], created, properties, context))
+	results.update(run_batch(update_profile, properties["DomainId"], updated, properties, context))
+	results.update(run_batch(delete_profile, properties["DomainId"], deleted, properties, context))
+	send_results(event, context, results)
+
+def delete_resource(event, context):
+	properties = event["ResourceProperties"]
+	results = run_batch(delete_profile, properties["DomainId"], properties["UserProfiles"], properties, context)
+	send_results(event, context, results)
+
+# Batch execution
+
+def physical_resource_id(event):
+	"""
+	One ID per domain: a new ID when the domain changes makes CloudFormation delete the profiles
+	of the old domain, while updates in the same domain keep the resource.
+	"""
+	if event["RequestType"] != "Create" and "PhysicalResourceId" in event:
+		if event["RequestType"] == "Delete" or event["ResourceProperties"].get("DomainId") == event["OldResourceProperties"].get("DomainId"):
+			return event["PhysicalResourceId"]
+	return "%s/user-profiles" % event["ResourceProperties"].get("DomainId")
+
+def profiles_by_name(profiles):
+	return {p["UserProfileName"]: p for p in profiles}
+
+def run_batch(operation, domain_id, profiles, properties, context):
+	"""
+	Runs operation for every profile on a bounded thread pool. Returns a dictionary of
+	profile name to (success, detail).
+	"""
+	if len(profiles) == 0:
+		return {}
+
+	max_concurrency = min(int(properties.get("MaxConcurrency", DEFAULT_MAX_CONCURRENCY)), MAX_CONCURRENCY_LIMIT)
+
+	def run(profile):
+		name = profile["UserProfileName"]
+		try:
+			return name, (True, operation(domain_id, profile, context))
+		except Exception as e:
+			print("User profile %s failed: %s" % (name, e))
+			return name, (False, str(e))
+
+	with ThreadPoolExecutor(max_workers = max_concurrency) as executor:
+		return dict(executor.map(run, profiles))
+
+def call_with_retry(method, **kwargs):
+	attempt = 0
+	while True:
+		rate_limiter.acquire()
+		try:
+			return method(**kwargs)
+		except ClientError as e:
+			if not is_throttling_error(e) or attempt >= MAX_THROTTLING_RETRIES:
+				raise
+			time.sleep(next_delay(attempt))
+			attempt += 1
+
+def create_profile(domain_id, profile, context):
+	try:
+		user_profile = call_with_retry(client.create_user_profile,
+			DomainId = domain_id,
+			UserProfileName = profile["UserProfileName"],
+			Tags = [
+				{
+					"Key" : "studiouserid",
+					"Value" : profile["StudioUserId"]
+				}
+			],
+			UserSettings={
+				"ExecutionRole": profile["ExecutionRole"]
+			}
+		)
+	except ClientError as e:
+		if e.response['Error']['Code'] == 'ResourceInUse':
+			# Created by the per-user resources of an earlier release: adopt it.
+			print("User profile %s already exists. Updating resource." % profile["UserProfileName"])
+			return update_profile(domain_id, profile, context)
+		raise
+	return user_profile["UserProfileArn"]
+
+def update_profile(domain_id, profile, context):
+	try:
+		user_profile = call_with_retry(client.update_user_profile,
+			DomainId = domain_id,
+			UserProfileName = profile["UserProfileName"],
+			UserSettings={
+				"ExecutionRole": profile["ExecutionRole"]
+			}
+		)
+	except ClientError as e:
+		if e.response['Error']['Code'] == 'ResourceNotFound':
+			print("User profile %s not found. Creating resource." % profile["UserProfileName"])
+			return create_profile(domain_id, profile, context)
+		raise
+
+	call_with_retry(client.add_tags,
+		ResourceArn = user_profile["UserProfileArn"],
+		Tags = [
+			{
+				"Key" : "studiouserid",
+				"Value" : profile["StudioUserId"]
+			}
+		]
+	)
+	return user_profile["UserProfileArn"]
+
+def delete_profile(domain_id, profile, context):
+	user_profile_name = profile["UserProfileName"]
+	try:
+		call_with_retry(client.delete_user_profile, DomainId = domain_id, UserProfileName = user_profile_name)
+	except ClientError as e:
+		if e.response['Error']['Code'] == 'ResourceNotFound':
+			return "Deleted"
+		raise
+
+	user_profile_status = wait_for_status(
+		lambda: call_with_retry(client.describe_user_profile, DomainId = domain_id, UserProfileName = user_profile_name)["Status"],
+		context,
+		success_states = ["Deleted"],
+		pending_states = ["Deleting", "Pending", "InService"],
+		not_found_status = "Deleted"
+	)
+	if user_profile_status != "Deleted":
+		raise PollTimeout(user_profile_status)
+	return user_profile_status
+
+def send_results(event, context, results):
+	failed = sorted(name for name, (success, detail) in results.items() if not success)
+	print("Batch finished: %d succeeded, %d failed." % (len(results) - len(failed), len(failed)))
+
+	response_data = {
+		"Succeeded": len(results) - len(failed),
+		"Failed": len(failed),
+		"FailedUserProfiles": ",".join(failed)[:MAX_RESPONSE_DATA_SIZE // 2]
+	}
+
+	# Per-profile results are included while they fit in the response. They are always printed to the log.
+	for name, (success, detail) in sorted(results.items()):
+		print("%s: %s" % (name, detail))
+		if len(json.dumps(response_data)) + len(name) + len(detail) + 8 < MAX_RESPONSE_DATA_SIZE:
+			response_data[name] = detail
+
+	response_status = cfnresponse.SUCCESS if len(failed) == 0 else cfnresponse.FAILED
+	cfnresponse.send(event, context, response_status, response_data, physical_resource_id(event))
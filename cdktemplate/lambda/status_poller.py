@@ -0,0 +1,74 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import random
+import time
+from botocore.exceptions import ClientError
+
+INITIAL_DELAY = 1
+MAX_DELAY = 30
+BACKOFF_FACTOR = 2
+TIMEOUT_OFFSET_MILLIS = 5000
+
+THROTTLING_ERROR_CODES = [
+	"ThrottlingException",
+	"Throttling",
+	"TooManyRequestsException",
+	"RequestLimitExceeded"
+]
+
+class PollTimeout(Exception):
+	"""Raised when the Lambda deadline is reached before the resource settles."""
+
+	def __init__(self, last_status):
+		super().__init__("Timed out waiting for resource. Last status: %s." % last_status)
+		self.last_status = last_status
+
+def is_throttling_error(e):
+	return e.response["Error"]["Code"] in THROTTLING_ERROR_CODES
+
+def is_not_found_error(e):
+	return e.response["Error"]["Code"] == "ResourceNotFound"
+
+def next_delay(attempt, rand = random.uniform):
+	"""Jittered exponential backoff: somewhere between half and all of the capped delay."""
+	delay = min(MAX_DELAY, INITIAL_DELAY * (BACKOFF_FACTOR ** attempt))
+	return rand(delay / 2, delay)
+
+def wait_for_status(describe, context, success_states, pending_states,
+		not_found_status = None, max_attempts = None, sleep = time.sleep, rand = random.uniform):
+	"""
+	Calls describe() until it returns a status outside pending_states and returns that status.
+
+	Throttling errors are retried with the same backoff as pending states. If not_found_status
+	is set, a ResourceNotFound error is reported as that status (used when waiting for deletion).
+	Raises PollTimeout if the next wait would run past the Lambda deadline given by
+	context.get_remaining_time_in_millis(), or once max_attempts checks have been made.
+	Any other ClientError is raised to the caller.
+	"""
+	attempt = 0
+	status = None
+
+	while True:
+		try:
+			status = describe()
+		except ClientError as e:
+			if not_found_status is not None and is_not_found_error(e):
+				return not_found_status
+			if not is_throttling_error(e):
+				raise
+			print("Throttled while checking status: %s." % e)
+		else:
+			if status in success_states or status not in pending_states:
+				return status
+			print("Waiting for %s status. Current status: %s." % (" or ".join(success_states), status))
+
+		if max_attempts is not None and attempt + 1 >= max_attempts:
+			raise PollTimeout(status)
+
+		delay = next_delay(attempt, rand)
+		if context.get_remaining_time_in_millis() - delay * 1000 < TIMEOUT_OFFSET_MILLIS:
+			raise PollTimeout(status)
+
+		sleep(delay)
+		attempt += 1
@@ -8,38 +8,70 @@ from aws_cdk import (
 	aws_iam as iam,
 	core
 )
-import os
 
-AMAZON_REVIEWS_BUCKET_ARN = os.environ["AMAZON_REVIEWS_BUCKET_ARN"]
+from .config import AuditControlConfig
+from .lambda_code import inline_function
+from .partition_discovery import projection_values
+from .amazon_reviews_schema import (
+	AMAZON_REVIEWS_DATABASE,
+	AMAZON_REVIEWS_TABLE,
+	AMAZON_REVIEWS_COLUMNS,
+	PARTITION_KEYS,
+	PARTITION_LIST
+)
 
 class AmazonReviewsDatasetStack(core.Stack):
 
-	def __init__(self, scope: core.Construct, id: str, **kwargs) -> None:
+	def __init__(self, scope: core.Construct, id: str, partitions: list = None, partition_locations: dict = None, config: AuditControlConfig = None, **kwargs) -> None:
 		super().__init__(scope, id, **kwargs)
 
+		if config is None:
+			config = AuditControlConfig()
+
+		if partitions is None:
+			partitions = [[partition] for partition in PARTITION_LIST]
+
 	# CloudFormation Parameters
 
 		glue_db_name = core.CfnParameter(self, "GlueDatabaseNameAmazonReviews", 
 				type="String",
 				description="Name of Glue Database to be created for Amazon Reviews.",
 				allowed_pattern="[\w-]+",
-				default = "amazon_reviews_db"
+				default = AMAZON_REVIEWS_DATABASE
 			)
 
 		glue_table_name = core.CfnParameter(self, "GlueTableNameAmazonReviews", 
 				type="String",
 				description="Name of Glue Table to be created for Amazon Reviews (Parquet).",
 				allowed_pattern="[\w-]+",
-				default = "amazon_reviews_parquet"
+				default = AMAZON_REVIEWS_TABLE
+			)
+
+		partition_projection = core.CfnParameter(self, "PartitionProjection", 
+				type="String",
+				description="\
+Use Athena partition projection for the Amazon Reviews table instead of registering partitions in the Glue Data Catalog.",
+				allowed_values=["Disabled", "Enabled"],
+				default = "Disabled"
 			)
 
 		self.template_options.template_format_version = "2010-09-09"
 		self.template_options.description = "Amazon Reviews Dataset."
 		self.template_options.metadata = { "License": "MIT-0" }
 
+	# Conditions for partition registration
+
+		partition_projection_enabled = core.CfnCondition(self, "IsPartitionProjectionEnabled", 
+			expression = core.Fn.condition_equals("Enabled", partition_projection)
+		)
+
+		partition_registration_enabled = core.CfnCondition(self, "IsPartitionRegistrationEnabled", 
+			expression = core.Fn.condition_not(partition_projection_enabled)
+		)
+
 	# Create Database, Table and Partitions for Amazon Reviews
 
-		amazon_reviews_bucket = s3.Bucket.from_bucket_arn(self, "ImportedAmazonReviewsBucket", AMAZON_REVIEWS_BUCKET_ARN)
+		amazon_reviews_bucket = s3.Bucket.from_bucket_arn(self, "ImportedAmazonReviewsBucket", config.amazon_reviews_bucket_arn)
 
 		lakeformation_resource = lf.CfnResource(self, "LakeFormationResource", 
 			resource_arn = amazon_reviews_bucket.bucket_arn, 
@@ -53,6 +85,22 @@ class AmazonReviewsDatasetStack(core.Stack):
 			)
 		)
 
+		# With partition projection, Athena computes the partitions from the enumerated values and the
+		# location template, and no partitions are registered in the catalog. The values are those of
+		# the partition paths, which discovery may list URL-quoted, so that every projected location exists.
+
+		partition_keys = PARTITION_KEYS
+		partition_location = f"{amazon_reviews_bucket.s3_url_for_object()}/parquet/"
+
+		partition_projection_parameters = {
+			"projection.enabled": core.Fn.condition_if(partition_projection_enabled.logical_id, "true", "false").to_string(),
+			"storage.location.template": partition_location + "/".join(f"{key}=${{{key}}}" for key in partition_keys)
+		}
+
+		for key, values in zip(partition_keys, projection_values(partitions, partition_locations, partition_keys)):
+			partition_projection_parameters[f"projection.{key}.type"] = "enum"
+			partition_projection_parameters[f"projection.{key}.values"] = ",".join(values)
+
 		amazon_reviews_table = glue.CfnTable(self, "GlueTableAmazonReviews", 
 			catalog_id = cfn_glue_db.catalog_id,
 			database_name = glue_db_name.value_as_string,
@@ -61,26 +109,12 @@ class AmazonReviewsDatasetStack(core.Stack):
 				name = glue_table_name.value_as_string,
 				parameters = {
 					"classification": "parquet",
-					"typeOfData": "file"
+					"typeOfData": "file",
+					**partition_projection_parameters
 				},
-				partition_keys = [{"name": "product_category","type": "string"}],
+				partition_keys = [{"name": key,"type": "string"} for key in partition_keys],
 				storage_descriptor = glue.CfnTable.StorageDescriptorProperty(
-					columns = [
-						{"name": "marketplace", "type": "string"},
-						{"name": "customer_id", "type": "string"},
-						{"name": "review_id","type": "string"},
-						{"name": "product_id","type": "string"},
-						{"name": "product_parent","type": "string"},
-						{"name": "product_title","type": "string"},
-						{"name": "star_rating","type": "int"},
-						{"name": "helpful_votes","type": "int"},
-						{"name": "total_votes","type": "int"},
-						{"name": "vine","type": "string"},
-						{"name": "verified_purchase","type": "string"},
-						{"name": "review_headline","type": "string"},
-						{"name": "review_body","type": "string"},
-						{"name": "review_date","type": "bigint"},
-						{"name": "year","type": "int"}],
+					columns = AMAZON_REVIEWS_COLUMNS,
 					location = amazon_reviews_bucket.s3_url_for_object() + "/parquet/",
 					input_format = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat",
 					output_format = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat",
@@ -99,39 +133,99 @@ class AmazonReviewsDatasetStack(core.Stack):
 		# amazon_reviews_table.node.add_dependency(glue_default_permissions)
 		amazon_reviews_table.node.add_dependency(cfn_glue_db)
 
-		partition_list = ["Apparel", "Automotive", "Baby", "Beauty", "Books", "Camera", "Digital_Ebook_Purchase", 
-			"Digital_Music_Purchase", "Digital_Software", "Digital_Video_Download","Digital_Video_Games", "Electronics",
-			"Furniture", "Gift_Card", "Grocery", "Health_&_Personal_Care", "Home", "Home_Entertainment", 
-			"Home_Improvement", "Jewelry", "Kitchen", "Lawn_and_Garden", "Luggage", "Major_Appliances", "Mobile_Apps",
-			"Mobile_Electronics", "Music", "Musical_Instruments", "Office_Products", "Outdoors", "PC", "Personal_Care_Appliances",
-			"Pet_Products", "Shoes", "Software", "Sports", "Tools", "Toys", "Video", "Video_DVD", "Video_Games", 
-			"Watches", "Wireless"]
-
-		partition_uri_prefix = f"{amazon_reviews_bucket.s3_url_for_object()}/parquet/{amazon_reviews_table.table_input.partition_keys[0].name}"
-
-		for partition in partition_list:
-
-			cfn_partition_location = partition_uri_prefix + "=" + partition
-
-			cfn_partition_id = "Partition"+partition
-
-			cfn_partition = glue.CfnPartition(self, cfn_partition_id, 
-				catalog_id = amazon_reviews_table.catalog_id, 
-				database_name = glue_db_name.value_as_string,
-				partition_input = glue.CfnPartition.PartitionInputProperty(
-					values = [ partition ],
-					storage_descriptor = glue.CfnPartition.StorageDescriptorProperty(
-						location = cfn_partition_location,
-						input_format = "org.apache.hadoop.mapred.TextInputFormat",
-						serde_info = glue.CfnPartition.SerdeInfoProperty(
-							serialization_library = "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe",
-							parameters = {
-								"serialization.format": "1"
-							}
-						)
-					)
-				),
-				table_name = glue_table_name.value_as_string
-			)
+	# Register Partitions in bulk with a custom resource (BatchCreatePartition / BatchDeletePartition)
+	# Only when partition projection is disabled
+
+		partition_loader_role = iam.Role(self, "GluePartitionLoaderRole",
+			assumed_by = iam.ServicePrincipal("lambda.amazonaws.com"),
+			managed_policies = [iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole")],
+			inline_policies = {
+				"GluePartitions": iam.PolicyDocument(statements = [
+					iam.PolicyStatement(
+						sid = "GluePartitions",
+						effect=iam.Effect.ALLOW,
+						actions=[
+							"glue:BatchCreatePartition",
+							"glue:BatchDeletePartition",
+							"glue:GetTable",
+							"glue:GetPartitions"
+						],
+						resources=[
+							f"arn:aws:glue:{core.Aws.REGION}:{core.Aws.ACCOUNT_ID}:catalog",
+							f"arn:aws:glue:{core.Aws.REGION}:{core.Aws.ACCOUNT_ID}:database/{glue_db_name.value_as_string}",
+							f"arn:aws:glue:{core.Aws.REGION}:{core.Aws.ACCOUNT_ID}:table/{glue_db_name.value_as_string}/{glue_table_name.value_as_string}"
+						])
+				])
+			})
+
+		partition_loader_permissions = lf.CfnPermissions(self, "LFPermissionGluePartitionLoader", 
+			data_lake_principal = lf.CfnPermissions.DataLakePrincipalProperty(data_lake_principal_identifier = partition_loader_role.role_arn),
+			resource = lf.CfnPermissions.ResourceProperty(
+				table_resource = lf.CfnPermissions.TableResourceProperty(
+					name = glue_table_name.value_as_string,
+					database_name = glue_db_name.value_as_string
+				)
+			), 
+			permissions = ["ALTER", "INSERT", "DELETE", "DESCRIBE"])
+
+		partition_loader_permissions.add_depends_on(amazon_reviews_table)
+
+		partition_loader = inline_function(self, "GluePartitionLoader", "glue_partition_loader",
+			role = partition_loader_role,
+			timeout = core.Duration.minutes(15),
+			memory_size = 256
+		)
 
-			cfn_partition.add_depends_on(amazon_reviews_table)
+		cfn_partitions = core.CustomResource(self, "GluePartitions",
+			service_token = partition_loader.function_arn,
+			resource_type = "Custom::GluePartitions",
+			properties = {
+				"CatalogId" : amazon_reviews_table.catalog_id,
+				"DatabaseName" : glue_db_name.value_as_string,
+				"TableName" : glue_table_name.value_as_string,
+				"Location" : partition_location,
+				"PartitionKeys" : partition_keys,
+				"Partitions" : partitions,
+				"PartitionLocations" : partition_locations or {},
+				"InputFormat" : "org.apache.hadoop.mapred.TextInputFormat",
+				"SerializationLibrary" : "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe",
+				"SerdeParameters" : {
+					"serialization.format": "1"
+				}
+			})
+
+		cfn_partitions.node.add_dependency(amazon_reviews_table)
+		cfn_partitions.node.add_dependency(partition_loader_permissions)
+
+	# Per-partition resources of earlier releases, kept for one update so that the stack drops them
+	# without deleting the partitions (see AuditControlConfig.retain_legacy_resources).
+	# GluePartitions adopts the existing partitions.
+
+		if config.retain_legacy_resources:
+			for partition in PARTITION_LIST:
+				cfn_partition = glue.CfnPartition(self, "Partition" + partition,
+					catalog_id = amazon_reviews_table.catalog_id,
+					database_name = glue_db_name.value_as_string,
+					partition_input = glue.CfnPartition.PartitionInputProperty(
+						values = [ partition ],
+						storage_descriptor = glue.CfnPartition.StorageDescriptorProperty(
+							location = f"{amazon_reviews_bucket.s3_url_for_object()}/parquet/{PARTITION_KEYS[0]}={partition}",
+							input_format = "org.apache.hadoop.mapred.TextInputFormat",
+							serde_info = glue.CfnPartition.SerdeInfoProperty(
+								serialization_library = "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe",
+								parameters = {
+									"serialization.format": "1"
+								}
+							)
+						)
+					),
+					table_name = glue_table_name.value_as_string
+				)
+				cfn_partition.add_depends_on(amazon_reviews_table)
+				cfn_partition.apply_removal_policy(core.RemovalPolicy.RETAIN)
+				cfn_partition.cfn_options.condition = partition_registration_enabled
+				cfn_partitions.node.add_dependency(cfn_partition)
+
+		for construct in [partition_loader_role, partition_loader, cfn_partitions]:
+			construct.node.default_child.cfn_options.condition = partition_registration_enabled
+		partition_loader_permissions.cfn_options.condition = partition_registration_enabled
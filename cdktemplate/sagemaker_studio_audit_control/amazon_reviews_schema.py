@@ -0,0 +1,39 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Glue schema of the Amazon Reviews table, shared by AmazonReviewsDatasetStack and the audit
+# tooling (which does not depend on the CDK).
+
+AMAZON_REVIEWS_DATABASE = "amazon_reviews_db"
+AMAZON_REVIEWS_TABLE = "amazon_reviews_parquet"
+
+AMAZON_REVIEWS_COLUMNS = [
+	{"name": "marketplace", "type": "string"},
+	{"name": "customer_id", "type": "string"},
+	{"name": "review_id","type": "string"},
+	{"name": "product_id","type": "string"},
+	{"name": "product_parent","type": "string"},
+	{"name": "product_title","type": "string"},
+	{"name": "star_rating","type": "int"},
+	{"name": "helpful_votes","type": "int"},
+	{"name": "total_votes","type": "int"},
+	{"name": "vine","type": "string"},
+	{"name": "verified_purchase","type": "string"},
+	{"name": "review_headline","type": "string"},
+	{"name": "review_body","type": "string"},
+	{"name": "review_date","type": "bigint"},
+	{"name": "year","type": "int"}]
+
+PARTITION_KEYS = ["product_category"]
+
+PARTITION_LIST = ["Apparel", "Automotive", "Baby", "Beauty", "Books", "Camera", "Digital_Ebook_Purchase", 
+	"Digital_Music_Purchase", "Digital_Software", "Digital_Video_Download","Digital_Video_Games", "Electronics",
+	"Furniture", "Gift_Card", "Grocery", "Health_&_Personal_Care", "Home", "Home_Entertainment", 
+	"Home_Improvement", "Jewelry", "Kitchen", "Lawn_and_Garden", "Luggage", "Major_Appliances", "Mobile_Apps",
+	"Mobile_Electronics", "Music", "Musical_Instruments", "Office_Products", "Outdoors", "PC", "Personal_Care_Appliances",
+	"Pet_Products", "Shoes", "Software", "Sports", "Tools", "Toys", "Video", "Video_DVD", "Video_Games", 
+	"Watches", "Wireless"]
+
+def amazon_reviews_column_names() -> list:
+	"""Column names of the table, partition keys included (as returned by SELECT *)."""
+	return [column["name"] for column in AMAZON_REVIEWS_COLUMNS] + PARTITION_KEYS
@@ -0,0 +1,158 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import calendar
+import gzip
+import json
+import re
+import time
+
+LAKE_FORMATION_SOURCE = "lakeformation.amazonaws.com"
+ATHENA_SOURCE = "athena.amazonaws.com"
+SAGEMAKER_SOURCE = "sagemaker.amazonaws.com"
+
+GET_DATA_ACCESS = "GetDataAccess"
+START_QUERY_EXECUTION = "StartQueryExecution"
+
+CHUNK_SIZE = 1024 * 1024
+
+# Athena passes the query ID to Lake Formation as "{queryId: <id>}" in the audit context.
+QUERY_ID_PATTERN = re.compile(r'queryId"?\s*[:=]\s*"?([0-9A-Za-z-]+)')
+
+WHITESPACE = " \t\r\n"
+
+class ChunkReader(object):
+	"""JSON values decoded from a text file read in chunks; the buffer holds the unread part of the current chunks."""
+
+	def __init__(self, fp, chunk_size: int):
+		self.fp = fp
+		self.chunk_size = chunk_size
+		self.decoder = json.JSONDecoder()
+		self.buffer = ""
+		self.pos = 0
+		self.eof = False
+
+	def read(self):
+		chunk = self.fp.read(self.chunk_size)
+		self.eof = not chunk
+		self.buffer = self.buffer[self.pos:] + chunk
+		self.pos = 0
+
+	def peek(self, skip: str = "") -> str:
+		"""Next character after the characters in skip, or None at the end of the file."""
+		while True:
+			while self.pos < len(self.buffer) and self.buffer[self.pos] in skip:
+				self.pos += 1
+			if self.pos < len(self.buffer):
+				return self.buffer[self.pos]
+			if self.eof:
+				return None
+			self.read()
+
+	def advance(self):
+		self.pos += 1
+
+	def decode(self):
+		"""Decodes the value at the current position, reading chunks until it is complete."""
+		while True:
+			try:
+				value, end = self.decoder.raw_decode(self.buffer, self.pos)
+				# A number at the end of the buffer may continue in the next chunk.
+				if end < len(self.buffer) or self.eof:
+					self.pos = end
+					return value
+			except json.JSONDecodeError:
+				if self.eof:
+					raise
+			self.read()
+
+def iter_records(fp, chunk_size: int = CHUNK_SIZE):
+	"""
+	Yields the records of a CloudTrail {"Records": [...]} document one at a time. The document
+	is read in chunks and each record is decoded as soon as it is complete, so only the current
+	chunk and record are held in memory, whatever the size of the file. Only the "Records" key of
+	the top-level object is read: the values of other keys are decoded and skipped.
+	"""
+	reader = ChunkReader(fp, chunk_size)
+	if reader.peek(WHITESPACE) != "{":
+		return
+	reader.advance()
+
+	while True:
+		if reader.peek(WHITESPACE + ",") in (None, "}"):
+			return
+		key = reader.decode()
+		if reader.peek(WHITESPACE) != ":":
+			raise ValueError("Expected ':' after key %r of the CloudTrail document" % key)
+		reader.advance()
+		if reader.peek(WHITESPACE) == "[" and key == "Records":
+			reader.advance()
+			break
+		reader.decode()
+
+	while True:
+		if reader.peek(WHITESPACE + ",") in (None, "]"):
+			return
+		yield reader.decode()
+
+def read_records(path: str):
+	"""Yields the records of a CloudTrail log file (gzip or plain JSON)."""
+	opener = gzip.open if path.endswith(".gz") else open
+	with opener(path, "rt") as fp:
+		yield from iter_records(fp)
+
+def parse_event_time(value: str) -> int:
+	"""Seconds since the epoch of a CloudTrail eventTime (e.g. "2021-03-01T12:34:56Z")."""
+	return calendar.timegm((int(value[0:4]), int(value[5:7]), int(value[8:10]),
+		int(value[11:13]), int(value[14:16]), int(value[17:19])))
+
+def format_event_time(seconds: int) -> str:
+	return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seconds))
+
+def is_get_data_access(record: dict) -> bool:
+	return record.get("eventName") == GET_DATA_ACCESS and record.get("eventSource") == LAKE_FORMATION_SOURCE
+
+def is_start_query_execution(record: dict) -> bool:
+	return record.get("eventName") == START_QUERY_EXECUTION and record.get("eventSource") == ATHENA_SOURCE
+
+def access_query_id(record: dict) -> str:
+	"""Athena query ID of a GetDataAccess event, or None for requests made by other services."""
+	audit_context = (record.get("requestParameters") or {}).get("auditContext") or {}
+	match = QUERY_ID_PATTERN.search(str(audit_context.get("additionalAuditContext", "")))
+	return match.group(1) if match else None
+
+def query_execution_id(record: dict) -> str:
+	"""Athena query ID of a StartQueryExecution event, or None if the request failed."""
+	return (record.get("responseElements") or {}).get("queryExecutionId")
+
+def access_table(record: dict) -> tuple:
+	"""(database, table) from the table ARN of a GetDataAccess event."""
+	table_arn = (record.get("requestParameters") or {}).get("tableArn") or ""
+	parts = table_arn.split(":table/", 1)[-1].split("/")
+	return (parts[0], parts[1]) if len(parts) == 2 else (None, None)
+
+def principal_arn(record: dict) -> str:
+	"""
+	IAM principal the data was accessed for: the Lake Formation principal of a GetDataAccess
+	event or the role behind the assumed-role session of any other event.
+	"""
+	principal = (record.get("additionalEventData") or {}).get("lakeFormationPrincipal")
+	if principal:
+		return principal
+	identity = record.get("userIdentity") or {}
+	issuer = (identity.get("sessionContext") or {}).get("sessionIssuer") or {}
+	return issuer.get("arn") or identity.get("arn")
+
+def role_name(arn: str) -> str:
+	"""Role name of a role ARN or of an assumed-role session ARN."""
+	if not arn:
+		return None
+	if ":role/" in arn:
+		return arn.rsplit("/", 1)[-1]
+	if ":assumed-role/" in arn:
+		return arn.split(":assumed-role/", 1)[1].split("/")[0]
+	return None
+
+def user_name(role: str, role_name_prefix: str) -> str:
+	"""Data scientist embedded in a role name following the "<prefix><user>" convention."""
+	return role[len(role_name_prefix):] if role and role.startswith(role_name_prefix) else None
@@ -0,0 +1,210 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from collections import namedtuple
+import heapq
+
+from ..config import ROLE_NAME_PREFIX
+from . import cloudtrail
+from .reader import read_files
+
+# Events of the same query are at most a few seconds apart, but CloudTrail delivers them in
+# separate files up to ~15 minutes late, so both sides are kept for this long.
+JOIN_WINDOW = 15 * 60
+
+AuditRecord = namedtuple("AuditRecord", [
+	"query_id",
+	"principal_arn",
+	"role_name",
+	"user_name",
+	"database",
+	"table",
+	"columns",
+	"query_string",
+	"output_location",
+	"work_group",
+	"access_time",
+	"query_time",
+	"access_event_id",
+	"query_event_id"
+])
+
+class Correlator(object):
+	"""
+	Joins Lake Formation GetDataAccess events with the Athena StartQueryExecution event of the
+	same query ID. Events can arrive in any order within the join window: whichever side comes
+	first is indexed by query ID until its partner arrives or it falls behind the watermark
+	(the latest event time seen minus the window). Memory is bounded by the number of queries
+	within the window, not by the number of events processed.
+
+	CloudTrail can deliver an event more than once: records with an eventID seen within the
+	window are dropped and counted in duplicates.
+
+	column_resolver(query_string, database, table), if given, returns the columns of the table
+	referenced by the query.
+	"""
+
+	def __init__(self,
+			window: int = JOIN_WINDOW,
+			role_name_prefix: str = ROLE_NAME_PREFIX,
+			column_resolver = None,
+			emit_unmatched: bool = False):
+		self.window = window
+		self.role_name_prefix = role_name_prefix
+		self.column_resolver = column_resolver
+		self.emit_unmatched = emit_unmatched
+		self.queries = {}
+		self.accesses = {}
+		self.expiry = []
+		self.watermark = 0
+		self.seen = {}
+		self.seen_expiry = []
+		self.duplicates = 0
+
+	def is_duplicate(self, record: dict, event_time: int) -> bool:
+		"""True if the eventID of record was seen within the window; remembers it otherwise."""
+		event_id = record.get("eventID")
+		if event_id is None:
+			return False
+		if event_id in self.seen:
+			self.duplicates += 1
+			return True
+		self.seen[event_id] = event_time
+		heapq.heappush(self.seen_expiry, (event_time, event_id))
+		return False
+
+	def add(self, record: dict) -> list:
+		"""Adds a CloudTrail record; returns the audit records it completes or expires."""
+		if cloudtrail.is_get_data_access(record):
+			query_id = cloudtrail.access_query_id(record)
+			if query_id is None:
+				return []
+			event_time = cloudtrail.parse_event_time(record["eventTime"])
+			if self.is_duplicate(record, event_time):
+				return []
+			query = self.queries.get(query_id)
+			if query is not None:
+				results = [self.join(record, query)]
+			else:
+				results = []
+				if query_id not in self.accesses:
+					self.accesses[query_id] = (event_time, [])
+					heapq.heappush(self.expiry, (event_time, query_id, False))
+				self.accesses[query_id][1].append(record)
+
+		elif cloudtrail.is_start_query_execution(record):
+			query_id = cloudtrail.query_execution_id(record)
+			if query_id is None:
+				return []
+			event_time = cloudtrail.parse_event_time(record["eventTime"])
+			if self.is_duplicate(record, event_time) or query_id in self.queries:
+				return []
+			self.queries[query_id] = record
+			heapq.heappush(self.expiry, (event_time, query_id, True))
+			_, accesses = self.accesses.pop(query_id, (None, []))
+			results = [self.join(access, record) for access in accesses]
+
+		else:
+			return []
+
+		results.extend(self.advance(event_time))
+		return results
+
+	def advance(self, watermark: int) -> list:
+		"""Moves the watermark forward (never back) and evicts the state that fell out of the window."""
+		if watermark <= self.watermark:
+			return []
+		self.watermark = watermark
+		return self.evict(self.watermark - self.window)
+
+	def size(self) -> int:
+		"""Number of queries with events waiting for their partner."""
+		return len(self.queries) + len(self.accesses)
+
+	def evict(self, before: int) -> list:
+		"""Drops the state older than before; returns the expired accesses if emit_unmatched is set."""
+		while self.seen_expiry and self.seen_expiry[0][0] < before:
+			_, event_id = heapq.heappop(self.seen_expiry)
+			del self.seen[event_id]
+
+		results = []
+		while self.expiry and self.expiry[0][0] < before:
+			event_time, query_id, is_query = heapq.heappop(self.expiry)
+			if is_query:
+				del self.queries[query_id]
+			elif self.accesses.get(query_id, (None,))[0] == event_time:
+				_, accesses = self.accesses.pop(query_id)
+				if self.emit_unmatched:
+					results.extend(self.join(access, None) for access in accesses)
+		return results
+
+	def flush(self) -> list:
+		"""Drops all the state at the end of the input."""
+		return self.evict(float("inf"))
+
+	def state(self):
+		"""Yields (is_query, query_id, event_time, record) for every event waiting for its partner."""
+		for query_id, record in self.queries.items():
+			yield True, query_id, cloudtrail.parse_event_time(record["eventTime"]), record
+		for query_id, (event_time, accesses) in self.accesses.items():
+			for record in accesses:
+				yield False, query_id, event_time, record
+
+	def restore(self, state, watermark: int = 0) -> None:
+		"""Loads the events saved from state() by an earlier run."""
+		for is_query, query_id, event_time, record in state:
+			self.is_duplicate(record, event_time)
+			if is_query:
+				self.queries[query_id] = record
+			elif query_id in self.accesses:
+				self.accesses[query_id][1].append(record)
+				continue
+			else:
+				self.accesses[query_id] = (event_time, [record])
+			heapq.heappush(self.expiry, (event_time, query_id, is_query))
+		self.watermark = max(self.watermark, watermark)
+
+	def join(self, access: dict, query: dict) -> AuditRecord:
+		principal = cloudtrail.principal_arn(access)
+		role = cloudtrail.role_name(principal)
+		database, table = cloudtrail.access_table(access)
+		query_id = cloudtrail.access_query_id(access)
+		query_string = output_location = work_group = None
+		if query is not None:
+			parameters = query.get("requestParameters") or {}
+			query_string = parameters.get("queryString")
+			work_group = parameters.get("workGroup")
+			output_location = (parameters.get("resultConfiguration") or {}).get("outputLocation")
+			if output_location:
+				output_location = output_location.rstrip("/") + "/" + query_id + ".csv"
+
+		columns = ()
+		if self.column_resolver is not None and query_string:
+			columns = tuple(self.column_resolver(query_string, database, table))
+
+		return AuditRecord(
+			query_id = query_id,
+			principal_arn = principal,
+			role_name = role,
+			user_name = cloudtrail.user_name(role, self.role_name_prefix),
+			database = database,
+			table = table,
+			columns = columns,
+			query_string = query_string,
+			output_location = output_location,
+			work_group = work_group,
+			access_time = access.get("eventTime"),
+			query_time = query.get("eventTime") if query is not None else None,
+			access_event_id = access.get("eventID"),
+			query_event_id = query.get("eventID") if query is not None else None)
+
+def correlate(records, **kwargs):
+	"""Yields the audit records of an iterable of CloudTrail records in a single pass."""
+	correlator = Correlator(**kwargs)
+	for record in records:
+		yield from correlator.add(record)
+	yield from correlator.flush()
+
+def correlate_files(paths: list, processes: int = None, **kwargs):
+	"""Yields the audit records of CloudTrail log files, read in the given (delivery) order."""
+	return correlate(read_files(paths, processes = processes), **kwargs)
@@ -0,0 +1,233 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from collections import namedtuple
+import json
+import re
+
+from ..amazon_reviews_schema import AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE
+from ..config import ROLE_NAME_PREFIX
+from ..user_manifest import ACCESS_COLUMNS
+from . import cloudtrail
+
+LAKE_FORMATION_PERMISSIONS = "AWS::LakeFormation::Permissions"
+
+SUB_PATTERN = re.compile(r"\$\{([^}!][^}]*)\}")
+
+# Values of the pseudo parameters, which are only known once the stack is deployed.
+PSEUDO_PARAMETERS = {
+	"AWS::AccountId": "${AWS::AccountId}",
+	"AWS::Region": "${AWS::Region}",
+	"AWS::Partition": "aws",
+	"AWS::URLSuffix": "amazonaws.com",
+	"AWS::StackName": "${AWS::StackName}",
+	"AWS::NoValue": None
+}
+
+class TemplateResolver(object):
+	"""
+	Resolves the intrinsic functions a synthesized template uses for its Lake Formation grants
+	(Ref, Fn::GetAtt on IAM roles, Fn::Join, Fn::Sub, Fn::Select, Fn::If and the condition
+	functions). Parameters take the given values, or their defaults.
+	"""
+
+	def __init__(self, template: dict, parameters: dict = None, pseudo_parameters: dict = PSEUDO_PARAMETERS):
+		self.template = template
+		self.resources = template.get("Resources", {})
+		self.values = dict(pseudo_parameters)
+		for name, parameter in template.get("Parameters", {}).items():
+			if "Default" in parameter:
+				self.values[name] = parameter["Default"]
+		self.values.update(parameters or {})
+		self.conditions = {}
+
+	def resolve(self, value):
+		if isinstance(value, list):
+			return [self.resolve(v) for v in value]
+		if not isinstance(value, dict):
+			return value
+		if len(value) != 1:
+			return {k: self.resolve(v) for k, v in value.items()}
+
+		function, args = next(iter(value.items()))
+		if function == "Ref":
+			return self.ref(args)
+		if function == "Fn::GetAtt":
+			return self.get_att(*(args.split(".", 1) if isinstance(args, str) else args))
+		if function == "Fn::Join":
+			return self.resolve(args[0]).join(str(v) for v in self.resolve(args[1]))
+		if function == "Fn::Select":
+			return self.resolve(args[1])[int(self.resolve(args[0]))]
+		if function == "Fn::Split":
+			return self.resolve(args[1]).split(self.resolve(args[0]))
+		if function == "Fn::Sub":
+			return self.sub(*(args if isinstance(args, list) else [args, {}]))
+		if function == "Fn::If":
+			return self.resolve(args[1] if self.condition(args[0]) else args[2])
+		if function in ["Fn::Equals", "Fn::Not", "Fn::And", "Fn::Or", "Condition"]:
+			return self.evaluate(value)
+		return {function: self.resolve(args)}
+
+	def ref(self, name: str):
+		if name in self.values:
+			return self.values[name]
+		if name in self.resources:
+			# Physical names are only known once deployed, except for named IAM roles.
+			return self.resolve(self.resources[name].get("Properties", {}).get("RoleName", name))
+		raise ValueError("Unresolved reference: %s" % name)
+
+	def get_att(self, name: str, attribute: str):
+		resource = self.resources.get(name, {})
+		if resource.get("Type") == "AWS::IAM::Role" and attribute == "Arn":
+			return "arn:%s:iam::%s:role%s%s" % (self.values["AWS::Partition"], self.values["AWS::AccountId"],
+				self.resolve(resource["Properties"].get("Path", "/")), self.ref(name))
+		raise ValueError("Unsupported attribute: %s.%s" % (name, attribute))
+
+	def sub(self, text: str, variables: dict):
+		variables = {k: self.resolve(v) for k, v in variables.items()}
+		def replace(match):
+			name = match.group(1)
+			if name in variables:
+				return str(variables[name])
+			if "." in name:
+				return str(self.get_att(*name.split(".", 1)))
+			return str(self.ref(name))
+		return SUB_PATTERN.sub(replace, text)
+
+	def condition(self, name: str) -> bool:
+		if name not in self.conditions:
+			self.conditions[name] = self.evaluate(self.template.get("Conditions", {})[name])
+		return self.conditions[name]
+
+	def evaluate(self, expression) -> bool:
+		function, args = next(iter(expression.items()))
+		if function == "Condition":
+			return self.condition(args)
+		if function == "Fn::Equals":
+			return self.resolve(args[0]) == self.resolve(args[1])
+		if function == "Fn::Not":
+			return not self.evaluate(args[0])
+		if function == "Fn::And":
+			return all(self.evaluate(a) for a in args)
+		if function == "Fn::Or":
+			return any(self.evaluate(a) for a in args)
+		raise ValueError("Unsupported condition: %s" % function)
+
+	def is_created(self, resource: dict) -> bool:
+		return "Condition" not in resource or self.condition(resource["Condition"])
+
+class Grant(namedtuple("Grant", ["columns", "excluded_columns"])):
+	"""SELECT grant on a table: columns is None for all the columns but excluded_columns."""
+
+	def allows(self, column: str) -> bool:
+		if self.columns is None:
+			return column not in self.excluded_columns
+		return column in self.columns
+
+	def merge(self, other: "Grant") -> "Grant":
+		if self.columns is None and other.columns is None:
+			return Grant(None, self.excluded_columns & other.excluded_columns)
+		if self.columns is None or other.columns is None:
+			full, partial = (self, other) if self.columns is None else (other, self)
+			return Grant(None, full.excluded_columns - partial.columns)
+		return Grant(self.columns | other.columns, frozenset())
+
+class GrantIndex(object):
+	"""
+	SELECT grants by principal (role name, or ARN for other principals) and then by
+	(database, table). Column names are compared in lower case, as Glue stores them.
+	"""
+
+	def __init__(self):
+		self.grants = {}
+
+	def add(self, principal: str, database: str, table: str, columns: list = None, excluded_columns: list = ()) -> None:
+		grant = Grant(
+			frozenset(c.lower() for c in columns) if columns is not None else None,
+			frozenset(c.lower() for c in excluded_columns))
+		tables = self.grants.setdefault(principal, {})
+		key = (database, table)
+		tables[key] = tables[key].merge(grant) if key in tables else grant
+
+	def get(self, principal: str, database: str, table: str) -> Grant:
+		return self.grants.get(principal, {}).get((database, table))
+
+	def tables(self) -> set:
+		return {key for tables in self.grants.values() for key in tables}
+
+	def add_template(self, template: dict, parameters: dict = None) -> None:
+		"""Adds the SELECT grants of the Lake Formation permissions of a synthesized template."""
+		resolver = TemplateResolver(template, parameters)
+		for resource in template.get("Resources", {}).values():
+			if resource.get("Type") != LAKE_FORMATION_PERMISSIONS or not resolver.is_created(resource):
+				continue
+			properties = resolver.resolve(resource.get("Properties", {}))
+			if "SELECT" not in properties.get("Permissions", []) and "ALL" not in properties.get("Permissions", []):
+				continue
+
+			arn = properties["DataLakePrincipal"]["DataLakePrincipalIdentifier"]
+			principal = cloudtrail.role_name(arn) or arn
+			lf_resource = properties.get("Resource", {})
+			if "TableWithColumnsResource" in lf_resource:
+				table = lf_resource["TableWithColumnsResource"]
+				wildcard = table.get("ColumnWildcard")
+				if wildcard is not None:
+					self.add(principal, table["DatabaseName"], table["Name"], None, wildcard.get("ExcludedColumnNames", []))
+				else:
+					self.add(principal, table["DatabaseName"], table["Name"], table.get("ColumnNames", []))
+			elif "TableResource" in lf_resource:
+				table = lf_resource["TableResource"]
+				self.add(principal, table["DatabaseName"], table["Name"])
+
+	def add_users(self, users: list, role_name_prefix: str = ROLE_NAME_PREFIX,
+			database: str = AMAZON_REVIEWS_DATABASE, table: str = AMAZON_REVIEWS_TABLE) -> None:
+		"""
+		Adds the grants DataScientistUsersStack creates for the users of the manifest
+		(user_manifest.load_user_manifest), with the default names of its parameters.
+		"""
+		for user in users:
+			self.add(role_name_prefix + user.name, database, table, user.columns if user.access == ACCESS_COLUMNS else None)
+
+	def add_lake_formation(self, principal_arn: str, lakeformation = None) -> None:
+		"""Adds the SELECT grants of a principal on named tables, as listed by Lake Formation."""
+		if lakeformation is None:
+			import boto3
+			lakeformation = boto3.client("lakeformation")
+
+		principal = cloudtrail.role_name(principal_arn) or principal_arn
+		request = { "Principal": { "DataLakePrincipalIdentifier": principal_arn } }
+		while True:
+			response = lakeformation.list_permissions(**request)
+			for permission in response.get("PrincipalResourcePermissions", []):
+				if "SELECT" not in permission.get("Permissions", []) and "ALL" not in permission.get("Permissions", []):
+					continue
+				resource = permission.get("Resource", {})
+				if "TableWithColumns" in resource:
+					table = resource["TableWithColumns"]
+					wildcard = table.get("ColumnWildcard")
+					if wildcard is not None:
+						self.add(principal, table["DatabaseName"], table["Name"], None, wildcard.get("ExcludedColumnNames", []))
+					else:
+						self.add(principal, table["DatabaseName"], table["Name"], table.get("ColumnNames", []))
+				elif "Name" in resource.get("Table", {}):
+					self.add(principal, resource["Table"]["DatabaseName"], resource["Table"]["Name"])
+			if not response.get("NextToken"):
+				break
+			request["NextToken"] = response["NextToken"]
+
+	@classmethod
+	def from_templates(cls, paths: list, parameters: dict = None) -> "GrantIndex":
+		"""
+		Loads the grants of synthesized templates (e.g. cdk.out/*.template.json). YAML templates
+		written by "cdk synth" need PyYAML.
+		"""
+		index = cls()
+		for path in paths:
+			with open(path) as fp:
+				if path.endswith(".yaml") or path.endswith(".yml"):
+					import yaml
+					template = yaml.safe_load(fp)
+				else:
+					template = json.load(fp)
+			index.add_template(template, parameters)
+		return index
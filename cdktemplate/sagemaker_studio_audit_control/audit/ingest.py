@@ -0,0 +1,149 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from collections import namedtuple
+import json
+import os
+import sqlite3
+import time
+
+from .correlation import Correlator
+from .reader import read_files
+
+LogObject = namedtuple("LogObject", ["key", "etag", "size", "path"])
+
+MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+	key TEXT PRIMARY KEY,
+	etag TEXT NOT NULL,
+	size INTEGER NOT NULL,
+	ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending (
+	is_query INTEGER NOT NULL,
+	query_id TEXT NOT NULL,
+	event_time INTEGER NOT NULL,
+	record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS watermark (
+	id INTEGER PRIMARY KEY CHECK (id = 0),
+	event_time INTEGER NOT NULL
+);
+"""
+
+def list_local_objects(directory: str) -> list:
+	"""Log files under a local directory (e.g. an "aws s3 sync" of the trail bucket)."""
+	objects = []
+	for root, _, files in os.walk(directory):
+		for name in files:
+			if name.endswith(".json.gz") or name.endswith(".json"):
+				path = os.path.join(root, name)
+				stat = os.stat(path)
+				objects.append(LogObject(os.path.relpath(path, directory), "%d-%d" % (stat.st_size, stat.st_mtime_ns), stat.st_size, path))
+	return sorted(objects)
+
+def list_s3_objects(bucket: str, prefix: str, s3 = None) -> list:
+	"""
+	Log objects under an S3 prefix, to be downloaded with s3_fetcher when they are read, so only
+	the objects that were not ingested yet are transferred.
+	"""
+	if s3 is None:
+		import boto3
+		s3 = boto3.client("s3")
+
+	objects = []
+	paginator = s3.get_paginator("list_objects_v2")
+	for page in paginator.paginate(Bucket = bucket, Prefix = prefix):
+		for o in page.get("Contents", []):
+			if o["Key"].endswith(".json.gz"):
+				objects.append(LogObject(o["Key"], o["ETag"], o["Size"], None))
+	return objects
+
+class IngestManifest(object):
+	"""
+	SQLite manifest of the log objects already ingested (key, ETag and size) and of the events
+	still waiting for their partner, so that each run reads only new objects and joins events
+	whose partner is delivered in a later run.
+	"""
+
+	def __init__(self, path: str):
+		self.db = sqlite3.connect(path)
+		self.db.executescript(MANIFEST_SCHEMA)
+
+	def close(self) -> None:
+		self.db.close()
+
+	def new_objects(self, objects: list) -> list:
+		"""Objects that were never ingested or whose ETag changed since they were."""
+		ingested = dict(self.db.execute("SELECT key, etag FROM objects"))
+		return [o for o in objects if ingested.get(o.key) != o.etag]
+
+	def restore(self, correlator: Correlator) -> None:
+		row = self.db.execute("SELECT event_time FROM watermark").fetchone()
+		correlator.restore(
+			((bool(is_query), query_id, event_time, json.loads(record))
+				for is_query, query_id, event_time, record in self.db.execute("SELECT is_query, query_id, event_time, record FROM pending")),
+			watermark = row[0] if row else 0)
+
+	def save(self, correlator: Correlator, objects: list) -> None:
+		"""Marks objects as ingested and replaces the pending events, in one transaction."""
+		with self.db:
+			now = time.time()
+			self.db.executemany("INSERT OR REPLACE INTO objects (key, etag, size, ingested_at) VALUES (?, ?, ?, ?)",
+				[(o.key, o.etag, o.size, now) for o in objects])
+			self.db.execute("DELETE FROM pending")
+			self.db.executemany("INSERT INTO pending (is_query, query_id, event_time, record) VALUES (?, ?, ?, ?)",
+				[(int(is_query), query_id, event_time, json.dumps(record)) for is_query, query_id, event_time, record in correlator.state()])
+			self.db.execute("INSERT OR REPLACE INTO watermark (id, event_time) VALUES (0, ?)", (correlator.watermark,))
+
+def ingest(manifest: IngestManifest, objects: list, fetch = None, processes: int = None, before_save = None, **kwargs):
+	"""
+	Yields the audit records completed by the objects not yet in the manifest. Events without
+	a partner are saved in the manifest and joined when the partner shows up in a later run
+	(or expire after the join window). fetch(object), if given, returns the local path of an
+	object listed without one, e.g. by downloading it from S3; the fetched file is deleted once
+	it was read. before_save(), if given, is called before the manifest is committed, e.g. to
+	write aggregates in the same transaction.
+
+	The manifest is only updated once all the records were consumed: an interrupted run is
+	repeated from the same point the next time.
+	"""
+	correlator = Correlator(**kwargs)
+	manifest.restore(correlator)
+
+	new = manifest.new_objects(objects)
+	fetched = set()
+
+	def local_path(o: LogObject) -> str:
+		if o.path is not None:
+			return o.path
+		path = fetch(o)
+		fetched.add(path)
+		return path
+
+	def release(path: str) -> None:
+		if path in fetched:
+			fetched.remove(path)
+			os.remove(path)
+
+	paths = (local_path(o) for o in new)
+	for record in read_files(paths, processes = processes, on_read = release):
+		yield from correlator.add(record)
+
+	if before_save is not None:
+		before_save()
+	manifest.save(correlator, new)
+
+def s3_fetcher(bucket: str, download_dir: str, s3 = None):
+	"""fetch function for ingest() that downloads objects listed by list_s3_objects."""
+	if s3 is None:
+		import boto3
+		s3 = boto3.client("s3")
+
+	def fetch(o: LogObject) -> str:
+		path = os.path.join(download_dir, o.key)
+		os.makedirs(os.path.dirname(path), exist_ok = True)
+		s3.download_file(bucket, o.key, path)
+		return path
+
+	return fetch
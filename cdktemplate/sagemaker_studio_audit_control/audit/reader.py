@@ -0,0 +1,57 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+from . import cloudtrail
+
+# Events used by the audit tooling, by event source.
+AUDIT_EVENTS = {
+	cloudtrail.LAKE_FORMATION_SOURCE: {cloudtrail.GET_DATA_ACCESS},
+	cloudtrail.ATHENA_SOURCE: {cloudtrail.START_QUERY_EXECUTION},
+	cloudtrail.SAGEMAKER_SOURCE: {"CreatePresignedDomainUrl", "CreateApp"}
+}
+
+def filter_records(records, events: dict = AUDIT_EVENTS):
+	"""Yields the records whose eventSource and eventName are listed in events."""
+	for record in records:
+		names = events.get(record.get("eventSource"))
+		if names is not None and record.get("eventName") in names:
+			yield record
+
+def read_file(path: str, events: dict = AUDIT_EVENTS) -> list:
+	"""Decompresses and parses one log file, keeping only the listed events."""
+	return list(filter_records(cloudtrail.read_records(path), events))
+
+def read_files(paths, events: dict = AUDIT_EVENTS, processes: int = None, on_read = None):
+	"""
+	Yields the listed events of the log files, in file order. Files are decompressed and parsed
+	in a process pool; only the matching records are sent back to this process. At most two
+	files per process are in flight, so memory stays flat however many files are read.
+	on_read(path), if given, is called once the events of a file were yielded.
+	"""
+	processes = processes or os.cpu_count() or 1
+	if processes == 1:
+		for path in paths:
+			yield from filter_records(cloudtrail.read_records(path), events)
+			if on_read is not None:
+				on_read(path)
+		return
+
+	with ProcessPoolExecutor(max_workers = processes) as executor:
+		pending = deque()
+
+		def next_file():
+			path, future = pending.popleft()
+			yield from future.result()
+			if on_read is not None:
+				on_read(path)
+
+		for path in paths:
+			pending.append((path, executor.submit(read_file, path, events)))
+			if len(pending) >= 2 * processes:
+				yield from next_file()
+		while pending:
+			yield from next_file()
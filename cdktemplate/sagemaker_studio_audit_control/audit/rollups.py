@@ -0,0 +1,179 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from collections import Counter
+import datetime
+import sqlite3
+
+from .sql import fingerprint
+
+# Upserts need SQLite 3.24 or later.
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audited_access (
+	access_event_id TEXT PRIMARY KEY,
+	day TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS audited_access_day ON audited_access (day);
+CREATE TABLE IF NOT EXISTS audited_horizon (
+	id INTEGER PRIMARY KEY CHECK (id = 0),
+	day TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS table_access (
+	day TEXT NOT NULL,
+	principal TEXT NOT NULL,
+	user_name TEXT NOT NULL,
+	database_name TEXT NOT NULL,
+	table_name TEXT NOT NULL,
+	accesses INTEGER NOT NULL,
+	PRIMARY KEY (day, principal, user_name, database_name, table_name)
+);
+CREATE TABLE IF NOT EXISTS column_access (
+	day TEXT NOT NULL,
+	principal TEXT NOT NULL,
+	database_name TEXT NOT NULL,
+	table_name TEXT NOT NULL,
+	column_name TEXT NOT NULL,
+	accesses INTEGER NOT NULL,
+	PRIMARY KEY (day, principal, database_name, table_name, column_name)
+);
+CREATE TABLE IF NOT EXISTS query_shape (
+	fingerprint TEXT NOT NULL,
+	principal TEXT NOT NULL,
+	sample TEXT NOT NULL,
+	executions INTEGER NOT NULL,
+	last_seen TEXT NOT NULL,
+	PRIMARY KEY (fingerprint, principal)
+);
+CREATE TABLE IF NOT EXISTS violation (
+	day TEXT NOT NULL,
+	principal TEXT NOT NULL,
+	kind TEXT NOT NULL,
+	violations INTEGER NOT NULL,
+	PRIMARY KEY (day, principal, kind)
+);
+"""
+
+FLUSH_INTERVAL = 100000
+
+# The eventIDs of the accesses counted are kept for this many days before the latest day counted.
+# CloudTrail delivers events, duplicates included, within hours, so older ones only come back
+# when old log objects are ingested again.
+AUDITED_ACCESS_RETENTION_DAYS = 30
+
+REPORTS = {
+	"daily-access": """
+		SELECT day, user_name, principal, database_name, table_name, accesses FROM table_access
+		WHERE day BETWEEN :start AND :end
+		ORDER BY day, user_name, database_name, table_name""",
+	"columns-by-role": """
+		SELECT principal, database_name, table_name, column_name, SUM(accesses) AS accesses FROM column_access
+		WHERE day BETWEEN :start AND :end
+		GROUP BY principal, database_name, table_name, column_name
+		ORDER BY principal, database_name, table_name, accesses DESC""",
+	"top-queries": """
+		SELECT executions, principal, last_seen, sample FROM query_shape
+		ORDER BY executions DESC
+		LIMIT :limit""",
+	"violations": """
+		SELECT day, principal, kind, violations FROM violation
+		WHERE day BETWEEN :start AND :end
+		ORDER BY day, principal, kind"""
+}
+
+class AuditRollups(object):
+	"""
+	Aggregates of the audit records, maintained at ingest time in SQLite: accesses per day,
+	principal and table, column reads per day, principal and column, executions per query shape
+	(fingerprint) and principal, and violations per day, principal and kind. Reports read these
+	tables only, never the event history. Each access is counted once: the eventIDs of the
+	accesses counted are kept in audited_access, so CloudTrail events delivered more than once,
+	and log objects ingested again, do not inflate the counts. prune() keeps audited_access to the
+	last retention_days before the latest day counted, and moves a horizon there: accesses of
+	days before the horizon are not counted any more, since they were counted or are re-deliveries
+	of objects ingested long ago.
+
+	Counts are accumulated in memory and added to the tables by flush(), which does not commit:
+	sharing the connection of ingest.IngestManifest makes the rollups and the manifest commit
+	together.
+	"""
+
+	def __init__(self, db: sqlite3.Connection, flush_interval: int = FLUSH_INTERVAL):
+		self.db = db
+		self.db.executescript(ROLLUP_SCHEMA)
+		self.flush_interval = flush_interval
+		row = self.db.execute("SELECT day FROM audited_horizon").fetchone()
+		self.horizon = row[0] if row else "0000-00-00"
+		self.clear()
+
+	def clear(self) -> None:
+		self.pending = 0
+		self.table_access = Counter()
+		self.column_access = Counter()
+		self.query_shape = Counter()
+		self.samples = {}
+		self.violations = Counter()
+
+	def add(self, record) -> bool:
+		"""Adds an audit record (correlation.AuditRecord); returns False if its access was already counted."""
+		day = record.access_time[:10]
+		if day < self.horizon:
+			return False
+		if record.access_event_id is not None:
+			cursor = self.db.execute("INSERT OR IGNORE INTO audited_access (access_event_id, day) VALUES (?, ?)", (record.access_event_id, day))
+			if cursor.rowcount == 0:
+				return False
+		principal = record.role_name or record.principal_arn or ""
+		self.table_access[(day, principal, record.user_name or "", record.database or "", record.table or "")] += 1
+		for column in record.columns:
+			self.column_access[(day, principal, record.database or "", record.table or "", column)] += 1
+		if record.query_string:
+			key = (fingerprint(record.query_string), principal)
+			self.query_shape[key] += 1
+			self.samples[key] = (record.query_string, record.query_time or record.access_time)
+		self.pending += 1
+		if self.pending >= self.flush_interval:
+			self.flush()
+		return True
+
+	def add_violation(self, violation) -> None:
+		"""Adds a violations.Violation."""
+		record = violation.record
+		self.violations[(record.access_time[:10], record.role_name or record.principal_arn or "", violation.kind)] += 1
+
+	def flush(self) -> None:
+		self.db.executemany("""
+			INSERT INTO table_access VALUES (?, ?, ?, ?, ?, ?)
+			ON CONFLICT (day, principal, user_name, database_name, table_name) DO UPDATE SET accesses = accesses + excluded.accesses""",
+			[key + (count,) for key, count in self.table_access.items()])
+		self.db.executemany("""
+			INSERT INTO column_access VALUES (?, ?, ?, ?, ?, ?)
+			ON CONFLICT (day, principal, database_name, table_name, column_name) DO UPDATE SET accesses = accesses + excluded.accesses""",
+			[key + (count,) for key, count in self.column_access.items()])
+		self.db.executemany("""
+			INSERT INTO query_shape VALUES (?, ?, ?, ?, ?)
+			ON CONFLICT (fingerprint, principal) DO UPDATE SET executions = executions + excluded.executions, sample = excluded.sample,
+				last_seen = MAX(last_seen, excluded.last_seen)""",
+			[key + (self.samples[key][0], count, self.samples[key][1]) for key, count in self.query_shape.items()])
+		self.db.executemany("""
+			INSERT INTO violation VALUES (?, ?, ?, ?)
+			ON CONFLICT (day, principal, kind) DO UPDATE SET violations = violations + excluded.violations""",
+			[key + (count,) for key, count in self.violations.items()])
+		self.clear()
+
+	def prune(self, retention_days: int = AUDITED_ACCESS_RETENTION_DAYS) -> int:
+		"""Forgets the accesses counted before the retention; returns the number of eventIDs deleted."""
+		latest = self.db.execute("SELECT MAX(day) FROM audited_access").fetchone()[0]
+		if latest is None:
+			return 0
+		horizon = (datetime.datetime.strptime(latest, "%Y-%m-%d").date() - datetime.timedelta(days = retention_days)).isoformat()
+		if horizon <= self.horizon:
+			return 0
+		deleted = self.db.execute("DELETE FROM audited_access WHERE day < ?", (horizon,)).rowcount
+		self.db.execute("INSERT OR REPLACE INTO audited_horizon (id, day) VALUES (0, ?)", (horizon,))
+		self.horizon = horizon
+		return deleted
+
+	def report(self, name: str, start: str = "0000-00-00", end: str = "9999-99-99", limit: int = 20) -> tuple:
+		"""Returns the column names and rows of one of the REPORTS."""
+		cursor = self.db.execute(REPORTS[name], { "start": start, "end": end, "limit": limit })
+		return [d[0] for d in cursor.description], cursor.fetchall()
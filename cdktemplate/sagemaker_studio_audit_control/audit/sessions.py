@@ -0,0 +1,206 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import bisect
+import heapq
+
+from ..config import ROLE_NAME_PREFIX
+from .correlation import JOIN_WINDOW, Correlator
+from . import cloudtrail
+
+CREATE_PRESIGNED_DOMAIN_URL = "CreatePresignedDomainUrl"
+CREATE_APP = "CreateApp"
+
+# A user's activity separated by more than this starts a new session.
+SESSION_GAP = 30 * 60
+
+LOGIN = 0
+APP = 1
+ACCESS = 2
+
+class Session(object):
+	"""
+	Activity of one user profile between two gaps of more than SESSION_GAP: Studio logins
+	(CreatePresignedDomainUrl), app launches (CreateApp) and the data accesses of the
+	profile's execution role (correlation.AuditRecord).
+	"""
+
+	def __init__(self, session_id: str, user_profile_name: str, start: int):
+		self.session_id = session_id
+		self.user_profile_name = user_profile_name
+		self.start = start
+		self.end = start
+		self.logins = []
+		self.apps = []
+		self.accesses = []
+
+	def add(self, kind: int, event_time: int, event) -> None:
+		self.end = max(self.end, event_time)
+		if kind == LOGIN:
+			self.logins.append(event)
+		elif kind == APP:
+			self.apps.append(event)
+		else:
+			self.accesses.append(event)
+
+	def columns_read(self) -> set:
+		"""(database, table, column) read in the session; columns are only known with a column_resolver."""
+		return {(a.database, a.table, c) for a in self.accesses for c in a.columns}
+
+	def __repr__(self):
+		return "Session(%s, %s, %s - %s, %d logins, %d apps, %d accesses)" % (self.session_id, self.user_profile_name,
+			cloudtrail.format_event_time(self.start), cloudtrail.format_event_time(self.end), len(self.logins), len(self.apps), len(self.accesses))
+
+class Sessionizer(object):
+	"""
+	Reconstructs Studio sessions per user profile. Profiles are tied to execution roles by the
+	CreateApp calls made with the role (the "userprofilename" principal tag) and by the role name
+	convention <role_name_prefix><user>. The activity of each profile (logins, app launches and
+	the data accesses of its role) is sorted and split into sessions at gaps longer than
+	session_gap. Accesses of roles shared by several profiles are attributed to the session
+	covering their time, found by binary search in the interval index of the sessions of each
+	profile of the role. Accesses of roles without any profile, and shared accesses outside every
+	session, are returned apart as unattributed.
+	Events and accesses delivered more than once (same eventID) within the window are added once:
+	event IDs are forgotten once their event time, or the watermark when they were added if it was
+	later, falls behind the watermark (the latest event time added minus the window).
+	Sorting dominates, so n events are sessionized in O(n log n). sessions() can be called again
+	as more events are added.
+	"""
+
+	def __init__(self, session_gap: int = SESSION_GAP, role_name_prefix: str = ROLE_NAME_PREFIX, window: int = JOIN_WINDOW):
+		self.session_gap = session_gap
+		self.role_name_prefix = role_name_prefix
+		self.window = window
+		self.activity = {}
+		self.role_profiles = {}
+		self.role_accesses = []
+		self.watermark = 0
+		self.seen = {}
+		self.seen_expiry = []
+
+	def is_duplicate(self, event_id: str, event_time: int) -> bool:
+		if event_id is not None:
+			if event_id in self.seen:
+				return True
+			# Late events are remembered for the window from the watermark they arrived at.
+			expiry = max(event_time, self.watermark)
+			self.seen[event_id] = expiry
+			heapq.heappush(self.seen_expiry, (expiry, event_id))
+		if event_time > self.watermark:
+			self.watermark = event_time
+			while self.seen_expiry and self.seen_expiry[0][0] < self.watermark - self.window:
+				_, expired = heapq.heappop(self.seen_expiry)
+				del self.seen[expired]
+		return False
+
+	def add_event(self, record: dict) -> None:
+		"""Adds a CreatePresignedDomainUrl or CreateApp CloudTrail record; other records are ignored."""
+		if record.get("eventSource") != cloudtrail.SAGEMAKER_SOURCE or record.get("errorCode"):
+			return
+		name = record.get("eventName")
+		if name not in [CREATE_PRESIGNED_DOMAIN_URL, CREATE_APP]:
+			return
+		profile = (record.get("requestParameters") or {}).get("userProfileName")
+		if not profile:
+			return
+		event_time = cloudtrail.parse_event_time(record["eventTime"])
+		if self.is_duplicate(record.get("eventID"), event_time):
+			return
+		if name == CREATE_APP:
+			role = cloudtrail.role_name(cloudtrail.principal_arn(record))
+			if role:
+				self.role_profiles.setdefault(role, set()).add(profile)
+		self.activity.setdefault(profile, []).append((event_time, LOGIN if name == CREATE_PRESIGNED_DOMAIN_URL else APP, record))
+
+	def add_access(self, record) -> None:
+		"""Adds a data access (correlation.AuditRecord)."""
+		event_time = cloudtrail.parse_event_time(record.access_time)
+		if self.is_duplicate(record.access_event_id, event_time):
+			return
+		self.role_accesses.append((event_time, record))
+
+	def profiles(self, role: str) -> set:
+		profiles = set(self.role_profiles.get(role, ()))
+		user = cloudtrail.user_name(role, self.role_name_prefix)
+		if user and (not profiles or user in self.activity):
+			profiles.add(user)
+		return profiles
+
+	def sessions(self) -> list:
+		"""Sessions of all the profiles, sorted by start time."""
+		return self.build()[0]
+
+	def unattributed(self) -> list:
+		"""Accesses (correlation.AuditRecord) that are in no session, in time order."""
+		return self.build()[1]
+
+	def build(self) -> tuple:
+		"""(sessions, unattributed accesses) of the events added so far; the events are kept."""
+		activity = { profile: list(events) for profile, events in self.activity.items() }
+		shared = []
+		unattributed = []
+		for event_time, record in self.role_accesses:
+			profiles = self.profiles(record.role_name)
+			if len(profiles) == 1:
+				activity.setdefault(next(iter(profiles)), []).append((event_time, ACCESS, record))
+			elif profiles:
+				shared.append((event_time, record, profiles))
+			else:
+				unattributed.append((event_time, record))
+
+		sessions = []
+		for profile, events in activity.items():
+			events.sort(key = lambda a: (a[0], a[1]))
+			session = None
+			number = 0
+			for event_time, kind, event in events:
+				if session is None or event_time - session.end > self.session_gap:
+					number += 1
+					session = Session("%s-%d" % (profile, number), profile, event_time)
+					sessions.append(session)
+				session.add(kind, event_time, event)
+
+		unattributed.extend(self.attribute(shared, sessions))
+		sessions.sort(key = lambda s: (s.start, s.session_id))
+		unattributed.sort(key = lambda a: a[0])
+		return sessions, [record for _, record in unattributed]
+
+	def attribute(self, accesses: list, sessions: list) -> list:
+		"""
+		Attributes accesses of roles shared by several profiles using an interval index per
+		profile; returns the (event time, access) outside every session of their profiles.
+		"""
+		index = {}
+		for session in sessions:
+			index.setdefault(session.user_profile_name, []).append(session)
+		starts = {}
+		for profile, profile_sessions in index.items():
+			profile_sessions.sort(key = lambda s: s.start)
+			starts[profile] = [s.start for s in profile_sessions]
+
+		unattributed = []
+		for event_time, record, profiles in accesses:
+			for profile in sorted(profiles):
+				position = bisect.bisect_right(starts.get(profile, []), event_time) - 1
+				if position >= 0:
+					session = index[profile][position]
+					if event_time <= session.end + self.session_gap:
+						session.add(ACCESS, event_time, record)
+						break
+			else:
+				unattributed.append((event_time, record))
+		return unattributed
+
+def sessionize(records, session_gap: int = SESSION_GAP, **kwargs) -> list:
+	"""Sessions of an iterable of CloudTrail records (e.g. reader.read_files), joining the data accesses on the way."""
+	sessionizer = Sessionizer(session_gap = session_gap, role_name_prefix = kwargs.get("role_name_prefix", ROLE_NAME_PREFIX),
+		window = kwargs.get("window", JOIN_WINDOW))
+	correlator = Correlator(emit_unmatched = True, **kwargs)
+	for record in records:
+		sessionizer.add_event(record)
+		for access in correlator.add(record):
+			sessionizer.add_access(access)
+	for access in correlator.flush():
+		sessionizer.add_access(access)
+	return sessionizer.sessions()
@@ -0,0 +1,315 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import argparse
+import calendar
+import gzip
+import heapq
+import json
+import os
+import random
+import time
+import uuid
+
+from ..amazon_reviews_schema import AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE, PARTITION_LIST, amazon_reviews_column_names
+from ..config import ROLE_NAME_PREFIX
+from ..user_manifest import ACCESS_COLUMNS, USER_MANIFEST_PATH, load_user_manifest
+from . import cloudtrail
+
+ACCOUNT_ID = "123456789012"
+REGION = "us-east-1"
+
+# CloudTrail delivers a log file about every five minutes.
+FILE_INTERVAL = 5 * 60
+
+FULL_TABLE_QUERIES = [
+	"SELECT * FROM {database}.{table} LIMIT 10",
+	"SELECT * FROM {database}.{table} WHERE product_category = '{category}' LIMIT {limit}"
+]
+
+COLUMN_QUERIES = [
+	"SELECT {columns} FROM {database}.{table} LIMIT {limit}",
+	"SELECT {columns} FROM {database}.{table} WHERE product_category = '{category}' LIMIT {limit}",
+	"SELECT product_category, count(*) AS reviews FROM {database}.{table} GROUP BY product_category",
+	"SELECT {columns} FROM {database}.{table} WHERE star_rating >= {rating} AND product_category = '{category}'"
+]
+
+NOISE_EVENTS = [
+	("s3.amazonaws.com", "GetObject"),
+	("sts.amazonaws.com", "AssumeRole"),
+	("glue.amazonaws.com", "GetTable"),
+	("athena.amazonaws.com", "GetQueryExecution"),
+	("athena.amazonaws.com", "GetQueryResults"),
+	("sagemaker.amazonaws.com", "DescribeUserProfile")
+]
+
+def parse_date(value: str) -> int:
+	return calendar.timegm(time.strptime(value, "%Y-%m-%d"))
+
+class TrafficSimulator(object):
+	"""
+	Generates CloudTrail traffic for the deployed topology: the data scientists of the user
+	manifest with their SageMakerStudio_<user> roles and grants, their Studio user profiles and
+	the Amazon Reviews table. Each user opens Studio sessions (CreatePresignedDomainUrl and
+	CreateApp) and runs queries during them (StartQueryExecution and the matching GetDataAccess).
+
+	activity_skew is the exponent of the power law spreading sessions across users (0 for
+	uniform). Each event is delivered in a log file after a random delay averaging lateness
+	seconds, so events of the same query can land in different files. noise_ratio unrelated
+	events are generated per audited event. violation_rate is the share of queries on column
+	users that reference a column outside their grant; duplicate_rate is the share of events
+	delivered twice. The output only depends on seed.
+	"""
+
+	def __init__(self,
+			users: list = None,
+			account_id: str = ACCOUNT_ID,
+			region: str = REGION,
+			database: str = AMAZON_REVIEWS_DATABASE,
+			table: str = AMAZON_REVIEWS_TABLE,
+			columns: list = None,
+			partitions: list = None,
+			role_name_prefix: str = ROLE_NAME_PREFIX,
+			sessions_per_day: float = 4,
+			queries_per_session: float = 20,
+			activity_skew: float = 1.0,
+			lateness: float = 120,
+			noise_ratio: float = 1.0,
+			violation_rate: float = 0.0,
+			duplicate_rate: float = 0.0,
+			seed: int = 0):
+		self.users = users if users is not None else load_user_manifest(USER_MANIFEST_PATH)
+		self.account_id = account_id
+		self.region = region
+		self.database = database
+		self.table = table
+		self.columns = columns or amazon_reviews_column_names()
+		self.partitions = partitions or PARTITION_LIST
+		self.role_name_prefix = role_name_prefix
+		self.sessions_per_day = sessions_per_day
+		self.queries_per_session = queries_per_session
+		self.lateness = lateness
+		self.noise_ratio = noise_ratio
+		self.violation_rate = violation_rate
+		self.duplicate_rate = duplicate_rate
+		self.random = random.Random(seed)
+		self.domain_id = "d-" + "".join(self.random.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(12))
+		weights = [1.0 / (rank + 1) ** activity_skew for rank in range(len(self.users))]
+		self.weights = [w * len(weights) / sum(weights) for w in weights]
+
+	def uuid(self) -> str:
+		return str(uuid.UUID(int = self.random.getrandbits(128), version = 4))
+
+	def role_arn(self, user) -> str:
+		return "arn:aws:iam::%s:role/%s%s" % (self.account_id, self.role_name_prefix, user.name)
+
+	def role_identity(self, user, session: str = "SageMaker") -> dict:
+		role = self.role_name_prefix + user.name
+		return {
+			"type": "AssumedRole",
+			"principalId": "AROA%s:%s" % (user.name.upper().replace("-", "")[:16], session),
+			"arn": "arn:aws:sts::%s:assumed-role/%s/%s" % (self.account_id, role, session),
+			"accountId": self.account_id,
+			"sessionContext": {
+				"sessionIssuer": {
+					"type": "Role",
+					"arn": self.role_arn(user),
+					"accountId": self.account_id,
+					"userName": role
+				}
+			}
+		}
+
+	def user_identity(self, user) -> dict:
+		return {
+			"type": "IAMUser",
+			"arn": "arn:aws:iam::%s:user/%s" % (self.account_id, user.name),
+			"accountId": self.account_id,
+			"userName": user.name
+		}
+
+	def event(self, event_time: float, source: str, name: str, identity: dict, request: dict = None, response: dict = None, **extra) -> dict:
+		record = {
+			"eventVersion": "1.08",
+			"userIdentity": identity,
+			"eventTime": cloudtrail.format_event_time(event_time),
+			"eventSource": source,
+			"eventName": name,
+			"awsRegion": self.region,
+			"sourceIPAddress": "10.0.%d.%d" % (self.random.randrange(256), self.random.randrange(256)),
+			"userAgent": "aws-sdk",
+			"requestParameters": request,
+			"responseElements": response,
+			"requestID": self.uuid(),
+			"eventID": self.uuid(),
+			"eventType": "AwsApiCall",
+			"recipientAccountId": self.account_id
+		}
+		record.update(extra)
+		return record
+
+	def query_string(self, user) -> str:
+		allowed = user.columns if user.access == ACCESS_COLUMNS else self.columns
+		columns = self.random.sample(allowed, self.random.randint(1, min(5, len(allowed))))
+		templates = COLUMN_QUERIES + (FULL_TABLE_QUERIES if user.access != ACCESS_COLUMNS else [])
+		if user.access == ACCESS_COLUMNS and self.random.random() < self.violation_rate:
+			denied = [c for c in self.columns if c not in allowed]
+			if denied:
+				columns.append(self.random.choice(denied))
+				templates = [t for t in COLUMN_QUERIES if "{columns}" in t]
+		return self.random.choice(templates).format(
+			database = self.database,
+			table = self.table,
+			columns = ", ".join(columns),
+			category = self.random.choice(self.partitions),
+			limit = self.random.choice([10, 100, 1000]),
+			rating = self.random.randint(1, 5))
+
+	def query(self, user, start: float) -> list:
+		query_id = self.uuid()
+		identity = self.role_identity(user)
+		access_time = start + self.random.uniform(0.2, 3)
+		return [
+			(start, self.event(start, cloudtrail.ATHENA_SOURCE, cloudtrail.START_QUERY_EXECUTION, identity,
+				request = {
+					"queryString": self.query_string(user),
+					"clientRequestToken": self.uuid(),
+					"queryExecutionContext": {"database": self.database},
+					"resultConfiguration": {"outputLocation": "s3://sagemaker-audit-control-query-results-%s-%s/" % (self.region, self.account_id)},
+					"workGroup": "primary"
+				},
+				response = {"queryExecutionId": query_id})),
+			(access_time, self.event(access_time, cloudtrail.LAKE_FORMATION_SOURCE, cloudtrail.GET_DATA_ACCESS, identity,
+				request = {
+					"tableArn": "arn:aws:glue:%s:%s:table/%s/%s" % (self.region, self.account_id, self.database, self.table),
+					"durationSeconds": 3600,
+					"auditContext": {"additionalAuditContext": "{queryId: %s}" % query_id},
+					"cellLevelSecurityEnforced": True
+				},
+				additionalEventData = {
+					"requesterService": "ATHENA",
+					"lakeFormationPrincipal": self.role_arn(user),
+					"lakeFormationRoleSessionName": "AWSLF-00-AT-%s-%d" % (self.account_id, self.random.getrandbits(32))
+				}))
+		]
+
+	def session(self, user, start: float) -> list:
+		"""Events of one Studio session: login, app launches and queries."""
+		events = [(start, self.event(start, cloudtrail.SAGEMAKER_SOURCE, "CreatePresignedDomainUrl", self.user_identity(user),
+			request = {"domainId": self.domain_id, "userProfileName": user.name, "sessionExpirationDurationInSeconds": 43200}))]
+		now = start + self.random.uniform(5, 30)
+		for app_type, app_name in [("JupyterServer", "default"), ("KernelGateway", "datascience-1-0-ml-t3-medium-%x" % self.random.getrandbits(32))]:
+			events.append((now, self.event(now, cloudtrail.SAGEMAKER_SOURCE, "CreateApp", self.role_identity(user),
+				request = {"domainId": self.domain_id, "userProfileName": user.name, "appType": app_type, "appName": app_name},
+				response = {"appArn": "arn:aws:sagemaker:%s:%s:app/%s/%s/%s/%s" % (self.region, self.account_id, self.domain_id, user.name, app_type, app_name)})))
+			now += self.random.uniform(30, 180)
+		for _ in range(int(self.random.expovariate(1.0 / self.queries_per_session)) + 1):
+			events.extend(self.query(user, now))
+			now += self.random.expovariate(1.0 / 60)
+		return events
+
+	def noise(self, event_time: float) -> tuple:
+		source, name = self.random.choice(NOISE_EVENTS)
+		user = self.random.choice(self.users)
+		return (event_time, self.event(event_time, source, name, self.role_identity(user), request = {}))
+
+	def events(self, start: float, end: float):
+		"""Yields (event time, record) for the sessions starting between start and end, in time order."""
+		pending = []
+		sequence = 0
+		for hour in range(int(start), int(end), 3600):
+			for user, weight in zip(self.users, self.weights):
+				for _ in range(self.poisson(self.sessions_per_day * weight / 24)):
+					for event in self.session(user, hour + self.random.uniform(0, 3600)):
+						heapq.heappush(pending, (event[0], sequence, event[1]))
+						sequence += 1
+						for _ in range(int(self.noise_ratio) + (self.random.random() < self.noise_ratio % 1)):
+							noise = self.noise(event[0] + self.random.uniform(-60, 60))
+							heapq.heappush(pending, (noise[0], sequence, noise[1]))
+							sequence += 1
+			# Later sessions start after this hour, so earlier events are final.
+			while pending and pending[0][0] < hour - 60:
+				event_time, _, record = heapq.heappop(pending)
+				yield event_time, record
+		while pending:
+			event_time, _, record = heapq.heappop(pending)
+			yield event_time, record
+
+	def poisson(self, mean: float) -> int:
+		count = 0
+		total = self.random.expovariate(1.0)
+		while total < mean:
+			count += 1
+			total += self.random.expovariate(1.0)
+		return count
+
+	def write(self, directory: str, start: float, end: float, file_interval: int = FILE_INTERVAL) -> list:
+		"""
+		Writes the events as gzip CloudTrail log files under directory, using the key layout of
+		a trail (AWSLogs/<account>/CloudTrail/<region>/YYYY/MM/DD/...). Each event goes to the file
+		of its delivery time. Returns the paths in delivery order.
+		"""
+		paths = []
+		deliveries = []
+		sequence = 0
+
+		def flush(before):
+			while deliveries and deliveries[0][0] < before:
+				delivery = deliveries[0][0]
+				records = []
+				while deliveries and deliveries[0][0] == delivery:
+					records.append(heapq.heappop(deliveries)[2])
+				paths.append(self.write_file(directory, delivery, records))
+
+		for event_time, record in self.events(start, end):
+			copies = 2 if self.random.random() < self.duplicate_rate else 1
+			for _ in range(copies):
+				delivered = event_time + self.random.expovariate(1.0 / self.lateness) if self.lateness else event_time
+				heapq.heappush(deliveries, (int(delivered // file_interval + 1) * file_interval, sequence, record))
+				sequence += 1
+			# Events come in time order and are delivered after they happen.
+			flush(event_time)
+		flush(float("inf"))
+		return paths
+
+	def write_file(self, directory: str, delivery: float, records: list) -> str:
+		stamp = time.gmtime(delivery)
+		path = os.path.join(directory, "AWSLogs", self.account_id, "CloudTrail", self.region, time.strftime("%Y/%m/%d", stamp),
+			"%s_CloudTrail_%s_%s_%08x.json.gz" % (self.account_id, self.region, time.strftime("%Y%m%dT%H%MZ", stamp), self.random.getrandbits(32)))
+		os.makedirs(os.path.dirname(path), exist_ok = True)
+		with gzip.open(path, "wt") as fp:
+			json.dump({"Records": records}, fp)
+		return path
+
+def main(args = None):
+	parser = argparse.ArgumentParser(description = "Generate CloudTrail log files for the audit tooling.")
+	parser.add_argument("directory", help = "output directory")
+	parser.add_argument("--start", default = "2021-03-01", help = "first day (YYYY-MM-DD)")
+	parser.add_argument("--days", type = int, default = 1)
+	parser.add_argument("--user-manifest", default = USER_MANIFEST_PATH)
+	parser.add_argument("--sessions-per-day", type = float, default = 4)
+	parser.add_argument("--queries-per-session", type = float, default = 20)
+	parser.add_argument("--activity-skew", type = float, default = 1.0)
+	parser.add_argument("--lateness", type = float, default = 120)
+	parser.add_argument("--noise-ratio", type = float, default = 1.0)
+	parser.add_argument("--violation-rate", type = float, default = 0.0)
+	parser.add_argument("--duplicate-rate", type = float, default = 0.0)
+	parser.add_argument("--seed", type = int, default = 0)
+	args = parser.parse_args(args)
+
+	simulator = TrafficSimulator(
+		users = load_user_manifest(args.user_manifest),
+		sessions_per_day = args.sessions_per_day,
+		queries_per_session = args.queries_per_session,
+		activity_skew = args.activity_skew,
+		lateness = args.lateness,
+		noise_ratio = args.noise_ratio,
+		violation_rate = args.violation_rate,
+		duplicate_rate = args.duplicate_rate,
+		seed = args.seed)
+	start = parse_date(args.start)
+	paths = simulator.write(args.directory, start, start + args.days * 24 * 60 * 60)
+	print("Wrote %d files to %s" % (len(paths), args.directory))
+
+if __name__ == "__main__":
+	main()
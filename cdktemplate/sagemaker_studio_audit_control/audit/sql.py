@@ -0,0 +1,403 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from collections import namedtuple
+import functools
+import re
+
+from ..amazon_reviews_schema import AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE, amazon_reviews_column_names
+
+CACHE_SIZE = 10000
+
+TOKEN_PATTERN = re.compile(r"""
+	(?P<space>\s+|--[^\n]*|/\*.*?\*/)
+	|(?P<string>'(?:[^']|'')*')
+	|(?P<quoted>"(?:[^"]|"")*"|`[^`]*`)
+	|(?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+)
+	|(?P<name>[A-Za-z_][A-Za-z0-9_$]*)
+	|(?P<symbol><>|!=|<=|>=|\|\||.)
+""", re.DOTALL | re.VERBOSE)
+
+KEYWORDS = set("""
+	all and any array as asc at between bigint boolean by case cast char cross current
+	database databases date decimal delete desc describe distinct double else end escape except
+	exists extract false fetch filter first following for from full group having if ilike in
+	inner insert int integer intersect interval into is join last lateral left like limit map
+	natural next not null nulls offset on only or order outer over partition partitions
+	preceding range real recursive right row rows schemas select set show smallint table
+	tables tablesample then time timestamp tinyint true union unbounded unload unnest using
+	values varchar when where window with within zone
+""".split())
+
+# Keywords that end the FROM clause of a query.
+CLAUSE_KEYWORDS = {"where", "group", "order", "limit", "having", "union", "except", "intersect",
+	"on", "using", "window", "offset", "fetch", "select", "join", "cross", "inner", "left", "right",
+	"full", "natural", "lateral"}
+JOIN_KEYWORDS = {"join", "left", "right", "full", "inner", "outer", "cross", "natural", "lateral"}
+SET_OPERATORS = {"union", "except", "intersect"}
+
+Token = namedtuple("Token", ["kind", "value"])
+
+# Tables and columns referenced by a query: tables holds (database, table) pairs and columns
+# (database, table, column) triples, with database None when the query does not qualify the table.
+# Columns of tables with an unknown schema selected with * are reported as "*".
+References = namedtuple("References", ["tables", "columns"])
+
+def tokenize(query: str) -> list:
+	"""
+	Tokens of a query, without whitespace and comments. Names are in lower case; literals are
+	replaced by "?".
+	"""
+	tokens = []
+	for match in TOKEN_PATTERN.finditer(query):
+		kind = match.lastgroup
+		if kind == "space":
+			continue
+		value = match.group()
+		if kind == "string" or kind == "number":
+			tokens.append(Token("literal", "?"))
+		elif kind == "quoted":
+			tokens.append(Token("quoted", value[1:-1].replace('""', '"').lower()))
+		elif kind == "name":
+			tokens.append(Token("name", value.lower()))
+		else:
+			tokens.append(Token("symbol", value))
+	return tokens
+
+def fingerprint(query: str) -> str:
+	"""
+	Normalized form of a query: literals replaced by "?", names in lower case and whitespace and
+	comments removed, so that queries of the same shape share a fingerprint.
+	"""
+	return " ".join('"%s"' % t.value.replace('"', '""') if t.kind == "quoted" else t.value for t in tokenize(query))
+
+def normalize(query: str) -> str:
+	"""
+	Like fingerprint, but keeps the literals: queries that only differ in whitespace, comments or
+	the case of names share a normalized form and return the same result.
+	"""
+	values = []
+	for match in TOKEN_PATTERN.finditer(query):
+		kind = match.lastgroup
+		if kind == "space":
+			continue
+		value = match.group()
+		if kind == "quoted":
+			values.append('"%s"' % value[1:-1].replace('""', '"').lower().replace('"', '""'))
+		elif kind == "name":
+			values.append(value.lower())
+		else:
+			values.append(value)
+	return " ".join(values)
+
+def is_name(token: Token) -> bool:
+	return token.kind == "quoted" or (token.kind == "name" and token.value not in KEYWORDS)
+
+def parse(query: str, schemas: dict) -> References:
+	"""
+	Tables and columns referenced by a query. The parser does not build a syntax tree: tables
+	are the names following FROM and JOIN, and columns are the other names of the query. When the
+	schema of a table is known (schemas maps table names to column lists), names that are not
+	columns of the tables in the query (aliases, named arguments) are ignored. * and alias.* are
+	expanded over the FROM items of their own SELECT only: tables to the columns of their schema,
+	subqueries and CTEs to the columns their select list projects.
+	"""
+	tokens = tokenize(query)
+	n = len(tokens)
+	value = lambda i: tokens[i].value if 0 <= i < n and tokens[i].kind != "quoted" else None
+
+	ctes = {}
+	aliases = {}
+	tables = []
+	table_positions = set()
+
+	# Depths of the FROM clauses the current token is in, innermost last.
+	from_depths = []
+	from_depth = lambda: from_depths[-1] if from_depths else None
+	depth = 0
+	i = 0
+	while i < n:
+		v = value(i)
+		if v == "(":
+			depth += 1
+		elif v == ")":
+			depth -= 1
+			while from_depths and depth < from_depths[-1]:
+				from_depths.pop()
+			if from_depth() == depth:
+				# Alias of a subquery in the FROM clause
+				j = i + 2 if value(i + 1) == "as" else i + 1
+				if j < n and is_name(tokens[j]):
+					aliases[tokens[j].value] = None
+					table_positions.add(j)
+		elif i + 2 < n and is_name(tokens[i]) and value(i + 1) == "as" and value(i + 2) == "(" and value(i - 1) in ["with", "recursive", ","]:
+			ctes[tokens[i].value] = i + 2
+			table_positions.add(i)
+		elif v in ["from", "join"] or (v == "," and from_depth() == depth):
+			if v != "," and from_depth() != depth:
+				from_depths.append(depth)
+			j = i + 1
+			parts = []
+			while j < n and is_name(tokens[j]) and value(j + 1) != "(":
+				parts.append(tokens[j].value)
+				table_positions.add(j)
+				if value(j + 1) != ".":
+					break
+				j += 2
+			if parts:
+				ref = (parts[-2] if len(parts) > 1 else None, parts[-1])
+				j += 1
+				if value(j) == "as":
+					j += 1
+				if j < n and is_name(tokens[j]):
+					aliases[tokens[j].value] = ref
+					table_positions.add(j)
+				if ref[0] is not None or ref[1] not in ctes:
+					tables.append(ref)
+					aliases[ref[1]] = ref
+				else:
+					aliases[ref[1]] = None
+		elif v in CLAUSE_KEYWORDS and v not in JOIN_KEYWORDS and v not in ["on", "using"] and from_depth() == depth:
+			from_depths.pop()
+		i += 1
+
+	def schema(ref):
+		return schemas.get(ref)
+
+	def expand(refs):
+		columns = set()
+		for ref in refs:
+			names = schema(ref)
+			columns.update((ref[0], ref[1], c) for c in (names if names is not None else ["*"]))
+		return columns
+
+	matching = {}
+	stack = []
+	for i in range(n):
+		if value(i) == "(":
+			stack.append(i)
+		elif value(i) == ")" and stack:
+			matching[stack.pop()] = i
+
+	def select_of(i):
+		"""Position of the SELECT whose select list contains token i."""
+		depth = 0
+		for j in range(i - 1, -1, -1):
+			v = value(j)
+			if v == ")":
+				depth += 1
+			elif v == "(":
+				depth -= 1
+				if depth < 0:
+					return None
+			elif v == "select" and depth == 0:
+				return j
+		return None
+
+	def inner_select(i):
+		"""Position of the SELECT of the query in the parentheses opened at i."""
+		depth = 0
+		for j in range(i + 1, matching.get(i, n)):
+			v = value(j)
+			if v == "(":
+				depth += 1
+			elif v == ")":
+				depth -= 1
+			elif v == "select" and depth == 0:
+				return j
+		return None
+
+	def select_list_end(start):
+		"""Position of the FROM of the SELECT at start, or of the token ending its select list."""
+		depth = 0
+		i = start + 1
+		while i < n:
+			v = value(i)
+			if v == "(":
+				depth += 1
+			elif v == ")":
+				depth -= 1
+				if depth < 0:
+					break
+			elif depth == 0 and (v == "from" or v == "select" or v in SET_OPERATORS):
+				break
+			i += 1
+		return i
+
+	def from_items(start):
+		"""(table reference, position of the SELECT of a subquery or CTE, qualifier) of the FROM clause of the SELECT at start."""
+		i = select_list_end(start)
+		if value(i) != "from":
+			return []
+		items = []
+		i += 1
+		while i < n:
+			ref = inner = qualifier = None
+			if value(i) == "(":
+				inner = inner_select(i)
+				i = matching.get(i, n - 1) + 1
+			else:
+				parts = []
+				while i < n and is_name(tokens[i]) and value(i + 1) != "(":
+					parts.append(tokens[i].value)
+					i += 1
+					if value(i) != ".":
+						break
+					i += 1
+				if parts:
+					qualifier = parts[-1]
+					if len(parts) == 1 and parts[0] in ctes:
+						inner = inner_select(ctes[parts[0]])
+					else:
+						ref = (parts[-2] if len(parts) > 1 else None, parts[-1])
+			if value(i) == "as":
+				i += 1
+			if i < n and is_name(tokens[i]):
+				qualifier = tokens[i].value
+				i += 1
+			if ref is not None or inner is not None:
+				items.append((ref, inner, qualifier))
+
+			# Skip join conditions up to the next FROM item or the end of the FROM clause.
+			depth = 0
+			while i < n:
+				v = value(i)
+				if v == "(":
+					depth += 1
+				elif v == ")":
+					depth -= 1
+					if depth < 0:
+						return items
+				elif depth == 0 and (v == "," or v == "join"):
+					i += 1
+					break
+				elif depth == 0 and v in CLAUSE_KEYWORDS and v not in JOIN_KEYWORDS and v not in ["on", "using"]:
+					return items
+				i += 1
+		return items
+
+	projections = {}
+
+	def projection(start):
+		"""Columns of the tables read by the select list of the SELECT at start."""
+		if start is None:
+			return set()
+		if start not in projections:
+			# Guards recursive CTEs, which reference their own projection.
+			projections[start] = set()
+			items = from_items(start)
+			columns = set()
+			end = select_list_end(start)
+			i = start + 1
+			while i < end:
+				if value(i) == "(" and value(i + 1) == "select":
+					i = matching.get(i, end)
+				elif value(i) == "*" and value(i - 1) in ["select", ",", "distinct", "all"]:
+					columns.update(star(items))
+				elif is_name(tokens[i]) and value(i + 1) != "(" and value(i - 1) != "as" and value(i - 1) != ".":
+					if value(i + 1) == "." and i + 2 < end:
+						qualified = [item for item in items if item[2] == tokens[i].value]
+						if tokens[i + 2].kind == "symbol" and value(i + 2) == "*":
+							columns.update(star(qualified))
+						elif is_name(tokens[i + 2]):
+							columns.update(resolve(qualified, tokens[i + 2].value))
+						i += 2
+					else:
+						columns.update(resolve(items, tokens[i].value))
+				i += 1
+			projections[start] = columns
+		return projections[start]
+
+	def star(items):
+		"""Columns selected by * over FROM items."""
+		columns = set()
+		for ref, inner, _ in items:
+			columns.update(expand([ref]) if ref is not None else projection(inner))
+		return columns
+
+	def resolve(items, name):
+		"""Columns of the tables read by the column name of FROM items."""
+		columns = set()
+		for ref, inner, _ in items:
+			if ref is not None and name in (schema(ref) or ()):
+				columns.add((ref[0], ref[1], name))
+			elif ref is None:
+				columns.update(c for c in projection(inner) if c[2] == name)
+		if not columns:
+			columns.update((ref[0], ref[1], name) for ref, _, _ in items if ref is not None and schema(ref) is None)
+		return columns
+
+	columns = set()
+	i = 0
+	while i < n:
+		token = tokens[i]
+		if token.value == "*" and token.kind == "symbol" and value(i - 1) in ["select", ",", "distinct", "all"]:
+			start = select_of(i)
+			if start is not None:
+				columns.update(star(from_items(start)))
+		elif is_name(token) and i not in table_positions and value(i + 1) != "(" and value(i - 1) != "as" and value(i - 1) != ".":
+			parts = [token.value]
+			j = i
+			while value(j + 1) == "." and j + 2 < n and (is_name(tokens[j + 2]) or value(j + 2) == "*"):
+				parts.append(tokens[j + 2].value)
+				j += 2
+			if len(parts) == 1:
+				known = [ref for ref in tables if schema(ref) is not None]
+				matches = [ref for ref in known if parts[0] in schema(ref)]
+				if not matches:
+					matches = [ref for ref in tables if schema(ref) is None]
+				columns.update((ref[0], ref[1], parts[0]) for ref in matches)
+			else:
+				ref = aliases.get(parts[-2])
+				if tokens[j].kind == "symbol":
+					start = select_of(i)
+					if start is not None:
+						columns.update(star([item for item in from_items(start) if item[2] == parts[-2]]))
+				elif ref is not None and (schema(ref) is None or parts[-1] in schema(ref)):
+					columns.add((ref[0], ref[1], parts[-1]))
+			i = j
+		i += 1
+
+	return References(frozenset(tables), frozenset(columns))
+
+def default_schemas() -> dict:
+	return {
+		(AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE): amazon_reviews_column_names()
+	}
+
+class TableSchemas(dict):
+	"""Column names by (database, table), also found by table name alone for unqualified tables."""
+
+	def __init__(self, schemas: dict):
+		super().__init__({key: frozenset(columns) for key, columns in schemas.items()})
+		self.by_name = {table: columns for (_, table), columns in self.items()}
+
+	def get(self, ref, default = None):
+		database, table = ref
+		if database is None:
+			return self.by_name.get(table, default)
+		return super().get(ref, default)
+
+class ColumnExtractor(object):
+	"""
+	Extracts the tables and columns referenced by audited query strings. Both the fingerprint of
+	each query string and the references of each fingerprint are kept in bounded LRU caches, so
+	repeated queries, and queries that only differ in literals or formatting, are parsed once.
+
+	columns() can be passed to correlation.Correlator as its column_resolver.
+	"""
+
+	def __init__(self, schemas: dict = None, maxsize: int = CACHE_SIZE):
+		self.schemas = TableSchemas(schemas if schemas is not None else default_schemas())
+		self.fingerprint = functools.lru_cache(maxsize = maxsize)(fingerprint)
+		self.parse = functools.lru_cache(maxsize = maxsize)(lambda normalized: parse(normalized, self.schemas))
+
+	def references(self, query: str) -> References:
+		return self.parse(self.fingerprint(query))
+
+	def columns(self, query: str, database: str, table: str) -> list:
+		"""Columns of database.table referenced by query."""
+		return sorted(c for db, t, c in self.references(query).columns if t == table and db in [None, database])
+
+	def cache_info(self) -> dict:
+		return { "Fingerprint": self.fingerprint.cache_info(), "Parse": self.parse.cache_info() }
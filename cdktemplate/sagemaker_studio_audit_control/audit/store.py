@@ -0,0 +1,206 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import time
+import uuid
+
+from ..config import ROLE_NAME_PREFIX
+from . import cloudtrail
+
+# Audit records that are not from a data scientist role are stored under this role partition.
+OTHER_ROLES = "_other"
+
+# Columns with few distinct values, stored with dictionary encoding.
+DICTIONARY_COLUMNS = [
+	"principal_arn",
+	"role_name",
+	"user_name",
+	"database",
+	"table",
+	"query_string",
+	"work_group"
+]
+
+STRING_COLUMNS = [
+	"query_id",
+	"principal_arn",
+	"role_name",
+	"user_name",
+	"database",
+	"table",
+	"query_string",
+	"output_location",
+	"work_group",
+	"access_event_id",
+	"query_event_id"
+]
+
+TIME_COLUMNS = ["access_time", "query_time"]
+
+WRITE_BATCH_SIZE = 100000
+
+def audit_schema():
+	import pyarrow as pa
+	fields = []
+	for name in STRING_COLUMNS:
+		fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string()) if name in DICTIONARY_COLUMNS else pa.string()))
+	fields.append(pa.field("columns", pa.list_(pa.string())))
+	for name in TIME_COLUMNS:
+		fields.append(pa.field(name, pa.timestamp("s", tz = "UTC")))
+	fields.append(pa.field("event_date", pa.string()))
+	fields.append(pa.field("role", pa.string()))
+	return pa.schema(fields)
+
+def partitioning():
+	import pyarrow as pa
+	import pyarrow.dataset as ds
+	return ds.partitioning(pa.schema([("event_date", pa.string()), ("role", pa.string())]), flavor = "hive")
+
+def scanned_bytes(fragment, columns: list = None) -> int:
+	"""
+	Compressed bytes of the column chunks of columns (all if None) in a Parquet file fragment: what
+	a read of those columns fetches from it before row groups are skipped by their statistics.
+	"""
+	metadata = fragment.metadata
+	total = 0
+	for index in range(metadata.num_row_groups):
+		row_group = metadata.row_group(index)
+		for column in range(row_group.num_columns):
+			chunk = row_group.column(column)
+			if columns is None or chunk.path_in_schema.split(".")[0] in columns:
+				total += chunk.total_compressed_size
+	return total
+
+class AuditStore(object):
+	"""
+	Audit records stored as a local Parquet dataset partitioned by event date and data scientist
+	role (event_date=YYYY-MM-DD/role=SageMakerStudio_<user>/). Reads prune the partitions with the
+	date and role filters, read only the requested columns and push the remaining filters down
+	to the Parquet row groups. Each read reports in last_scan the files it opened, the bytes of
+	the column chunks it read from them and its latency.
+
+	Writes are idempotent: a record whose access event ID is already stored (or repeated in the
+	batch) is skipped, so a run interrupted after writing can be repeated.
+
+	Requires pyarrow.
+	"""
+
+	def __init__(self, path: str, role_name_prefix: str = ROLE_NAME_PREFIX):
+		self.path = path
+		self.role_name_prefix = role_name_prefix
+		self.last_scan = None
+
+	def write(self, records, batch_size: int = WRITE_BATCH_SIZE) -> int:
+		"""Appends the audit records (correlation.AuditRecord) not stored yet to the dataset; returns the number written."""
+		count = 0
+		batch = []
+		for record in records:
+			batch.append(record)
+			if len(batch) >= batch_size:
+				count += self.write_batch(batch)
+				batch = []
+		if batch:
+			count += self.write_batch(batch)
+		return count
+
+	def role_partition(self, record) -> str:
+		return record.role_name if record.role_name and record.role_name.startswith(self.role_name_prefix) else OTHER_ROLES
+
+	def stored_event_ids(self, dates: set, roles: set) -> set:
+		"""Access event IDs stored in the partitions of the given dates and roles."""
+		import pyarrow.dataset as ds
+		if not os.path.exists(self.path):
+			return set()
+		table = self.dataset().to_table(columns = ["access_event_id"],
+			filter = ds.field("event_date").isin(sorted(dates)) & ds.field("role").isin(sorted(roles)))
+		return set(table.column("access_event_id").to_pylist())
+
+	def write_batch(self, records: list) -> int:
+		import pyarrow as pa
+		import pyarrow.dataset as ds
+
+		seen = self.stored_event_ids({r.access_time[:10] for r in records}, {self.role_partition(r) for r in records})
+		new = []
+		for record in records:
+			if record.access_event_id is not None:
+				if record.access_event_id in seen:
+					continue
+				seen.add(record.access_event_id)
+			new.append(record)
+		if not new:
+			return 0
+		records = new
+
+		data = {name: [getattr(r, name) for r in records] for name in STRING_COLUMNS}
+		data["columns"] = [list(r.columns) for r in records]
+		for name in TIME_COLUMNS:
+			data[name] = [cloudtrail.parse_event_time(getattr(r, name)) if getattr(r, name) else None for r in records]
+		data["event_date"] = [r.access_time[:10] for r in records]
+		data["role"] = [self.role_partition(r) for r in records]
+
+		schema = audit_schema()
+		arrays = []
+		for field in schema:
+			if pa.types.is_dictionary(field.type):
+				arrays.append(pa.array(data[field.name], type = pa.string()).dictionary_encode())
+			else:
+				arrays.append(pa.array(data[field.name], type = field.type))
+		table = pa.Table.from_arrays(arrays, schema = schema)
+
+		file_format = ds.ParquetFileFormat()
+		ds.write_dataset(table, self.path,
+			format = file_format,
+			partitioning = partitioning(),
+			basename_template = uuid.uuid4().hex + "-{i}.parquet",
+			existing_data_behavior = "overwrite_or_ignore",
+			file_options = file_format.make_write_options(use_dictionary = DICTIONARY_COLUMNS, compression = "zstd"))
+		return len(records)
+
+	def dataset(self):
+		import pyarrow.dataset as ds
+		return ds.dataset(self.path, format = "parquet", partitioning = partitioning(), schema = audit_schema())
+
+	def filter(self, start_date: str = None, end_date: str = None, roles: list = None, expression = None):
+		"""Filter expression of the given dates (inclusive, YYYY-MM-DD), roles and extra expression."""
+		import pyarrow.dataset as ds
+		filters = []
+		if start_date:
+			filters.append(ds.field("event_date") >= start_date)
+		if end_date:
+			filters.append(ds.field("event_date") <= end_date)
+		if roles:
+			filters.append(ds.field("role").isin(list(roles)))
+		if expression is not None:
+			filters.append(expression)
+		result = None
+		for f in filters:
+			result = f if result is None else result & f
+		return result
+
+	def read(self, columns: list = None, **filters):
+		"""
+		Returns a pyarrow Table with the given columns of the matching records, e.g.
+		store.read(["user_name", "query_string"], start_date = "2021-03-01",
+			expression = ds.field("table") == "amazon_reviews_parquet").
+		"""
+		if not os.path.exists(self.path):
+			return None
+		start = time.time()
+		dataset = self.dataset()
+		expression = self.filter(**filters)
+		table = dataset.to_table(columns = columns, filter = expression)
+		fragments = list(dataset.get_fragments(filter = expression))
+		self.last_scan = {
+			"Files": len(fragments),
+			"Bytes": sum(scanned_bytes(fragment, columns) for fragment in fragments),
+			"Rows": table.num_rows,
+			"Seconds": time.time() - start
+		}
+		return table
+
+	def scanned_files(self, **filters) -> list:
+		"""Files left after partition pruning, i.e. the files a read with the same filters opens."""
+		if not os.path.exists(self.path):
+			return []
+		return [fragment.path for fragment in self.dataset().get_fragments(filter = self.filter(**filters))]
@@ -0,0 +1,152 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import queue
+import time
+
+from .correlation import Correlator, JOIN_WINDOW
+from . import cloudtrail
+from .reader import AUDIT_EVENTS
+
+# Once the stream has been idle for longer than this, the watermark advances from the latest
+# event time by the idle time, so that state still expires when the stream is idle.
+IDLE_DELAY = 60
+POLL_INTERVAL = 1
+
+# Upper bound of the queries with events waiting for their partner.
+MAX_STATE = 1000000
+
+class QueueSource(object):
+	"""
+	Records from an in-process queue (standing in for an EventBridge or Kinesis consumer).
+	Yields None when no record arrived within poll_interval and stops at a None record.
+	"""
+
+	def __init__(self, records: queue.Queue, poll_interval: float = POLL_INTERVAL):
+		self.records = records
+		self.poll_interval = poll_interval
+
+	def __iter__(self):
+		while True:
+			try:
+				record = self.records.get(timeout = self.poll_interval)
+			except queue.Empty:
+				yield None
+				continue
+			if record is None:
+				return
+			yield record
+
+class FileTailSource(object):
+	"""
+	Records appended to a JSON Lines file (one CloudTrail record per line, e.g. EventBridge
+	events delivered by Kinesis Data Firehose), starting at offset. Yields None when no complete
+	line was appended within poll_interval. offset is the position after the last line read.
+	"""
+
+	def __init__(self, path: str, offset: int = 0, poll_interval: float = POLL_INTERVAL, follow: bool = True):
+		self.path = path
+		self.offset = offset
+		self.poll_interval = poll_interval
+		self.follow = follow
+
+	def __iter__(self):
+		while not os.path.exists(self.path):
+			if not self.follow:
+				return
+			yield None
+			time.sleep(self.poll_interval)
+
+		with open(self.path, "rb") as fp:
+			fp.seek(self.offset)
+			while True:
+				line = fp.readline()
+				if line.endswith(b"\n"):
+					self.offset += len(line)
+					if line.strip():
+						record = json.loads(line)
+						# EventBridge wraps the CloudTrail record in "detail".
+						yield record.get("detail", record) if "detail-type" in record else record
+					continue
+				fp.seek(self.offset)
+				if not self.follow:
+					return
+				yield None
+				time.sleep(self.poll_interval)
+
+class StreamProcessor(object):
+	"""
+	Streaming version of the correlator: joins records as they arrive and emits each audit record
+	as soon as both events of its query were seen. Records can arrive out of order and more than
+	once. Duplicates (same eventID) are dropped, and records older than the join window behind
+	the watermark are dropped as late. The watermark follows the event times: without new records,
+	it advances from the latest event time by the time elapsed on the clock since the last record
+	(minus idle_delay), so unmatched state always expires after the window while replays of old
+	trails, whose event times are far behind the clock, are joined as they were. State is capped at
+	max_state queries; beyond that, the oldest state is evicted early.
+	"""
+
+	def __init__(self,
+			sink,
+			window: int = JOIN_WINDOW,
+			idle_delay: int = IDLE_DELAY,
+			max_state: int = MAX_STATE,
+			clock = time.time,
+			**kwargs):
+		self.sink = sink
+		self.correlator = Correlator(window = window, **kwargs)
+		self.idle_delay = idle_delay
+		self.max_state = max_state
+		self.clock = clock
+		self.max_event_time = None
+		self.last_arrival = None
+		self.stats = { "Records": 0, "Duplicates": 0, "Late": 0, "Joined": 0, "Evicted": 0 }
+
+	def process(self, record: dict) -> None:
+		names = AUDIT_EVENTS.get(record.get("eventSource"))
+		if names is None or record.get("eventName") not in names:
+			return
+		self.stats["Records"] += 1
+
+		event_time = cloudtrail.parse_event_time(record["eventTime"])
+		self.last_arrival = self.clock()
+		if self.max_event_time is None or event_time > self.max_event_time:
+			self.max_event_time = event_time
+		if event_time < self.correlator.watermark - self.correlator.window:
+			self.stats["Late"] += 1
+			return
+
+		duplicates = self.correlator.duplicates
+		self.emit(self.correlator.add(record))
+		self.stats["Duplicates"] += self.correlator.duplicates - duplicates
+
+		while self.correlator.size() > self.max_state:
+			size = self.correlator.size()
+			self.emit(self.correlator.evict(self.correlator.expiry[0][0] + 1))
+			# One eviction drops every entry of the oldest event time, or only stale heap entries.
+			self.stats["Evicted"] += size - self.correlator.size()
+
+	def tick(self) -> None:
+		"""Advances the watermark by the idle time while no records arrive."""
+		if self.max_event_time is None:
+			return
+		idle = int(self.clock() - self.last_arrival) - self.idle_delay
+		if idle > 0:
+			self.emit(self.correlator.advance(self.max_event_time + idle))
+
+	def emit(self, records: list) -> None:
+		for record in records:
+			if record.query_time is not None:
+				self.stats["Joined"] += 1
+			self.sink(record)
+
+	def run(self, source) -> None:
+		"""Processes the records of a source until it ends, then flushes the remaining state."""
+		for record in source:
+			if record is None:
+				self.tick()
+			else:
+				self.process(record)
+		self.emit(self.correlator.flush())
@@ -0,0 +1,45 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from collections import namedtuple
+
+from .grants import GrantIndex
+
+# The principal accessed a table it has no SELECT grant on.
+NO_GRANT = "NoGrant"
+# The query references columns outside the principal's grant.
+COLUMNS_NOT_GRANTED = "ColumnsNotGranted"
+
+Violation = namedtuple("Violation", ["kind", "record", "columns"])
+
+class ViolationDetector(object):
+	"""
+	Checks audit records (correlation.AuditRecord) against the deployed Lake Formation grants.
+	Records on tables without any grant in the index (tables not managed by the stacks) are
+	ignored. Each column is checked with a set lookup, so records are checked as fast as they
+	are read.
+	"""
+
+	def __init__(self, grants: GrantIndex):
+		self.grants = grants
+		self.tables = grants.tables()
+
+	def check(self, record) -> Violation:
+		"""Returns the violation of record, or None if it is allowed."""
+		key = (record.database, record.table)
+		if key not in self.tables:
+			return None
+		grant = self.grants.get(record.role_name or record.principal_arn, *key)
+		if grant is None:
+			return Violation(NO_GRANT, record, tuple(record.columns))
+		denied = tuple(c for c in record.columns if not grant.allows(c.lower()))
+		if denied:
+			return Violation(COLUMNS_NOT_GRANTED, record, denied)
+		return None
+
+	def detect(self, records):
+		"""Yields the violations of an iterable of audit records."""
+		for record in records:
+			violation = self.check(record)
+			if violation is not None:
+				yield violation
@@ -0,0 +1,55 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+AMAZON_REVIEWS_BUCKET_ARN = "arn:aws:s3:::amazon-reviews-pds"
+ROLE_NAME_PREFIX = "SageMakerStudio_"
+ATHENA_QUERY_BUCKET_PREFIX = "sagemaker-audit-control-query-results-"
+
+NESTED_STACK_URL_PREFIX = "https://aws-ml-blog.s3.amazonaws.com/artifacts/sagemaker-studio-audit-control/"
+
+# How the Studio domain is created: with the AWS::SageMaker::Domain resource ("native"), or with
+# the custom resource of lambda/sagemaker_studio_domain.py ("lambda").
+DOMAIN_RESOURCES = ["native", "lambda"]
+
+# Settings given as "true" or "false" in the context.
+FLAG_SETTINGS = ["retain_legacy_resources"]
+
+class AuditControlConfig(object):
+	"""
+	Settings shared by the stacks. Each setting can be overridden with CDK context
+	using the same name, e.g. "cdk synth -c nested_stack_url_prefix=https://...".
+
+	retain_legacy_resources keeps the per-item resources that earlier releases created for the
+	user profiles and the partitions, now managed in bulk by custom resources, in the templates
+	with DeletionPolicy Retain. Stacks created by an earlier release are updated once with it
+	and then without it, so that CloudFormation drops those resources without deleting them.
+	"""
+
+	def __init__(self,
+			amazon_reviews_bucket_arn: str = AMAZON_REVIEWS_BUCKET_ARN,
+			role_name_prefix: str = ROLE_NAME_PREFIX,
+			athena_query_bucket_prefix: str = ATHENA_QUERY_BUCKET_PREFIX,
+			nested_stack_url_prefix: str = NESTED_STACK_URL_PREFIX,
+			domain_resource: str = "native",
+			retain_legacy_resources: bool = False):
+		if domain_resource not in DOMAIN_RESOURCES:
+			raise ValueError("Unknown domain_resource %s. Valid values: %s" % (domain_resource, ", ".join(DOMAIN_RESOURCES)))
+		self.amazon_reviews_bucket_arn = amazon_reviews_bucket_arn
+		self.role_name_prefix = role_name_prefix
+		self.athena_query_bucket_prefix = athena_query_bucket_prefix
+		self.nested_stack_url_prefix = nested_stack_url_prefix
+		self.domain_resource = domain_resource
+		self.retain_legacy_resources = retain_legacy_resources
+
+	@property
+	def amazon_reviews_bucket_name(self) -> str:
+		return self.amazon_reviews_bucket_arn.split(":::")[1]
+
+	@classmethod
+	def from_context(cls, node) -> "AuditControlConfig":
+		settings = {}
+		for name in ["amazon_reviews_bucket_arn", "role_name_prefix", "athena_query_bucket_prefix", "nested_stack_url_prefix", "domain_resource"] + FLAG_SETTINGS:
+			value = node.try_get_context(name)
+			if value is not None:
+				settings[name] = str(value).lower() == "true" if name in FLAG_SETTINGS else value
+		return cls(**settings)
@@ -0,0 +1,45 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from aws_cdk import (
+	aws_lambda as _lambda,
+	core
+)
+import os
+import re
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+
+# Modules of the lambda directory that handlers import, in dependency order.
+SHARED_MODULES = ["status_poller"]
+
+def inline_code(module_name: str) -> str:
+	"""
+	Source of a handler module with the shared modules it imports prepended, so that it can be
+	deployed as inline code (which the templates need, as they are launched from S3 without assets
+	and inline code is the only way to get the cfnresponse module).
+	"""
+	with open(os.path.join(LAMBDA_DIR, module_name + ".py")) as fp:
+		source = fp.read()
+
+	parts = []
+	for shared in SHARED_MODULES:
+		pattern = re.compile(r"^from %s import .*\n" % shared, re.MULTILINE)
+		if pattern.search(source):
+			with open(os.path.join(LAMBDA_DIR, shared + ".py")) as fp:
+				parts.append(fp.read())
+			source = pattern.sub("", source)
+	return "\n".join(parts + [source])
+
+def inline_function(scope: core.Construct, id: str, module_name: str, **kwargs) -> _lambda.Function:
+	"""Python function running module_name.handler from inline code."""
+	function = _lambda.Function(scope, id,
+		runtime = _lambda.Runtime.PYTHON_3_8,
+		handler = "index.handler",
+		code = _lambda.Code.from_inline("# see Code.ZipFile"),
+		**kwargs
+	)
+	# CloudFormation takes inline code up to 4 MB, while CDK 1.x still checks the former limit
+	# of 4096 characters, which the bundled handlers exceed.
+	function.node.default_child.add_property_override("Code.ZipFile", inline_code(module_name))
+	return function
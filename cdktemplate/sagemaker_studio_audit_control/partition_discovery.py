@@ -0,0 +1,106 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+import json
+import os
+import time
+
+PARTITION_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".partition_cache.json")
+PARTITION_CACHE_TTL = 24 * 60 * 60
+
+MAX_WORKERS = 16
+
+def list_prefixes(s3, bucket: str, prefix: str) -> list:
+	"""Lists the common prefixes one level below prefix, without enumerating the objects."""
+	prefixes = []
+	paginator = s3.get_paginator("list_objects_v2")
+	for page in paginator.paginate(Bucket = bucket, Prefix = prefix, Delimiter = "/"):
+		prefixes.extend(p["Prefix"] for p in page.get("CommonPrefixes", []))
+	return prefixes
+
+def discover_partitions(bucket: str, prefix: str, partition_keys: list, s3 = None, max_workers: int = MAX_WORKERS) -> dict:
+	"""
+	Discovers Hive-style partitions (e.g. "parquet/product_category=Books/") under prefix.
+	Each partition key is one level of the listing; the prefixes of a level are listed
+	concurrently. Returns the partition values (unquoted, one list per partition) by the path of
+	the partition relative to prefix, as listed (e.g. "product_category=Books").
+	"""
+	if s3 is None:
+		import boto3
+		s3 = boto3.client("s3")
+
+	level = [(prefix, [])]
+
+	with ThreadPoolExecutor(max_workers = max_workers) as executor:
+		for key in partition_keys:
+			children = executor.map(lambda parent: list_prefixes(s3, bucket, parent[0]), level)
+			next_level = []
+			for (parent, values), child_prefixes in zip(level, children):
+				for child in child_prefixes:
+					name = child[len(parent):].rstrip("/")
+					if name.startswith(key + "="):
+						next_level.append((child, values + [unquote(name[len(key) + 1:])]))
+			level = next_level
+
+	return { child[len(prefix):].rstrip("/"): values for child, values in level }
+
+def partition_values(partitions: dict) -> list:
+	"""Sorted partition values of discovered partitions."""
+	return sorted(partitions.values())
+
+def partition_locations(partitions: dict, partition_keys: list) -> dict:
+	"""
+	Paths of the discovered partitions that differ from the path built from their values (e.g.
+	"product_category=Health_%26_Personal_Care" for "Health_&_Personal_Care"), by values joined with "/".
+	"""
+	return { "/".join(values): path for path, values in partitions.items()
+		if path != "/".join("%s=%s" % kv for kv in zip(partition_keys, values)) }
+
+def projection_values(partitions: list, locations: dict, partition_keys: list) -> list:
+	"""
+	Enum values of partition projection, one sorted list per partition key, read from the path of
+	each partition (its entry in locations, from partition_locations, or the path built from its
+	values). Athena substitutes the projected values into the location template as they are, so a
+	value that is URL-quoted in the bucket is projected in its quoted form.
+	"""
+	values = [set() for _ in partition_keys]
+	for partition in partitions:
+		path = (locations or {}).get("/".join(partition)) or "/".join("%s=%s" % kv for kv in zip(partition_keys, partition))
+		for index, (key, segment) in enumerate(zip(partition_keys, path.split("/"))):
+			if not segment.startswith(key + "="):
+				raise ValueError("Partition location %s does not match the partition keys %s" % (path, partition_keys))
+			values[index].add(segment[len(key) + 1:])
+	return [sorted(v) for v in values]
+
+def cached_discover_partitions(bucket: str, prefix: str, partition_keys: list, s3 = None,
+		cache_path: str = PARTITION_CACHE_PATH, ttl: int = PARTITION_CACHE_TTL, etag_key: str = None) -> dict:
+	"""
+	Same as discover_partitions, with the result kept in a local JSON cache. An entry is reused
+	while it is younger than ttl seconds and, if etag_key is given, while the ETag of that
+	object (e.g. a manifest rewritten whenever partitions change) is unchanged.
+	"""
+	if s3 is None and etag_key:
+		import boto3
+		s3 = boto3.client("s3")
+
+	cache_key = "s3://%s/%s|%s" % (bucket, prefix, ",".join(partition_keys))
+	etag = s3.head_object(Bucket = bucket, Key = etag_key)["ETag"] if etag_key else None
+
+	cache = {}
+	if os.path.exists(cache_path):
+		with open(cache_path) as fp:
+			cache = json.load(fp)
+
+	entry = cache.get(cache_key)
+	if entry and time.time() - entry["Timestamp"] < ttl and entry.get("ETag") == etag and isinstance(entry["Partitions"], dict):
+		return entry["Partitions"]
+
+	partitions = discover_partitions(bucket, prefix, partition_keys, s3 = s3)
+
+	cache[cache_key] = { "Timestamp": time.time(), "ETag": etag, "Partitions": partitions }
+	with open(cache_path, "w") as fp:
+		json.dump(cache, fp)
+
+	return partitions
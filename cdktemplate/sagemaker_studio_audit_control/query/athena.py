@@ -0,0 +1,215 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from collections import namedtuple
+import time
+
+from ..audit.cloudtrail import role_name
+from ..audit.sql import normalize, tokenize
+from .cache import ResultCache
+from .results import result_location
+from . import unload as parquet
+
+POLL_INTERVAL = 0.2
+MAX_POLL_INTERVAL = 5
+QUERY_TIMEOUT = 30 * 60
+
+PENDING_STATES = ["QUEUED", "RUNNING"]
+
+# Statements whose results can be cached: they do not change anything and do not depend on
+# the time they run.
+CACHEABLE_STATEMENTS = ["select", "with", "show", "describe", "values"]
+NONDETERMINISTIC_FUNCTIONS = {"now", "rand", "random", "uuid", "current_date", "current_time",
+	"current_timestamp", "localtime", "localtimestamp"}
+
+CONVERTERS = {
+	"boolean": lambda v: v == "true",
+	"tinyint": int,
+	"smallint": int,
+	"integer": int,
+	"bigint": int,
+	"float": float,
+	"real": float,
+	"double": float
+}
+
+# Result of a query: column names and rows (tuples), with cached True when the result did not
+# come from a new query execution.
+QueryResult = namedtuple("QueryResult", ["query_execution_id", "columns", "rows", "cached"])
+
+class QueryFailed(Exception):
+	"""Raised when a query execution does not succeed."""
+
+	def __init__(self, query_execution_id, state, reason):
+		super().__init__("Query %s %s: %s" % (query_execution_id, state, reason))
+		self.query_execution_id = query_execution_id
+		self.state = state
+		self.reason = reason
+
+def is_cacheable(query: str) -> bool:
+	tokens = tokenize(query)
+	return bool(tokens) and tokens[0].value in CACHEABLE_STATEMENTS and \
+		not any(t.kind == "name" and t.value in NONDETERMINISTIC_FUNCTIONS for t in tokens)
+
+def to_pandas(result: QueryResult):
+	import pandas as pd
+	return pd.DataFrame.from_records(result.rows, columns = result.columns)
+
+class AthenaClient(object):
+	"""
+	Athena client for the notebooks of the Studio users. Query results are cached locally
+	(cache.ResultCache) under the execution role of the caller, so repeated exploratory queries
+	do not run again while the cached result is fresh. Results are read with GetQueryResults,
+	which suits the small results of exploratory queries; large results are better unloaded to
+	Parquet and read into Arrow (read_arrow, iter_batches, or read_sql with unload = True).
+	Unloaded results are not cached. With a planner (planner.QueryPlanner), queries are checked
+	against the grants of the caller and their * rewritten to the granted columns before they
+	are submitted. Results are written under a prefix per day (<s3_staging_dir>/YYYY/MM/DD/,
+	see results.ResultCompactor) unless date_partitioned is False.
+	"""
+
+	def __init__(self,
+			s3_staging_dir: str = None,
+			work_group: str = None,
+			database: str = None,
+			cache: ResultCache = None,
+			planner = None,
+			date_partitioned: bool = True,
+			athena = None,
+			sts = None,
+			region_name: str = None,
+			poll_interval: float = POLL_INTERVAL,
+			timeout: float = QUERY_TIMEOUT,
+			sleep = time.sleep):
+		if athena is None or sts is None:
+			import boto3
+			athena = athena or boto3.client("athena", region_name = region_name)
+			sts = sts or boto3.client("sts", region_name = region_name)
+		self.athena = athena
+		self.sts = sts
+		self.s3_staging_dir = s3_staging_dir
+		self.work_group = work_group
+		self.database = database
+		self.cache = cache
+		self.planner = planner
+		self.date_partitioned = date_partitioned
+		self.poll_interval = poll_interval
+		self.timeout = timeout
+		self.sleep = sleep
+		self._arn = None
+
+	@property
+	def arn(self) -> str:
+		"""ARN of the caller, e.g. the assumed-role session of the Studio execution role."""
+		if self._arn is None:
+			self._arn = self.sts.get_caller_identity()["Arn"]
+		return self._arn
+
+	@property
+	def role(self) -> str:
+		"""Execution role of the caller (the caller ARN if it is not a role)."""
+		return role_name(self.arn) or self.arn
+
+	def plan(self, query: str, database: str = None) -> str:
+		"""Query to submit: query as planned by the planner for the caller, if there is one."""
+		if self.planner is None:
+			return query
+		return self.planner.plan(self.arn, query, database or self.database)
+
+	def start(self, query: str, database: str = None) -> str:
+		"""Starts a query execution and returns its ID."""
+		request = { "QueryString": query }
+		if database or self.database:
+			request["QueryExecutionContext"] = { "Database": database or self.database }
+		if self.s3_staging_dir:
+			request["ResultConfiguration"] = {
+				"OutputLocation": result_location(self.s3_staging_dir) if self.date_partitioned else self.s3_staging_dir
+			}
+		if self.work_group:
+			request["WorkGroup"] = self.work_group
+		return self.athena.start_query_execution(**request)["QueryExecutionId"]
+
+	def wait(self, query_execution_id: str) -> dict:
+		"""Waits for a query execution to finish and returns it. Raises QueryFailed unless it succeeded."""
+		delay = self.poll_interval
+		deadline = time.time() + self.timeout
+		while True:
+			execution = self.athena.get_query_execution(QueryExecutionId = query_execution_id)["QueryExecution"]
+			status = execution["Status"]
+			if status["State"] not in PENDING_STATES:
+				break
+			if time.time() + delay > deadline:
+				self.athena.stop_query_execution(QueryExecutionId = query_execution_id)
+				raise QueryFailed(query_execution_id, "TIMEOUT", "Not finished after %d seconds" % self.timeout)
+			self.sleep(delay)
+			delay = min(MAX_POLL_INTERVAL, delay * 2)
+
+		if status["State"] != "SUCCEEDED":
+			raise QueryFailed(query_execution_id, status["State"], status.get("StateChangeReason", ""))
+		return execution
+
+	def results(self, execution: dict) -> tuple:
+		"""Column names and rows of a successful query execution."""
+		columns = None
+		rows = []
+		# The first row of DML results repeats the column names.
+		skip = 1 if execution.get("StatementType") == "DML" else 0
+		paginator = self.athena.get_paginator("get_query_results")
+		for page in paginator.paginate(QueryExecutionId = execution["QueryExecutionId"]):
+			result_set = page["ResultSet"]
+			if columns is None:
+				info = result_set["ResultSetMetadata"]["ColumnInfo"]
+				columns = [c["Name"] for c in info]
+				converters = [CONVERTERS.get(c["Type"]) for c in info]
+			for row in result_set["Rows"][skip:]:
+				values = []
+				for converter, datum in zip(converters, row["Data"]):
+					value = datum.get("VarCharValue")
+					values.append(converter(value) if converter is not None and value is not None else value)
+				rows.append(tuple(values))
+			skip = 0
+		return columns or [], rows
+
+	def execute(self, query: str, database: str = None, use_cache: bool = True) -> QueryResult:
+		"""Runs a query, or returns the cached result of the same query run by the same role."""
+		database = database or self.database
+		query = self.plan(query, database)
+		key = None
+		if use_cache and self.cache is not None and is_cacheable(query):
+			key = (self.role, database, normalize(query))
+			cached = self.cache.get(*key)
+			if cached is not None:
+				query_execution_id, columns, rows = cached
+				return QueryResult(query_execution_id, columns, [tuple(r) for r in rows], True)
+
+		execution = self.wait(self.start(query, database))
+		columns, rows = self.results(execution)
+		if key is not None:
+			self.cache.put(*key, execution["QueryExecutionId"], columns, rows)
+		return QueryResult(execution["QueryExecutionId"], columns, rows, False)
+
+	def unload(self, query: str, database: str = None, location: str = None) -> str:
+		"""Unloads the result of a SELECT query to Parquet files and returns their location."""
+		if location is None:
+			if not self.s3_staging_dir:
+				raise ValueError("UNLOAD needs a location or an s3_staging_dir")
+			location = parquet.unload_location(self.s3_staging_dir)
+		self.wait(self.start(parquet.unload_statement(self.plan(query, database), location), database))
+		return location
+
+	def read_arrow(self, query: str, columns: list = None, database: str = None):
+		"""Result of a SELECT query as a pyarrow Table, with only the given columns read from the Parquet files."""
+		return parquet.read_table(self.unload(query, database), columns = columns)
+
+	def iter_batches(self, query: str, columns: list = None, database: str = None, batch_size: int = parquet.BATCH_SIZE):
+		"""Yields the result of a SELECT query as pyarrow RecordBatches."""
+		yield from parquet.iter_batches(self.unload(query, database), columns = columns, batch_size = batch_size)
+
+	def read_sql(self, query: str, database: str = None, use_cache: bool = True, unload: bool = False, columns: list = None):
+		"""
+		Result of a query as a pandas DataFrame, like pd.read_sql. With unload, the result of a
+		SELECT query is unloaded to Parquet and read through Arrow (columns selects the columns read).
+		"""
+		if unload:
+			return self.read_arrow(query, columns, database).to_pandas()
+		return to_pandas(self.execute(query, database, use_cache))
@@ -0,0 +1,94 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import sqlite3
+import time
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "sagemaker-studio-audit-control", "query-results.db")
+CACHE_TTL = 15 * 60
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+	role TEXT NOT NULL,
+	database_name TEXT NOT NULL,
+	query TEXT NOT NULL,
+	query_execution_id TEXT NOT NULL,
+	result TEXT NOT NULL,
+	size INTEGER NOT NULL,
+	created_at REAL NOT NULL,
+	used_at REAL NOT NULL,
+	PRIMARY KEY (role, database_name, query)
+);
+CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at);
+"""
+
+class ResultCache(object):
+	"""
+	Local SQLite cache of query results, keyed by the execution role, the default database and the
+	normalized query (sql.normalize). Lake Formation filters the columns and rows a query returns
+	by role, so the role is part of every key and a result is only ever returned to the role that
+	ran the query. Entries expire ttl seconds after they were stored; when the results exceed
+	max_bytes, the least recently used ones are removed.
+	"""
+
+	def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL, max_bytes: int = CACHE_MAX_BYTES, clock = time.time):
+		if path != ":memory:":
+			os.makedirs(os.path.dirname(path), exist_ok = True)
+		self.db = sqlite3.connect(path)
+		self.db.executescript(CACHE_SCHEMA)
+		self.ttl = ttl
+		self.max_bytes = max_bytes
+		self.clock = clock
+
+	def close(self) -> None:
+		self.db.close()
+
+	def get(self, role: str, database: str, query: str) -> tuple:
+		"""Returns the query execution ID, column names and rows of a cached result, or None."""
+		now = self.clock()
+		row = self.db.execute("SELECT query_execution_id, result, created_at FROM results WHERE role = ? AND database_name = ? AND query = ?",
+			(role, database or "", query)).fetchone()
+		if row is None:
+			return None
+		with self.db:
+			if row[2] + self.ttl <= now:
+				self.db.execute("DELETE FROM results WHERE role = ? AND database_name = ? AND query = ?", (role, database or "", query))
+				return None
+			self.db.execute("UPDATE results SET used_at = ? WHERE role = ? AND database_name = ? AND query = ?", (now, role, database or "", query))
+		result = json.loads(row[1])
+		return row[0], result["columns"], result["rows"]
+
+	def put(self, role: str, database: str, query: str, query_execution_id: str, columns: list, rows: list) -> None:
+		result = json.dumps({ "columns": columns, "rows": rows }, separators = (",", ":"))
+		if len(result) > self.max_bytes:
+			return
+		now = self.clock()
+		with self.db:
+			self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+				(role, database or "", query, query_execution_id, result, len(result), now, now))
+			self.evict(now)
+
+	def evict(self, now: float) -> None:
+		"""Removes the expired results, then the least recently used ones beyond max_bytes."""
+		self.db.execute("DELETE FROM results WHERE created_at <= ?", (now - self.ttl,))
+		total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+		if total <= self.max_bytes:
+			return
+		evicted = []
+		for rowid, size in self.db.execute("SELECT rowid, size FROM results ORDER BY used_at"):
+			if total <= self.max_bytes:
+				break
+			evicted.append((rowid,))
+			total -= size
+		self.db.executemany("DELETE FROM results WHERE rowid = ?", evicted)
+
+	def clear(self, role: str = None) -> None:
+		"""Removes the results of a role, or all results."""
+		with self.db:
+			if role is None:
+				self.db.execute("DELETE FROM results")
+			else:
+				self.db.execute("DELETE FROM results WHERE role = ?", (role,))
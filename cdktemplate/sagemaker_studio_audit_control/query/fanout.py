@@ -0,0 +1,209 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import asyncio
+from collections import namedtuple
+import heapq
+
+from ..amazon_reviews_schema import AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE, PARTITION_KEYS, PARTITION_LIST
+
+# Athena runs 20 DML queries per account at a time by default; leave room for other users.
+MAX_CONCURRENCY = 10
+RETRIES = 3
+RETRY_DELAY = 1
+
+# approx_distinct keeps the SKETCH_SIZE smallest distinct 64-bit hashes of each partition (a
+# k-minimum-values sketch): sketches of partitions merge exactly, and the relative error of the
+# estimate is about 1 / sqrt(SKETCH_SIZE).
+SKETCH_SIZE = 1024
+HASH_EXPRESSION = "from_big_endian_64(xxhash64(to_utf8(CAST({} AS varchar))))"
+
+FUNCTIONS = ["count", "sum", "min", "max", "approx_distinct"]
+
+# Aggregate of a fan-out query: function (one of FUNCTIONS) of expression, e.g.
+# Aggregate("reviews", "count", "*") or Aggregate("customers", "approx_distinct", "customer_id").
+Aggregate = namedtuple("Aggregate", ["name", "function", "expression"])
+
+class FanOutFailed(Exception):
+	"""
+	Raised when shards still fail after their retries. partials holds the merged results of the
+	shards that succeeded, so the job can be resumed with only the failed partitions.
+	"""
+
+	def __init__(self, failed: dict, partials: "Partials"):
+		super().__init__("%d shards failed: %s" % (len(failed), ", ".join("%s (%s)" % item for item in sorted(failed.items()))))
+		self.failed = failed
+		self.partials = partials
+
+def quote(value: str) -> str:
+	return "'%s'" % value.replace("'", "''")
+
+class FanOutQuery(object):
+	"""
+	Aggregate query over a partitioned table, split into one sub-query per partition. Each
+	sub-query returns partial aggregates per group, which are merged by Partials: counts and sums
+	add up, minimums and maximums are compared and approximate distinct counts merge their sketches.
+	"""
+
+	def __init__(self,
+			aggregates: list,
+			group_by: list = (),
+			where: str = None,
+			database: str = AMAZON_REVIEWS_DATABASE,
+			table: str = AMAZON_REVIEWS_TABLE,
+			partition_key: str = PARTITION_KEYS[0],
+			sketch_size: int = SKETCH_SIZE,
+			hash_expression: str = HASH_EXPRESSION):
+		self.aggregates = [Aggregate(*a) for a in aggregates]
+		for aggregate in self.aggregates:
+			if aggregate.function not in FUNCTIONS:
+				raise ValueError("Unsupported aggregate function: %s" % aggregate.function)
+		self.group_by = list(group_by)
+		self.where = where
+		self.table = '"%s"."%s"' % (database, table)
+		self.partition_key = partition_key
+		self.sketch_size = sketch_size
+		self.hash_expression = hash_expression
+
+	def condition(self, partition: str) -> str:
+		condition = "%s = %s" % (self.partition_key, quote(partition))
+		return "%s AND (%s)" % (condition, self.where) if self.where else condition
+
+	def shard_query(self, partition: str) -> str:
+		"""Partial counts, sums, minimums and maximums of one partition, per group; None if there are none."""
+		aggregates = ["%s(%s) AS a%d" % (a.function, a.expression, i) for i, a in enumerate(self.aggregates) if a.function != "approx_distinct"]
+		if not aggregates:
+			return None
+		columns = ["%s AS g%d" % (g, i) for i, g in enumerate(self.group_by)] + aggregates
+		query = "SELECT %s FROM %s WHERE %s" % (", ".join(columns), self.table, self.condition(partition))
+		if self.group_by:
+			query += " GROUP BY %s" % ", ".join(self.group_by)
+		return query
+
+	def sketch_query(self, partition: str) -> str:
+		"""Sketches of the approximate distinct counts of one partition, per group; None if there are none."""
+		groups = ["g%d" % i for i in range(len(self.group_by))]
+		window = "PARTITION BY %s ORDER BY h" % ", ".join(groups) if groups else "ORDER BY h"
+		selects = []
+		for i, a in enumerate(self.aggregates):
+			if a.function != "approx_distinct":
+				continue
+			values = ["%s AS g%d" % (g, j) for j, g in enumerate(self.group_by)] + ["%s AS h" % self.hash_expression.format(a.expression)]
+			selects.append(
+				"SELECT %d AS a, %s FROM (" % (i, ", ".join(groups + ["h"])) +
+					"SELECT %s, row_number() OVER (%s) AS r FROM (" % (", ".join(groups + ["h"]), window) +
+						"SELECT DISTINCT %s FROM %s WHERE %s AND %s IS NOT NULL" % (", ".join(values), self.table, self.condition(partition), a.expression) +
+					")" +
+				") WHERE r <= %d" % self.sketch_size)
+		return " UNION ALL ".join(selects) or None
+
+class Partials(object):
+	"""Partial aggregates of the shards merged so far, per group."""
+
+	def __init__(self, query: FanOutQuery):
+		self.query = query
+		self.groups = {}
+		self.partitions = set()
+
+	def state(self, group: tuple) -> list:
+		if group not in self.groups:
+			self.groups[group] = [[] if a.function == "approx_distinct" else None for a in self.query.aggregates]
+		return self.groups[group]
+
+	def add(self, partition: str, shard_rows: list, sketch_rows: list) -> None:
+		"""Merges the results of the shard of a partition (rows of shard_query and sketch_query)."""
+		width = len(self.query.group_by)
+		scalar = [i for i, a in enumerate(self.query.aggregates) if a.function != "approx_distinct"]
+		for row in shard_rows or []:
+			state = self.state(tuple(row[:width]))
+			for i, value in zip(scalar, row[width:]):
+				if value is None:
+					continue
+				current = state[i]
+				function = self.query.aggregates[i].function
+				if current is None:
+					state[i] = value
+				elif function in ["count", "sum"]:
+					state[i] = current + value
+				elif function == "min":
+					state[i] = min(current, value)
+				else:
+					state[i] = max(current, value)
+
+		sketches = {}
+		for row in sketch_rows or []:
+			sketches.setdefault((int(row[0]), tuple(row[1:1 + width])), []).append(int(row[-1]))
+		for (i, group), hashes in sketches.items():
+			state = self.state(group)
+			state[i] = heapq.nsmallest(self.query.sketch_size, set(state[i]).union(hashes))
+		self.partitions.add(partition)
+
+	def estimate(self, sketch: list) -> int:
+		"""Distinct values estimated from the k smallest hashes, spread over the signed 64-bit range."""
+		k = self.query.sketch_size
+		if len(sketch) < k:
+			return len(sketch)
+		largest = (sketch[-1] + 2 ** 63) / 2 ** 64
+		return int(round((k - 1) / largest))
+
+	def rows(self) -> tuple:
+		"""Column names and merged rows, sorted by group."""
+		columns = self.query.group_by + [a.name for a in self.query.aggregates]
+		rows = []
+		for group in sorted(self.groups, key = lambda g: tuple((v is None, v) for v in g)):
+			values = []
+			for a, value in zip(self.query.aggregates, self.groups[group]):
+				if a.function == "approx_distinct":
+					values.append(self.estimate(value))
+				elif a.function == "count":
+					values.append(value or 0)
+				else:
+					values.append(value)
+			rows.append(group + tuple(values))
+		return columns, rows
+
+def athena_runner(client):
+	"""Coroutine running a query with a query.athena.AthenaClient in a worker thread; returns its rows."""
+	async def run(query: str) -> list:
+		result = await asyncio.get_running_loop().run_in_executor(None, client.execute, query)
+		return result.rows
+	return run
+
+async def fan_out(query: FanOutQuery,
+		run,
+		partitions: list = PARTITION_LIST,
+		max_concurrency: int = MAX_CONCURRENCY,
+		retries: int = RETRIES,
+		retry_delay: float = RETRY_DELAY,
+		partials: Partials = None) -> Partials:
+	"""
+	Runs the shards of query for the given partitions with at most max_concurrency queries at a
+	time, using run(sql), a coroutine returning the rows of a query (e.g. athena_runner). A
+	failed shard is retried up to retries times, with exponential backoff, without restarting the
+	others. Returns the merged Partials; raises FanOutFailed if shards still fail, which can be
+	resumed by passing its partials and failed partitions.
+	"""
+	partials = partials or Partials(query)
+	semaphore = asyncio.Semaphore(max_concurrency)
+	failed = {}
+
+	async def shard(partition):
+		shard_query = query.shard_query(partition)
+		sketch_query = query.sketch_query(partition)
+		for attempt in range(retries + 1):
+			try:
+				async with semaphore:
+					shard_rows = await run(shard_query) if shard_query else None
+					sketch_rows = await run(sketch_query) if sketch_query else None
+				partials.add(partition, shard_rows, sketch_rows)
+				return
+			except Exception as e:
+				if attempt == retries:
+					failed[partition] = str(e)
+					return
+			await asyncio.sleep(retry_delay * 2 ** attempt)
+
+	await asyncio.gather(*(shard(p) for p in partitions if p not in partials.partitions))
+	if failed:
+		raise FanOutFailed(failed, partials)
+	return partials
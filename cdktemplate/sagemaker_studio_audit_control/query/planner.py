@@ -0,0 +1,257 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from collections import namedtuple
+import re
+
+from ..audit.cloudtrail import role_name
+from ..audit.grants import GrantIndex
+from ..audit.sql import CLAUSE_KEYWORDS, KEYWORDS, TOKEN_PATTERN, TableSchemas, default_schemas, parse
+from ..user_manifest import load_user_manifest
+
+IDENTIFIER_PATTERN = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+JOIN_KEYWORDS = {"join", "left", "right", "full", "inner", "outer", "cross", "natural", "lateral"}
+SELECT_LIST_STARTS = {"select", ",", "distinct", "all"}
+
+# Token of a query with its position in the query text; names are in lower case.
+Span = namedtuple("Span", ["kind", "value", "start", "end"])
+
+class PermissionDenied(Exception):
+	"""Raised when a query reads tables or columns the principal is not granted; columns holds (database, table, column) triples, with column None for tables."""
+
+	def __init__(self, principal: str, columns: list):
+		super().__init__("%s is not granted SELECT on %s" % (principal,
+			", ".join("%s.%s" % (db, table) + (".%s" % column if column else "") for db, table, column in columns)))
+		self.principal = principal
+		self.columns = columns
+
+def spans(query: str) -> list:
+	tokens = []
+	for match in TOKEN_PATTERN.finditer(query):
+		kind = match.lastgroup
+		if kind == "space":
+			continue
+		value = match.group()
+		if kind == "name":
+			value = value.lower()
+		elif kind == "quoted":
+			value = value[1:-1].replace('""', '"').lower()
+		tokens.append(Span(kind, value, match.start(), match.end()))
+	return tokens
+
+def quote_name(name: str) -> str:
+	return name if IDENTIFIER_PATTERN.match(name) and name not in KEYWORDS else '"%s"' % name.replace('"', '""')
+
+def iam_role_arn(arn: str) -> str:
+	"""IAM role ARN of an assumed-role session ARN, as Lake Formation grants refer to it."""
+	if ":assumed-role/" not in arn:
+		return arn
+	return "arn:aws:iam::%s:role/%s" % (arn.split(":")[4], role_name(arn))
+
+class QueryPlanner(object):
+	"""
+	Checks queries against the SELECT grants of the principal before they are submitted. * and
+	alias.* on tables with a known schema are rewritten to the columns granted to the principal,
+	so that the query neither fails nor scans columns the principal cannot see, and queries
+	reading tables or columns that are not granted raise PermissionDenied. Other tables are left
+	to Lake Formation.
+
+	load_grants(principal_arn) returns a GrantIndex with the grants of a principal; it is called
+	once per principal.
+	"""
+
+	def __init__(self, load_grants, schemas: dict = None):
+		self.load_grants = load_grants
+		self.schemas = schemas if schemas is not None else default_schemas()
+		self.table_schemas = TableSchemas(self.schemas)
+		self.grants = {}
+
+	@classmethod
+	def from_templates(cls, paths: list, parameters: dict = None, **kwargs) -> "QueryPlanner":
+		"""Planner using the grants of synthesized templates (see GrantIndex.from_templates)."""
+		index = GrantIndex.from_templates(paths, parameters)
+		return cls(lambda principal_arn: index, **kwargs)
+
+	@classmethod
+	def from_users(cls, users: list = None, **kwargs) -> "QueryPlanner":
+		"""Planner using the grants DataScientistUsersStack creates for the users of the manifest."""
+		index = GrantIndex()
+		index.add_users(users if users is not None else load_user_manifest())
+		return cls(lambda principal_arn: index, **kwargs)
+
+	@classmethod
+	def from_lake_formation(cls, lakeformation = None, **kwargs) -> "QueryPlanner":
+		"""Planner using the grants listed by Lake Formation, which needs permission to list them."""
+		def load_grants(principal_arn):
+			index = GrantIndex()
+			index.add_lake_formation(iam_role_arn(principal_arn), lakeformation)
+			return index
+		return cls(load_grants, **kwargs)
+
+	def grant(self, principal_arn: str, database: str, table: str):
+		if principal_arn not in self.grants:
+			self.grants[principal_arn] = self.load_grants(principal_arn)
+		return self.grants[principal_arn].get(role_name(principal_arn) or principal_arn, database, table)
+
+	def resolve(self, ref: tuple, database: str) -> tuple:
+		"""(database, table) of a table reference, using database for unqualified tables."""
+		if ref[0] is not None:
+			return ref
+		if database is not None:
+			return (database, ref[1])
+		return next((key for key in self.schemas if key[1] == ref[1]), ref)
+
+	def granted_columns(self, principal_arn: str, ref: tuple) -> list:
+		"""Granted columns of a table with a known schema, in table order."""
+		grant = self.grant(principal_arn, *ref)
+		if grant is None:
+			raise PermissionDenied(principal_arn, [ref + (None,)])
+		return [c for c in self.schemas[ref] if grant.allows(c.lower())]
+
+	def from_items(self, tokens: list, i: int, ctes: set) -> list:
+		"""(table reference or None, qualifier) of the FROM clause of the query whose select list contains token i."""
+		n = len(tokens)
+		depth = 0
+		while i < n:
+			if tokens[i].value == "(" and tokens[i].kind == "symbol":
+				depth += 1
+			elif tokens[i].value == ")" and tokens[i].kind == "symbol":
+				depth -= 1
+				if depth < 0:
+					return []
+			elif depth == 0 and tokens[i].kind == "name" and tokens[i].value == "from":
+				break
+			i += 1
+		if i >= n:
+			return []
+
+		items = []
+		i += 1
+		while i < n:
+			if tokens[i].value == "(":
+				depth = 1
+				i += 1
+				while i < n and depth > 0:
+					depth += {"(": 1, ")": -1}.get(tokens[i].value, 0) if tokens[i].kind == "symbol" else 0
+					i += 1
+				ref = None
+				qualifier = None
+			else:
+				parts = []
+				while i < n and tokens[i].kind in ["name", "quoted"]:
+					parts.append(tokens[i].value)
+					i += 1
+					if i < n and tokens[i].value == ".":
+						i += 1
+					else:
+						break
+				if not parts:
+					return items
+				ref = (parts[-2] if len(parts) > 1 else None, parts[-1])
+				qualifier = parts[-1]
+				if ref[0] is None and ref[1] in ctes:
+					ref = None
+			if i < n and tokens[i].value == "as":
+				i += 1
+			if i < n and (tokens[i].kind == "quoted" or (tokens[i].kind == "name" and tokens[i].value not in KEYWORDS)):
+				qualifier = tokens[i].value
+				i += 1
+			items.append((ref, qualifier))
+
+			# Skip join conditions up to the next FROM item or the end of the FROM clause.
+			depth = 0
+			while i < n:
+				value = tokens[i].value if tokens[i].kind != "quoted" else None
+				if value == "(":
+					depth += 1
+				elif value == ")":
+					depth -= 1
+					if depth < 0:
+						return items
+				elif depth == 0 and (value == "," or value == "join"):
+					i += 1
+					break
+				elif depth == 0 and tokens[i].kind == "name" and value in CLAUSE_KEYWORDS and value not in JOIN_KEYWORDS and value not in ["on", "using"]:
+					return items
+				i += 1
+			else:
+				return items
+		return items
+
+	def expand(self, principal_arn: str, items: list, qualifier: str, database: str) -> str:
+		"""Replacement of * (qualifier None) or qualifier.*, or None to keep it."""
+		if qualifier is not None:
+			items = [item for item in items if item[1] == qualifier]
+		expanded = []
+		rewritten = False
+		for ref, item_qualifier in items:
+			ref = self.resolve(ref, database) if ref is not None else None
+			if ref is None or ref not in self.schemas:
+				expanded.append("%s.*" % quote_name(item_qualifier) if item_qualifier else "*")
+				continue
+			columns = self.granted_columns(principal_arn, ref)
+			if len(items) > 1 or qualifier is not None:
+				columns = ["%s.%s" % (quote_name(item_qualifier), quote_name(c)) for c in columns]
+			else:
+				columns = [quote_name(c) for c in columns]
+			expanded.extend(columns)
+			rewritten = True
+		return ", ".join(expanded) if rewritten else None
+
+	def select_stars(self, tokens: list):
+		"""Yields the position, start offset and qualifier (None for *) of the * and alias.* of the select lists."""
+		for i, token in enumerate(tokens):
+			if token.kind != "symbol" or token.value != "*" or i == 0:
+				continue
+			if tokens[i - 1].value in SELECT_LIST_STARTS and tokens[i - 1].kind != "quoted":
+				yield i, token.start, None
+			elif i >= 3 and tokens[i - 1].value == "." and tokens[i - 2].kind in ["name", "quoted"] and tokens[i - 3].value in SELECT_LIST_STARTS:
+				yield i, tokens[i - 2].start, tokens[i - 2].value
+
+	def rewrite(self, principal_arn: str, query: str, database: str = None) -> str:
+		"""Rewrites * and alias.* in select lists to the granted columns."""
+		tokens = spans(query)
+		n = len(tokens)
+		ctes = {tokens[i].value for i in range(1, n - 2)
+			if tokens[i].kind in ["name", "quoted"] and tokens[i + 1].value == "as" and tokens[i + 2].value == "(" and
+				tokens[i - 1].value in ["with", "recursive", ","]}
+
+		replacements = []
+		for i, start, qualifier in self.select_stars(tokens):
+			replacement = self.expand(principal_arn, self.from_items(tokens, i + 1, ctes), qualifier, database)
+			if replacement is not None:
+				replacements.append((start, tokens[i].end, replacement))
+
+		for start, end, replacement in reversed(replacements):
+			query = query[:start] + replacement + query[end:]
+		return query
+
+	def check(self, principal_arn: str, query: str, database: str = None) -> None:
+		"""Raises PermissionDenied if query reads tables or columns with a known schema that are not granted."""
+		# The * left by rewrite select from subqueries, CTEs or tables with an unknown schema, whose
+		# columns are checked where they are defined.
+		tokens = spans(query)
+		for i, start, _ in reversed(list(self.select_stars(tokens))):
+			query = query[:start] + "NULL" + query[tokens[i].end:]
+		references = parse(query, self.table_schemas)
+		denied = []
+		for ref in sorted(references.tables, key = lambda r: (r[0] or "", r[1])):
+			ref = self.resolve(ref, database)
+			if ref in self.schemas and self.grant(principal_arn, *ref) is None:
+				denied.append(ref + (None,))
+		for db, table, column in sorted(references.columns, key = lambda c: (c[0] or "", c[1], c[2])):
+			ref = self.resolve((db, table), database)
+			if ref not in self.schemas or column == "*":
+				continue
+			grant = self.grant(principal_arn, *ref)
+			if grant is not None and not grant.allows(column):
+				denied.append(ref + (column,))
+		if denied:
+			raise PermissionDenied(principal_arn, denied)
+
+	def plan(self, principal_arn: str, query: str, database: str = None) -> str:
+		"""Query to submit for principal_arn: query with * rewritten to the granted columns."""
+		query = self.rewrite(principal_arn, query, database)
+		self.check(principal_arn, query, database)
+		return query
@@ -0,0 +1,247 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+import json
+import os
+import re
+import tempfile
+import uuid
+
+from ..partition_discovery import list_prefixes
+
+RESULTS_PREFIX = "queries/"
+ARCHIVE_PREFIX = "archive/"
+INDEX_PREFIX = ARCHIVE_PREFIX + "index/"
+
+# Query results are compacted once they are older than this, and expire after RESULTS_TTL_DAYS
+# if they were not. Unloaded results are only kept for a short time.
+COMPACT_AFTER_DAYS = 7
+RESULTS_TTL_DAYS = 90
+UNLOAD_TTL_DAYS = 7
+ARCHIVE_IA_DAYS = 30
+
+DELETE_BATCH_SIZE = 1000
+
+# Archives are written one row group at a time, each holding about this many bytes of results.
+ROW_GROUP_BYTES = 64 * 1024 * 1024
+
+# Index objects are updated with conditional writes, retried this many times on conflicts.
+INDEX_WRITE_ATTEMPTS = 5
+CONFLICT_CODES = ["PreconditionFailed", "ConditionalRequestConflict"]
+
+DAY_PATTERN = re.compile(r"(\d{4})/(\d{2})/(\d{2})/$")
+
+def result_location(s3_staging_dir: str, day: datetime.date = None) -> str:
+	"""Output location of the queries run on day (default: today, UTC): <s3_staging_dir>/YYYY/MM/DD/."""
+	day = day or datetime.datetime.utcnow().date()
+	return "%s/%s/" % (s3_staging_dir.rstrip("/"), day.strftime("%Y/%m/%d"))
+
+def lifecycle_configuration(results_prefix: str = RESULTS_PREFIX) -> dict:
+	"""Lifecycle rules of the query results bucket."""
+	return {
+		"Rules": [
+			{
+				"ID": "ExpireQueryResults",
+				"Filter": { "Prefix": results_prefix },
+				"Status": "Enabled",
+				"Expiration": { "Days": RESULTS_TTL_DAYS }
+			},
+			{
+				"ID": "ExpireUnloadedResults",
+				"Filter": { "Prefix": results_prefix + "unload/" },
+				"Status": "Enabled",
+				"Expiration": { "Days": UNLOAD_TTL_DAYS }
+			},
+			{
+				"ID": "ArchiveToInfrequentAccess",
+				"Filter": { "Prefix": ARCHIVE_PREFIX },
+				"Status": "Enabled",
+				"Transitions": [{ "Days": ARCHIVE_IA_DAYS, "StorageClass": "STANDARD_IA" }]
+			},
+			{
+				"ID": "AbortIncompleteMultipartUploads",
+				"Filter": { "Prefix": "" },
+				"Status": "Enabled",
+				"AbortIncompleteMultipartUpload": { "DaysAfterInitiation": 1 }
+			}
+		]
+	}
+
+def apply_lifecycle(bucket: str, s3 = None, results_prefix: str = RESULTS_PREFIX) -> None:
+	"""Replaces the lifecycle configuration of the query results bucket."""
+	if s3 is None:
+		import boto3
+		s3 = boto3.client("s3")
+	s3.put_bucket_lifecycle_configuration(Bucket = bucket, LifecycleConfiguration = lifecycle_configuration(results_prefix))
+
+def archive_schema():
+	import pyarrow as pa
+	return pa.schema([
+		pa.field("query_execution_id", pa.string()),
+		pa.field("name", pa.string()),
+		pa.field("last_modified", pa.timestamp("s", tz = "UTC")),
+		pa.field("content", pa.binary())
+	])
+
+class ResultCompactor(object):
+	"""
+	Compacts the query results of the days older than COMPACT_AFTER_DAYS (the result and
+	metadata files Athena writes under <results_prefix>YYYY/MM/DD/) into one Parquet archive per
+	day and run under archive/YYYY/MM/DD/, then deletes them, so the listings of the results
+	prefix stay small. The results are streamed into the archive one row group at a time, so a day
+	is never held in memory. An index partitioned by the first two characters of the query
+	execution ID and by day (archive/index/<xx>/YYYY-MM-DD.json) maps each ID to its archive:
+	index objects stay as small as the queries of one day, and a lookup reads one index object
+	and one archive when the day is known, or lists the days of the ID prefix otherwise. Index
+	objects are updated with conditional writes (If-Match, If-None-Match), so concurrent runs do
+	not lose each other's entries.
+
+	Archives are written before the index and the index before the results are deleted, so an
+	interrupted run is completed by the next one. Requires pyarrow.
+	"""
+
+	def __init__(self, bucket: str, s3 = None, results_prefix: str = RESULTS_PREFIX, row_group_bytes: int = ROW_GROUP_BYTES):
+		if s3 is None:
+			import boto3
+			s3 = boto3.client("s3")
+		self.s3 = s3
+		self.bucket = bucket
+		self.results_prefix = results_prefix
+		self.row_group_bytes = row_group_bytes
+
+	def days(self) -> list:
+		"""(day, prefix) of the days with results, oldest first."""
+		days = []
+		for year in list_prefixes(self.s3, self.bucket, self.results_prefix):
+			if not re.search(r"/\d{4}/$", year):
+				continue
+			for month in list_prefixes(self.s3, self.bucket, year):
+				for prefix in list_prefixes(self.s3, self.bucket, month):
+					match = DAY_PATTERN.search(prefix)
+					if match:
+						days.append((datetime.date(*map(int, match.groups())), prefix))
+		return sorted(days)
+
+	def list_objects(self, prefix: str) -> list:
+		objects = []
+		paginator = self.s3.get_paginator("list_objects_v2")
+		for page in paginator.paginate(Bucket = self.bucket, Prefix = prefix, Delimiter = "/"):
+			objects.extend(page.get("Contents", []))
+		return objects
+
+	def compact(self, older_than_days: int = COMPACT_AFTER_DAYS, today: datetime.date = None) -> dict:
+		"""Compacts the days older than older_than_days; returns the number of days, queries and objects compacted."""
+		cutoff = (today or datetime.datetime.utcnow().date()) - datetime.timedelta(days = older_than_days)
+		stats = { "Days": 0, "Queries": 0, "Objects": 0 }
+		for day, prefix in self.days():
+			if day >= cutoff:
+				break
+			queries, objects = self.compact_day(day, prefix)
+			stats["Days"] += 1
+			stats["Queries"] += queries
+			stats["Objects"] += objects
+		return stats
+
+	def compact_day(self, day: datetime.date, prefix: str) -> tuple:
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+
+		objects = self.list_objects(prefix)
+		if not objects:
+			return 0, 0
+
+		# S3 lists keys in order, so the rows are sorted by query execution ID as they are written.
+		schema = archive_schema()
+		query_ids = set()
+		archive_key = "%s%s/%s.parquet" % (ARCHIVE_PREFIX, day.strftime("%Y/%m/%d"), uuid.uuid4().hex)
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, "archive.parquet")
+			with pq.ParquetWriter(path, schema, compression = "zstd") as writer:
+				rows = { "query_execution_id": [], "name": [], "last_modified": [], "content": [] }
+				size = 0
+				for o in objects:
+					name = o["Key"][len(prefix):]
+					content = self.s3.get_object(Bucket = self.bucket, Key = o["Key"])["Body"].read()
+					query_ids.add(name.split(".", 1)[0])
+					rows["query_execution_id"].append(name.split(".", 1)[0])
+					rows["name"].append(name)
+					rows["last_modified"].append(o["LastModified"])
+					rows["content"].append(content)
+					size += len(content)
+					if size >= self.row_group_bytes:
+						writer.write_table(pa.Table.from_pydict(rows, schema = schema))
+						rows = { column: [] for column in rows }
+						size = 0
+				if rows["name"]:
+					writer.write_table(pa.Table.from_pydict(rows, schema = schema))
+			self.s3.upload_file(path, self.bucket, archive_key)
+
+		self.update_index(day, {query_id: archive_key for query_id in query_ids})
+
+		keys = [{ "Key": o["Key"] } for o in objects]
+		for i in range(0, len(keys), DELETE_BATCH_SIZE):
+			self.s3.delete_objects(Bucket = self.bucket, Delete = { "Objects": keys[i:i + DELETE_BATCH_SIZE], "Quiet": True })
+		return len(query_ids), len(objects)
+
+	def index_prefix(self, query_execution_id: str) -> str:
+		return "%s%s/" % (INDEX_PREFIX, query_execution_id[:2].lower())
+
+	def index_key(self, day: datetime.date, query_execution_id: str) -> str:
+		return "%s%s.json" % (self.index_prefix(query_execution_id), day.isoformat())
+
+	def read_index(self, key: str) -> tuple:
+		"""Entries and ETag of an index object; ETag None if it does not exist."""
+		try:
+			response = self.s3.get_object(Bucket = self.bucket, Key = key)
+		except self.s3.exceptions.NoSuchKey:
+			return {}, None
+		return json.loads(response["Body"].read()), response["ETag"]
+
+	def update_index(self, day: datetime.date, archives: dict) -> None:
+		"""Adds query execution ID -> archive key entries to the index objects of day."""
+		shards = {}
+		for query_id, archive_key in archives.items():
+			shards.setdefault(self.index_key(day, query_id), {})[query_id] = archive_key
+		for key, entries in sorted(shards.items()):
+			self.merge_index(key, entries)
+
+	def merge_index(self, key: str, entries: dict) -> None:
+		"""
+		Adds entries to an index object. The object is only replaced if it did not change since it
+		was read (or only created if it did not exist); on a conflict it is read and merged again.
+		"""
+		for attempt in range(INDEX_WRITE_ATTEMPTS):
+			index, etag = self.read_index(key)
+			index.update(entries)
+			condition = { "IfMatch": etag } if etag is not None else { "IfNoneMatch": "*" }
+			try:
+				self.s3.put_object(Bucket = self.bucket, Key = key, Body = json.dumps(index, sort_keys = True).encode(), **condition)
+				return
+			except self.s3.exceptions.ClientError as e:
+				if e.response["Error"]["Code"] not in CONFLICT_CODES or attempt == INDEX_WRITE_ATTEMPTS - 1:
+					raise
+
+	def lookup(self, query_execution_id: str, day: datetime.date = None) -> dict:
+		"""
+		Archived files of a query execution (file name -> content), or None if it was not archived.
+		day, the day the query ran, saves listing the index objects of the other days.
+		"""
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+
+		if day is not None:
+			keys = [self.index_key(day, query_execution_id)]
+		else:
+			# Latest day first: ISO dates sort in time order.
+			keys = sorted((o["Key"] for o in self.list_objects(self.index_prefix(query_execution_id))), reverse = True)
+		archive_key = None
+		for key in keys:
+			archive_key = self.read_index(key)[0].get(query_execution_id)
+			if archive_key is not None:
+				break
+		if archive_key is None:
+			return None
+		body = self.s3.get_object(Bucket = self.bucket, Key = archive_key)["Body"].read()
+		table = pq.read_table(pa.BufferReader(body), filters = [("query_execution_id", "=", query_execution_id)])
+		return dict(zip(table.column("name").to_pylist(), table.column("content").to_pylist()))
@@ -0,0 +1,49 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import uuid
+
+from ..audit.sql import tokenize
+
+# Rows per record batch when streaming results.
+BATCH_SIZE = 64 * 1024
+
+def unload_location(s3_staging_dir: str) -> str:
+	"""New, empty prefix for the output of an UNLOAD, which must not exist yet."""
+	return "%s/unload/%s/" % (s3_staging_dir.rstrip("/"), uuid.uuid4().hex)
+
+def unload_statement(query: str, location: str, compression: str = "SNAPPY") -> str:
+	"""UNLOAD of a SELECT query to Parquet files under location."""
+	query = query.strip().rstrip(";")
+	tokens = tokenize(query)
+	if not tokens or tokens[0].value not in ["select", "with", "values"]:
+		raise ValueError("Only SELECT queries can be unloaded: %s" % query)
+	return "UNLOAD (%s) TO '%s' WITH (format = 'PARQUET', compression = '%s')" % (query, location.replace("'", "''"), compression)
+
+def filesystem(location: str):
+	"""pyarrow file system and path of an s3:// location or of a local directory."""
+	import pyarrow.fs as fs
+	if "://" in location:
+		return fs.FileSystem.from_uri(location)
+	return fs.LocalFileSystem(), os.path.abspath(location)
+
+def dataset(location: str):
+	"""
+	Parquet files under location as a pyarrow dataset. Athena names the files of an UNLOAD
+	without extension, so every file under location is read.
+	"""
+	import pyarrow.dataset as ds
+	file_system, path = filesystem(location)
+	return ds.dataset(path, format = "parquet", filesystem = file_system)
+
+def read_table(location: str, columns: list = None, filter = None):
+	"""pyarrow Table with the given columns of the rows matching filter (a pyarrow.dataset expression)."""
+	return dataset(location).to_table(columns = columns, filter = filter)
+
+def iter_batches(location: str, columns: list = None, filter = None, batch_size: int = BATCH_SIZE):
+	"""
+	Yields the rows as pyarrow RecordBatches of at most batch_size rows, reading one Parquet row
+	group at a time, so results larger than memory can be processed batch by batch.
+	"""
+	yield from dataset(location).to_batches(columns = columns, filter = filter, batch_size = batch_size)
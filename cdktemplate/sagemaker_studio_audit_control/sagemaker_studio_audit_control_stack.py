@@ -4,16 +4,28 @@
 from aws_cdk import ( 
 	core
 )
-import os
 
-NESTED_STACK_URL_PREFIX = os.environ["NESTED_STACK_URL_PREFIX"]
+from .config import AuditControlConfig
+from .user_manifest import load_user_manifest
+from .sharding import shard_template_name
 
 class SageMakerStudioAuditControlStack(core.Stack):
 
-	def __init__(self, scope: core.Construct, id: str, **kwargs) -> None:
+	def __init__(self, scope: core.Construct, id: str, users: list = None, user_shards: list = None, profile_shards: list = None, template_urls: dict = None, config: AuditControlConfig = None, **kwargs) -> None:
 		super().__init__(scope, id, **kwargs)
 
-		global NESTED_STACK_URL_PREFIX
+		if config is None:
+			config = AuditControlConfig()
+
+		if users is None:
+			users = load_user_manifest()
+
+		if user_shards is None:
+			user_shards = [users]
+		if profile_shards is None:
+			profile_shards = [users]
+
+		parameterized_users = [user for user in users if user.is_parameterized]
 		
 	# CloudFormation Parameters
 
@@ -27,35 +39,24 @@ class SageMakerStudioAuditControlStack(core.Stack):
 				default = "AWS IAM with IAM users"
 			)
 		
-		user_data_scientist_1 = core.CfnParameter(self, "DataScientistFullAccess", 
-				type="String",
-				description="\
-User profile for data scientist with full access to Amazon Reviews. \
-An IAM user with the same name will be created if the authentication method is \"AWS IAM with IAM users\"",
-				allowed_pattern="^[a-zA-Z0-9](-*[a-zA-Z0-9])*",
-				default = "data-scientist-full"
-			)
+		user_parameters = {}
+		federated_user_parameters = {}
 
-		user_data_scientist_2 = core.CfnParameter(self, "DataScientistLimitedAccess", 
-				type="String",
-				description= "\
-User profile for data scientist with limited access to Amazon Reviews. \
+		for user in parameterized_users:
+			user_parameters[user.name] = core.CfnParameter(self, f"DataScientist{user.parameter_id}Access", 
+					type="String",
+					description=f"\
+User profile for {user.description}. \
 An IAM user with the same name will be created if the authentication method is \"AWS IAM with IAM users\"",
-				allowed_pattern="^[a-zA-Z0-9](-*[a-zA-Z0-9])*",
-				default = "data-scientist-limited"
-			)
-
-		federated_user_data_scientist_1 = core.CfnParameter(self, "FederatedDataScientistFullAccess", 
-				type="String",
-				description="\
-IdP user name for data scientist with full access to Amazon Reviews (e.g., \"username\", or \"username@domain\").",
-			)
+					allowed_pattern="^[a-zA-Z0-9](-*[a-zA-Z0-9])*",
+					default = user.name
+				)
 
-		federated_user_data_scientist_2 = core.CfnParameter(self, "FederatedDataScientistLimitedAccess", 
-				type="String",
-				description="\
-IdP user name for data scientist with limited access to Amazon Reviews (e.g., \"username\", or \"username@domain\").",
-			)
+			federated_user_parameters[user.name] = core.CfnParameter(self, f"FederatedDataScientist{user.parameter_id}Access", 
+					type="String",
+					description=f"\
+IdP user name for {user.description} (e.g., \"username\", or \"username@domain\").",
+				)
 
 		glue_db_name = core.CfnParameter(self, "GlueDatabaseNameAmazonReviews", 
 				type="String",
@@ -71,6 +72,14 @@ IdP user name for data scientist with limited access to Amazon Reviews (e.g., \"
 				default = "amazon_reviews_parquet"
 			)
 
+		partition_projection = core.CfnParameter(self, "PartitionProjection", 
+				type="String",
+				description="\
+Use Athena partition projection for the Amazon Reviews table instead of registering partitions in the Glue Data Catalog.",
+				allowed_values=["Disabled", "Enabled"],
+				default = "Disabled"
+			)
+
 		sagemaker_studio_vpc = core.CfnParameter(self, "SageMakerStudioVpcId", 
 				type="AWS::EC2::VPC::Id",
 				description="VPC that SageMaker Studio will use for communication with the EFS volume."
@@ -94,23 +103,18 @@ Control and audit data exploration activities with Amazon SageMaker Studio and A
 					},
 					{
 						"Label": { "default": "SageMaker Studio User Profiles" },
-						"Parameters": [ 
-							user_data_scientist_1.logical_id,
-							user_data_scientist_2.logical_id
-						]
+						"Parameters": [ p.logical_id for p in user_parameters.values() ]
 					},
 					{
 						"Label": { "default": "Federated Identities - SKIP THIS SECTION IF USING \"AWS IAM with IAM users\" FOR AUTHENTICATION" },
-						"Parameters": [ 
-							federated_user_data_scientist_1.logical_id,
-							federated_user_data_scientist_2.logical_id
-						]
+						"Parameters": [ p.logical_id for p in federated_user_parameters.values() ]
 					},
 					{
 						"Label": { "default": "Amazon Reviews Dataset" },
 						"Parameters": [ 
 							glue_db_name.logical_id, 
-							glue_table_name.logical_id 
+							glue_table_name.logical_id,
+							partition_projection.logical_id
 						]
 					},
 					{
@@ -125,17 +129,13 @@ Control and audit data exploration activities with Amazon SageMaker Studio and A
 					studio_authentication.logical_id: {
 						"default": "Authentication method"
 					},
-					user_data_scientist_1.logical_id: {
-						"default": "Data Scientist 1 User Profile"
-					},
-					user_data_scientist_2.logical_id: {
-						"default": "Data Scientist 2 User Profile"
-					},
-					federated_user_data_scientist_1.logical_id: {
-						"default": "Data Scientist 1's IdP user name"
+					**{
+						user_parameters[user.name].logical_id: { "default": f"Data Scientist {user.index} User Profile" }
+						for user in parameterized_users
 					},
-					federated_user_data_scientist_2.logical_id: {
-						"default": "Data Scientist 2's IdP user name"
+					**{
+						federated_user_parameters[user.name].logical_id: { "default": f"Data Scientist {user.index}'s IdP user name" }
+						for user in parameterized_users
 					},
 					glue_db_name.logical_id: {
 						"default": "Glue Database Name"
@@ -143,6 +143,9 @@ Control and audit data exploration activities with Amazon SageMaker Studio and A
 					glue_table_name.logical_id: {
 						"default": "Glue Table Name"
 					},
+					partition_projection.logical_id: {
+						"default": "Partition Projection"
+					},
 					sagemaker_studio_vpc.logical_id: {
 						"default": "SageMaker Studio VPC ID"
 					},
@@ -165,51 +168,94 @@ Control and audit data exploration activities with Amazon SageMaker Studio and A
 
 	# Nested Stacks
 
-		amazon_reviews_dataset = core.CfnStack(self, "AmazonReviewsDatasetStack",
-			template_url = NESTED_STACK_URL_PREFIX + "AmazonReviewsDatasetStack.yaml",
-			parameters = {
-				"GlueDatabaseNameAmazonReviews" : glue_db_name.value_as_string,
-				"GlueTableNameAmazonReviews" : glue_table_name.value_as_string
-			})
+		def nested_template_url(name):
+			if template_urls is not None and name in template_urls:
+				return template_urls[name]
+			return config.nested_stack_url_prefix + name + ".yaml"
 
-		data_scientist_users = core.CfnStack(self, "DataScientistUsersStack",
-			template_url = NESTED_STACK_URL_PREFIX + "DataScientistUsersStack.yaml",
+		amazon_reviews_dataset = core.CfnStack(self, "AmazonReviewsDatasetStack",
+			template_url = nested_template_url("AmazonReviewsDatasetStack"),
 			parameters = {
-				"StudioAuthentication" : studio_authentication.value_as_string,
-				"DataScientistFullAccess" : user_data_scientist_1.value_as_string,
-				"DataScientistLimitedAccess" : user_data_scientist_2.value_as_string,
-				"FederatedDataScientistFullAccess" : federated_user_data_scientist_1.value_as_string,
-				"FederatedDataScientistLimitedAccess" : federated_user_data_scientist_2.value_as_string,
 				"GlueDatabaseNameAmazonReviews" : glue_db_name.value_as_string,
 				"GlueTableNameAmazonReviews" : glue_table_name.value_as_string,
+				"PartitionProjection" : partition_projection.value_as_string
 			})
 
-		data_scientist_users.add_depends_on(amazon_reviews_dataset)
+		# Users and profiles can be split across several nested stacks (shards) to stay within
+		# CloudFormation template limits. The first users shard owns the shared group and policies,
+		# and the first Studio shard owns the domain; the other shards run in parallel after them.
 
-		sagemaker_studio = core.CfnStack(self, "SageMakerStudioStack", 
-			template_url = NESTED_STACK_URL_PREFIX + "SageMakerStudioStack.yaml",
-			parameters = {
-				"StudioAuthentication" : studio_authentication.value_as_string,
-				"DataScientistFullAccessUsername" : user_data_scientist_1.value_as_string,	
-				"DataScientistLimitedAccessUsername" : user_data_scientist_2.value_as_string,
-				"FederatedDataScientistFullAccess" : federated_user_data_scientist_1.value_as_string,
-				"FederatedDataScientistLimitedAccess" : federated_user_data_scientist_2.value_as_string,
-				"SageMakerStudioVpcId" : sagemaker_studio_vpc.value_as_string,
-				"SageMakerStudiosubnetIds" : core.Fn.join(",",sagemaker_studio_subnets.value_as_list)
-			})
+		data_scientist_users_shards = []
+		shard_of_user = {}
 
-		sagemaker_studio.add_depends_on(data_scientist_users)
+		for index, shard_users in enumerate(user_shards):
+			shard_parameterized_users = [user for user in shard_users if user.is_parameterized]
 
-	# Stack Outputs
+			data_scientist_users = core.CfnStack(self, shard_template_name("DataScientistUsersStack", index),
+				template_url = nested_template_url(shard_template_name("DataScientistUsersStack", index)),
+				parameters = {
+					"StudioAuthentication" : studio_authentication.value_as_string,
+					**{
+						f"DataScientist{user.parameter_id}Access" : user_parameters[user.name].value_as_string
+						for user in shard_parameterized_users
+					},
+					**{
+						f"FederatedDataScientist{user.parameter_id}Access" : federated_user_parameters[user.name].value_as_string
+						for user in shard_parameterized_users
+					},
+					"GlueDatabaseNameAmazonReviews" : glue_db_name.value_as_string,
+					"GlueTableNameAmazonReviews" : glue_table_name.value_as_string,
+				})
 
-		core.CfnOutput(self, "IAMUserDSFull", 
-			value=data_scientist_users.get_att("Outputs.IAMUserDSFull").to_string(),
-			description="IAM User Data Scientist 1",
-			condition=aws_iam_users
-			)
+			data_scientist_users.add_depends_on(amazon_reviews_dataset)
+			if index > 0:
+				data_scientist_users.add_depends_on(data_scientist_users_shards[0])
 
-		core.CfnOutput(self, "IAMUserDSLimited", 
-			value=data_scientist_users.get_att("Outputs.IAMUserDSLimited").to_string(), 
-			description="IAM User Data Scientist 2",
-			condition=aws_iam_users
-			)
+			data_scientist_users_shards.append(data_scientist_users)
+			for user in shard_users:
+				shard_of_user[user.name] = data_scientist_users
+
+		sagemaker_studio_shards = []
+
+		for index, shard_users in enumerate(profile_shards):
+			shard_parameterized_users = [user for user in shard_users if user.is_parameterized]
+
+			if index == 0:
+				domain_parameters = {
+					"SageMakerStudioVpcId" : sagemaker_studio_vpc.value_as_string,
+					"SageMakerStudiosubnetIds" : core.Fn.join(",",sagemaker_studio_subnets.value_as_list)
+				}
+			else:
+				domain_parameters = {
+					"SageMakerDomainId" : sagemaker_studio_shards[0].get_att("Outputs.SageMakerDomainId").to_string()
+				}
+
+			sagemaker_studio = core.CfnStack(self, shard_template_name("SageMakerStudioStack", index), 
+				template_url = nested_template_url(shard_template_name("SageMakerStudioStack", index)),
+				parameters = {
+					"StudioAuthentication" : studio_authentication.value_as_string,
+					**{
+						f"DataScientist{user.parameter_id}AccessUsername" : user_parameters[user.name].value_as_string
+						for user in shard_parameterized_users
+					},
+					**{
+						f"FederatedDataScientist{user.parameter_id}Access" : federated_user_parameters[user.name].value_as_string
+						for user in shard_parameterized_users
+					},
+					**domain_parameters
+				})
+
+			for data_scientist_users in data_scientist_users_shards:
+				if any(shard_of_user[user.name] is data_scientist_users for user in shard_users):
+					sagemaker_studio.add_depends_on(data_scientist_users)
+
+			sagemaker_studio_shards.append(sagemaker_studio)
+
+	# Stack Outputs
+
+		for user in parameterized_users:
+			core.CfnOutput(self, f"IAMUserDS{user.parameter_id}", 
+				value=shard_of_user[user.name].get_att(f"Outputs.IAMUserDS{user.parameter_id}").to_string(),
+				description=f"IAM User Data Scientist {user.index}",
+				condition=aws_iam_users
+				)
@@ -3,19 +3,25 @@
 
 from aws_cdk import ( 
 	aws_iam as iam,
-	# aws_lambda as _lambda,
 	# aws_sagemaker as sm,
 	core
 )
-import os
 
-ROLE_NAME_PREFIX = os.environ["ROLE_NAME_PREFIX"]
+from .config import AuditControlConfig
+from .lambda_code import inline_function
+from .user_manifest import load_user_manifest
 
 class SageMakerStudioStack(core.Stack):
 
-	def __init__(self, scope: core.Construct, id: str, **kwargs) -> None:
+	def __init__(self, scope: core.Construct, id: str, users: list = None, create_domain: bool = True, config: AuditControlConfig = None, **kwargs) -> None:
 		super().__init__(scope, id, **kwargs)
 
+		if config is None:
+			config = AuditControlConfig()
+
+		if users is None:
+			users = load_user_manifest()
+
 	# CloudFormation Parameters
 
 		studio_authentication = core.CfnParameter(self, "StudioAuthentication", 
@@ -28,41 +34,42 @@ class SageMakerStudioStack(core.Stack):
 				default = "AWS IAM with IAM users"
 			)
 
-		user_data_scientist_1 = core.CfnParameter(self, "DataScientistFullAccessUsername", 
-				type="String",
-				description="Username for Data Scientist with full access to Amazon Reviews.",
-				allowed_pattern="^[a-zA-Z0-9](-*[a-zA-Z0-9])*",
-				default = "data-scientist-full"
-			)
+		user_names = {}
+		federated_user_names = {}
 
-		user_data_scientist_2 = core.CfnParameter(self, "DataScientistLimitedAccessUsername", 
-				type="String",
-				description="Username for Data Scientist with limited access to Amazon Reviews.",
-				allowed_pattern="^[a-zA-Z0-9](-*[a-zA-Z0-9])*",
-				default = "data-scientist-limited"
-			)
-
-		federated_user_data_scientist_1 = core.CfnParameter(self, "FederatedDataScientistFullAccess", 
-				type="String",
-				description="\
-IdP user name for data scientist with full access to Amazon Reviews (e.g., \"username\", or \"username@domain\").",
-			)
+		for user in users:
+			if user.is_parameterized:
+				user_names[user.name] = core.CfnParameter(self, f"DataScientist{user.parameter_id}AccessUsername", 
+						type="String",
+						description=f"Username for {user.description}.",
+						allowed_pattern="^[a-zA-Z0-9](-*[a-zA-Z0-9])*",
+						default = user.name
+					).value_as_string
 
-		federated_user_data_scientist_2 = core.CfnParameter(self, "FederatedDataScientistLimitedAccess", 
-				type="String",
-				description="\
-IdP user name for data scientist with limited access to Amazon Reviews (e.g., \"username\", or \"username@domain\").",
-			)
+				federated_user_names[user.name] = core.CfnParameter(self, f"FederatedDataScientist{user.parameter_id}Access", 
+						type="String",
+						description=f"\
+IdP user name for {user.description} (e.g., \"username\", or \"username@domain\").",
+					).value_as_string
+			else:
+				user_names[user.name] = user.name
+				federated_user_names[user.name] = user.federated_name
 
-		sagemaker_studio_vpc = core.CfnParameter(self, "SageMakerStudioVpcId", 
-				type="String",
-				description="VPC that SageMaker Studio will use for communication with the EFS volume."
-			)
+		if create_domain:
+			sagemaker_studio_vpc = core.CfnParameter(self, "SageMakerStudioVpcId", 
+					type="String",
+					description="VPC that SageMaker Studio will use for communication with the EFS volume."
+				)
 
-		sagemaker_studio_subnets = core.CfnParameter(self, "SageMakerStudiosubnetIds", 
-				type="CommaDelimitedList",
-				description="Subnet(s) that SageMaker Studio will use for communication with the EFS volume. Must be in the selected VPC and in different AZs."
-			)
+			sagemaker_studio_subnets = core.CfnParameter(self, "SageMakerStudiosubnetIds", 
+					type="CommaDelimitedList",
+					description="Subnet(s) that SageMaker Studio will use for communication with the EFS volume. Must be in the selected VPC and in different AZs."
+				)
+		else:
+			sagemaker_domain_id = core.CfnParameter(self, "SageMakerDomainId", 
+					type="String",
+					description="ID of the SageMaker Studio domain created by the first SageMaker Studio stack."
+				)
 
 		self.template_options.template_format_version = "2010-09-09"
 		self.template_options.description = "SageMaker Studio and Studio User Profiles."
@@ -80,77 +87,189 @@ IdP user name for data scientist with limited access to Amazon Reviews (e.g., \"
 
 	# IAM Users and Roles for Data Scientists
 
-		data_scientist_role_1 = core.Fn.condition_if(
-			aws_iam_users.logical_id, 
-			user_data_scientist_1.value_as_string, 
-			core.Fn.condition_if(aws_federation.logical_id, federated_user_data_scientist_1.value_as_string, "")
-		)
-
-		data_scientist_role_2 = core.Fn.condition_if(
-			aws_iam_users.logical_id, 
-			user_data_scientist_2.value_as_string, 
-			core.Fn.condition_if(aws_federation.logical_id, federated_user_data_scientist_2.value_as_string, "")
-		)
+		data_scientist_roles = {}
+		roles = {}
 
-		role_1 = iam.Role.from_role_arn(self, "DataScientistFullIAMRole", 
-			role_arn = f"arn:aws:iam::{core.Aws.ACCOUNT_ID}:role/{ROLE_NAME_PREFIX}{data_scientist_role_1.to_string()}"
+		for user in users:
+			data_scientist_roles[user.name] = core.Fn.condition_if(
+				aws_iam_users.logical_id, 
+				user_names[user.name], 
+				core.Fn.condition_if(aws_federation.logical_id, federated_user_names[user.name], "")
 			)
 
-		role_2 = iam.Role.from_role_arn(self, "DataScientistLimitedIAMRole", 
-			role_arn = f"arn:aws:iam::{core.Aws.ACCOUNT_ID}:role/{ROLE_NAME_PREFIX}{data_scientist_role_2.to_string()}"
-			)
+			roles[user.name] = iam.Role.from_role_arn(self, f"DataScientist{user.parameter_id}IAMRole", 
+				role_arn = f"arn:aws:iam::{core.Aws.ACCOUNT_ID}:role/{config.role_name_prefix}{data_scientist_roles[user.name].to_string()}"
+				)
 
 	# Create SageMaker Studio Domain (as CfnResource)
 
-		sm_default_execution_role = iam.Role(self, "SageMakerStudioDefaultExecutionRole",
-			role_name = ROLE_NAME_PREFIX + "Default", 
-			assumed_by = iam.ServicePrincipal('sagemaker.amazonaws.com'),
-			managed_policies = [iam.ManagedPolicy.from_aws_managed_policy_name("AmazonSageMakerFullAccess")]
-			)
+		if create_domain:
+			sm_default_execution_role = iam.Role(self, "SageMakerStudioDefaultExecutionRole",
+				role_name = config.role_name_prefix + "Default", 
+				assumed_by = iam.ServicePrincipal('sagemaker.amazonaws.com'),
+				managed_policies = [iam.ManagedPolicy.from_aws_managed_policy_name("AmazonSageMakerFullAccess")]
+				)
 
-		sm_domain = core.CfnResource(self, "SageMakerDomain",
-			type = "AWS::SageMaker::Domain",
-			properties = {
-				"AuthMode" : "IAM",
-				"DefaultUserSettings" : {
-						"ExecutionRole": sm_default_execution_role.role_arn
-					},
-				"DomainName" : "default-domain",
-				"SubnetIds" : sagemaker_studio_subnets.value_as_list,
-				"VpcId" : sagemaker_studio_vpc.value_as_string
+			if config.domain_resource == "lambda":
+				sm_domain = self.domain_custom_resource(sm_default_execution_role, sagemaker_studio_vpc, sagemaker_studio_subnets)
+				sm_domain_id = sm_domain.get_att_string("DomainId")
+			else:
+				sm_domain = core.CfnResource(self, "SageMakerDomain",
+					type = "AWS::SageMaker::Domain",
+					properties = {
+						"AuthMode" : "IAM",
+						"DefaultUserSettings" : {
+								"ExecutionRole": sm_default_execution_role.role_arn
+							},
+						"DomainName" : "default-domain",
+						"SubnetIds" : sagemaker_studio_subnets.value_as_list,
+						"VpcId" : sagemaker_studio_vpc.value_as_string
+					})
+				sm_domain_id = sm_domain.ref
+
+			core.CfnOutput(self, "SageMakerDomainId", 
+				value=sm_domain_id,
+				description="SageMaker Studio Domain ID"
+				)
+		else:
+			sm_domain = None
+			sm_domain_id = sagemaker_domain_id.value_as_string
+
+	# Create SageMaker Studio User Profiles (in bulk, with a custom resource)
+
+		profile_function_role = iam.Role(self, "SageMakerUserProfilesFunctionRole",
+			assumed_by = iam.ServicePrincipal("lambda.amazonaws.com"),
+			managed_policies = [iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole")],
+			inline_policies = {
+				"SageMakerUserProfiles": iam.PolicyDocument(statements = [
+					iam.PolicyStatement(
+						sid = "SageMakerUserProfiles",
+						effect = iam.Effect.ALLOW,
+						actions = [
+							"sagemaker:CreateUserProfile",
+							"sagemaker:UpdateUserProfile",
+							"sagemaker:DeleteUserProfile",
+							"sagemaker:DescribeUserProfile",
+							"sagemaker:AddTags"
+						],
+						resources = [f"arn:aws:sagemaker:{core.Aws.REGION}:{core.Aws.ACCOUNT_ID}:user-profile/*"]),
+					iam.PolicyStatement(
+						sid = "PassDataScientistRoles",
+						effect = iam.Effect.ALLOW,
+						actions = ["iam:PassRole"],
+						resources = [f"arn:aws:iam::{core.Aws.ACCOUNT_ID}:role/{config.role_name_prefix}*"])
+				])
 			})
 
-		sm_domain_id = sm_domain.ref
-		
-	# Create SageMaker Studio User Profiles (as CfnResources)
+		profile_function = inline_function(self, "SageMakerUserProfilesFunction", "sagemaker_studio_profile_batch",
+			role = profile_function_role,
+			timeout = core.Duration.minutes(15),
+			memory_size = 256
+		)
 
-		sm_profile_full = core.CfnResource(self, "SageMakerUserProfileDataScientistFull",
-			type = "AWS::SageMaker::UserProfile",
-			properties =  {
+		sm_profiles = core.CustomResource(self, "SageMakerUserProfiles",
+			service_token = profile_function.function_arn,
+			resource_type = "Custom::SageMakerUserProfiles",
+			properties = {
 				"DomainId" : sm_domain_id,
-				"Tags" : [{
-					"Key" : "studiouserid",
-					"Value" : data_scientist_role_1
-				}],
-				"UserProfileName" : user_data_scientist_1.value_as_string,
-				"UserSettings" : {
-					"ExecutionRole" : role_1.role_arn,
-				}
+				"UserProfiles" : [{
+					"UserProfileName" : user_names[user.name],
+					"StudioUserId" : data_scientist_roles[user.name],
+					"ExecutionRole" : roles[user.name].role_arn
+				} for user in users]
 			})
 
-		sm_profile_limited = core.CfnResource(self, "SageMakerUserProfileDataScientistLimited",
-			type = "AWS::SageMaker::UserProfile",
-			properties =  {
-				"DomainId" : sm_domain_id,
-				"Tags" : [{
-					"Key" : "studiouserid",
-					"Value" : data_scientist_role_2
-				}],
-				"UserProfileName" : user_data_scientist_2.value_as_string,
-				"UserSettings" : {
-					"ExecutionRole" : role_2.role_arn,
-				}
+		if sm_domain is not None:
+			sm_profiles.node.add_dependency(sm_domain)
+
+	# Per-user profile resources of earlier releases, kept for one update so that the stacks drop
+	# them without deleting the profiles (see AuditControlConfig.retain_legacy_resources).
+	# SageMakerUserProfiles adopts the existing profiles.
+
+		if config.retain_legacy_resources:
+			for user in users:
+				sm_profile = core.CfnResource(self, f"SageMakerUserProfileDataScientist{user.parameter_id}",
+					type = "AWS::SageMaker::UserProfile",
+					properties =  {
+						"DomainId" : sm_domain_id,
+						"Tags" : [{
+							"Key" : "studiouserid",
+							"Value" : data_scientist_roles[user.name]
+						}],
+						"UserProfileName" : user_names[user.name],
+						"UserSettings" : {
+							"ExecutionRole" : roles[user.name].role_arn,
+						}
+					})
+				sm_profile.apply_removal_policy(core.RemovalPolicy.RETAIN)
+
+				if sm_domain is not None:
+					sm_profile.node.add_dependency(sm_domain)
+				sm_profiles.node.add_dependency(sm_profile)
+
+	def domain_custom_resource(self, default_execution_role, vpc, subnets) -> core.CustomResource:
+		"""Studio domain created by lambda/sagemaker_studio_domain.py, which re-triggers itself with an EventBridge rule while the domain settles."""
+		domain_function_role = iam.Role(self, "SageMakerDomainFunctionRole",
+			assumed_by = iam.ServicePrincipal("lambda.amazonaws.com"),
+			managed_policies = [iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole")],
+			inline_policies = {
+				"SageMakerDomain": iam.PolicyDocument(statements = [
+					iam.PolicyStatement(
+						sid = "SageMakerDomain",
+						effect = iam.Effect.ALLOW,
+						actions = [
+							"sagemaker:CreateDomain",
+							"sagemaker:DescribeDomain",
+							"sagemaker:DeleteDomain",
+							"sagemaker:ListDomains"
+						],
+						resources = ["*"]),
+					iam.PolicyStatement(
+						sid = "PassDefaultExecutionRole",
+						effect = iam.Effect.ALLOW,
+						actions = ["iam:PassRole"],
+						resources = [default_execution_role.role_arn]),
+					iam.PolicyStatement(
+						sid = "ContinuationRule",
+						effect = iam.Effect.ALLOW,
+						actions = [
+							"events:PutRule",
+							"events:PutTargets",
+							"events:RemoveTargets",
+							"events:DeleteRule"
+						],
+						resources = [f"arn:aws:events:{core.Aws.REGION}:{core.Aws.ACCOUNT_ID}:rule/sagemaker-domain-*"])
+				])
 			})
 
-		sm_profile_full.node.add_dependency(sm_domain)
-		sm_profile_limited.node.add_dependency(sm_domain)
\ No newline at end of file
+		domain_function = inline_function(self, "SageMakerDomainFunction", "sagemaker_studio_domain",
+			role = domain_function_role,
+			timeout = core.Duration.minutes(15),
+			environment = { "CONTINUATION_MODE": "schedule" }
+		)
+
+		# Separate from the role policies, which the function depends on, as it refers to the function.
+		continuation_policy = iam.Policy(self, "SageMakerDomainContinuationPolicy",
+			roles = [domain_function_role],
+			statements = [
+				iam.PolicyStatement(
+					sid = "Continuation",
+					effect = iam.Effect.ALLOW,
+					actions = [
+						"lambda:InvokeFunction",
+						"lambda:AddPermission",
+						"lambda:RemovePermission"
+					],
+					resources = [domain_function.function_arn])
+			])
+
+		sm_domain = core.CustomResource(self, "SageMakerDomain",
+			service_token = domain_function.function_arn,
+			resource_type = "Custom::SageMakerDomain",
+			properties = {
+				"DefaultExecutionRole" : default_execution_role.role_arn,
+				"SubnetIds" : subnets.value_as_list,
+				"VpcId" : vpc.value_as_string
+			})
+		sm_domain.node.add_dependency(continuation_policy)
+		return sm_domain
@@ -0,0 +1,88 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from aws_cdk import (
+	cx_api,
+	core
+)
+import collections
+import json
+
+# CloudFormation limits for a template deployed from an S3 URL.
+MAX_TEMPLATE_RESOURCES = 500
+MAX_TEMPLATE_SIZE = 1000000
+
+# Fraction of each limit a shard is planned to use, leaving room for estimation error.
+SHARD_HEADROOM = 0.9
+
+# Users that always fit in one template, so that the usual manifests are not measured: each user
+# takes 4 resources and up to 4 KB in DataScientistUsersStack, and a user profile entry of well
+# under 1 KB in SageMakerStudioStack.
+USERS_PER_TEMPLATE = 50
+PROFILES_PER_TEMPLATE = 200
+
+TemplateSize = collections.namedtuple("TemplateSize", ["resources", "size"])
+
+def measure_template(template: dict) -> TemplateSize:
+	return TemplateSize(len(template.get("Resources", {})), len(json.dumps(template, indent = 1)))
+
+def synth_template(build_stack) -> dict:
+	"""Synthesizes the stack returned by build_stack(app) in a throwaway app and returns its template."""
+	app = core.App()
+	stack = build_stack(app)
+	return app.synth().get_stack_by_name(stack.stack_name).template
+
+def items_per_shard(build_stack, sample) -> int:
+	"""
+	Measures how many items fit in one template. build_stack(app, items) must build the stack
+	for a list of items; sample should be the most expensive item, e.g. the user with the
+	longest column list. The stack is synthesized with no items and with the sample alone,
+	and the difference is taken as the cost of every item.
+	"""
+	empty = measure_template(synth_template(lambda app: build_stack(app, [])))
+	single = measure_template(synth_template(lambda app: build_stack(app, [sample])))
+
+	item_resources = max(single.resources - empty.resources, 1)
+	item_size = max(single.size - empty.size, 1)
+
+	capacity = min(
+		int((MAX_TEMPLATE_RESOURCES * SHARD_HEADROOM - empty.resources) // item_resources),
+		int((MAX_TEMPLATE_SIZE * SHARD_HEADROOM - empty.size) // item_size)
+	)
+	if capacity < 1:
+		raise ValueError("A single item does not fit in a CloudFormation template: %s" % (single,))
+	return capacity
+
+def plan_shards(items: list, build_stack, sample, static_capacity: int) -> list:
+	"""
+	Shards of items. Up to static_capacity items, a bound known to fit in one template, make a
+	single shard without synthesizing anything; larger lists are split by the capacity measured
+	by items_per_shard(build_stack, sample).
+	"""
+	if len(items) <= static_capacity:
+		return [items]
+	return shard(items, items_per_shard(build_stack, sample))
+
+def shard(items: list, capacity: int) -> list:
+	"""Splits items into consecutive shards of at most capacity items. Always returns at least one shard."""
+	if len(items) == 0:
+		return [[]]
+	return [items[i:i + capacity] for i in range(0, len(items), capacity)]
+
+def shard_stack_id(id: str, index: int) -> str:
+	"""Name of the n-th shard of a stack: the first shard keeps the original name."""
+	return id if index == 0 else f"{id}-{index + 1}"
+
+def shard_template_name(name: str, index: int) -> str:
+	return name if index == 0 else f"{name}{index + 1}"
+
+def check_template_limits(assembly: cx_api.CloudAssembly) -> None:
+	"""Raises ValueError if any synthesized template exceeds the CloudFormation limits."""
+	oversized = []
+	for stack in assembly.stacks:
+		size = measure_template(stack.template)
+		if size.resources > MAX_TEMPLATE_RESOURCES or size.size > MAX_TEMPLATE_SIZE:
+			oversized.append("%s (%d resources, %d bytes)" % (stack.stack_name, size.resources, size.size))
+
+	if oversized:
+		raise ValueError("Templates exceed CloudFormation limits: %s" % ", ".join(oversized))
@@ -0,0 +1,135 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+from .sharding import synth_template
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+TEMPLATE_ASSETS_DIR = os.path.join(PROJECT_DIR, "template_assets")
+TEMPLATE_INDEX_FILE = "index.json"
+
+# Files that can change the synthesized templates: the stack packages (audit and query included,
+# as the stacks import from them), the Lambda sources inlined into the templates, the default
+# user manifest and the CDK settings.
+TEMPLATE_SOURCE_PATTERNS = [
+	"app.py",
+	"sagemaker_studio_audit_control/**/*.py",
+	"lambda/*.py",
+	"data_scientist_users.json",
+	"cdk.json"
+]
+
+# Installed packages whose version can change the synthesized templates.
+TEMPLATE_PACKAGE_PATTERN = re.compile(r"^(aws-cdk[.-].*|jsii|constructs)$", re.IGNORECASE)
+
+# Nested stack URL forms: https://<bucket>.s3[.<region>].amazonaws.com/<prefix> and https://s3[.<region>].amazonaws.com/<bucket>/<prefix>
+VIRTUAL_HOSTED_URL_PATTERN = re.compile(r"^https://([^/]+)\.s3(?:[.-][a-z0-9-]+)?\.amazonaws\.com/(.*)$")
+PATH_STYLE_URL_PATTERN = re.compile(r"^https://s3(?:[.-][a-z0-9-]+)?\.amazonaws\.com/([^/]+)/(.*)$")
+
+def source_files(extra_files: list = ()) -> list:
+	files = set(os.path.abspath(path) for path in extra_files)
+	for pattern in TEMPLATE_SOURCE_PATTERNS:
+		files.update(os.path.abspath(path) for path in glob.glob(os.path.join(PROJECT_DIR, pattern), recursive = True))
+	return sorted(files)
+
+def package_versions() -> dict:
+	"""Versions of the installed CDK packages."""
+	try:
+		from importlib import metadata
+		distributions = ((d.metadata["Name"], d.version) for d in metadata.distributions())
+	except ImportError:
+		import pkg_resources
+		distributions = ((d.project_name, d.version) for d in pkg_resources.working_set)
+	return { name.lower(): version for name, version in distributions if name and TEMPLATE_PACKAGE_PATTERN.match(name) }
+
+def input_hash(files: list, packages: dict = None, **inputs) -> str:
+	"""Hash of the source files, of the package versions and of the arguments the stack is built with."""
+	digest = hashlib.sha256()
+	for path in files:
+		digest.update(os.path.relpath(path, PROJECT_DIR).encode())
+		with open(path, "rb") as fp:
+			digest.update(fp.read())
+	digest.update(json.dumps(packages or {}, sort_keys = True).encode())
+	digest.update(json.dumps(inputs, sort_keys = True, default = lambda o: o.__dict__).encode())
+	return digest.hexdigest()
+
+def s3_location(url_prefix: str) -> tuple:
+	"""Bucket and key prefix of an S3 URL prefix, e.g. the nested_stack_url_prefix setting."""
+	for pattern in [VIRTUAL_HOSTED_URL_PATTERN, PATH_STYLE_URL_PATTERN]:
+		match = pattern.match(url_prefix)
+		if match:
+			return match.group(1), match.group(2)
+	raise ValueError("Not an S3 URL: %s" % url_prefix)
+
+class TemplateAssets(object):
+	"""
+	Synthesized nested stack templates, stored under content-hash file names.
+
+	The index maps each template name to the hash of its inputs and to the file holding the
+	template. A template whose inputs are unchanged is served from the index without being
+	synthesized again, and its file name (and therefore URL) stays the same.
+	"""
+
+	def __init__(self, assets_dir: str = TEMPLATE_ASSETS_DIR, extra_files: list = ()):
+		self.assets_dir = assets_dir
+		self.index_path = os.path.join(assets_dir, TEMPLATE_INDEX_FILE)
+		self.files = source_files(extra_files)
+		self.packages = package_versions()
+		self.index = {}
+		if os.path.exists(self.index_path):
+			with open(self.index_path) as fp:
+				self.index = json.load(fp)
+
+	def build(self, name: str, build_stack, **inputs) -> str:
+		"""
+		Returns the file name of the template named name. build_stack(app) builds the stack
+		and is only called when the inputs changed since the last build.
+		"""
+		start = time.time()
+		key = input_hash(self.files, self.packages, **inputs)
+		entry = self.index.get(name)
+
+		if entry and entry["InputHash"] == key and os.path.exists(os.path.join(self.assets_dir, entry["File"])):
+			print("%s: cached %s (%.2fs)" % (name, entry["File"], time.time() - start), file = sys.stderr)
+			return entry["File"]
+
+		body = json.dumps(synth_template(build_stack), indent = 1, sort_keys = True)
+		file_name = "%s-%s.json" % (name, hashlib.sha256(body.encode()).hexdigest()[:16])
+
+		os.makedirs(self.assets_dir, exist_ok = True)
+		path = os.path.join(self.assets_dir, file_name)
+		if not os.path.exists(path):
+			with open(path, "w") as fp:
+				fp.write(body)
+
+		self.index[name] = { "InputHash": key, "File": file_name }
+		with open(self.index_path, "w") as fp:
+			json.dump(self.index, fp, indent = 1, sort_keys = True)
+
+		print("%s: synthesized %s (%.2fs)" % (name, file_name, time.time() - start), file = sys.stderr)
+		return file_name
+
+	def publish(self, bucket: str, prefix: str = "", s3 = None) -> None:
+		"""Uploads the templates in the index that are not in the bucket yet (see s3_location for the bucket and prefix of a URL)."""
+		if s3 is None:
+			import boto3
+			s3 = boto3.client("s3")
+
+		for entry in self.index.values():
+			key = prefix + entry["File"]
+			try:
+				s3.head_object(Bucket = bucket, Key = key)
+				continue
+			except s3.exceptions.ClientError as e:
+				if e.response["Error"]["Code"] not in ["404", "NoSuchKey", "NotFound"]:
+					raise
+			s3.upload_file(os.path.join(self.assets_dir, entry["File"]), bucket, key)
+			print("Uploaded s3://%s/%s" % (bucket, key), file = sys.stderr)
@@ -0,0 +1,74 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import re
+
+USER_MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_scientist_users.json")
+
+ACCESS_FULL = "full"
+ACCESS_COLUMNS = "columns"
+
+USER_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9](-*[a-zA-Z0-9])*$")
+
+class DataScientistUser(object):
+	"""
+	A data scientist declared in the user manifest.
+
+	Users with a label are exposed as CloudFormation parameters (user name and IdP user name)
+	and keep the logical IDs of the original two personas, e.g. "DataScientistFullAccess" and
+	"DataScientist1IAMUser". Users without a label have their names written into the templates
+	and get logical IDs derived from the user name.
+	"""
+
+	def __init__(self, index, name, label = None, description = None, access = ACCESS_FULL, columns = None, federated_name = None):
+		if not USER_NAME_PATTERN.match(name):
+			raise ValueError("Invalid user name in manifest: %s" % name)
+		if access not in [ACCESS_FULL, ACCESS_COLUMNS]:
+			raise ValueError("Invalid access for user %s: %s" % (name, access))
+		if access == ACCESS_COLUMNS and not columns:
+			raise ValueError("User %s has column access but no columns" % name)
+
+		self.index = index
+		self.name = name
+		self.label = label
+		self.description = description or "data scientist %s" % name
+		self.access = access
+		self.columns = list(columns or [])
+		self.federated_name = federated_name or name
+
+	@property
+	def is_parameterized(self):
+		return self.label is not None
+
+	@property
+	def parameter_id(self):
+		"""Logical ID fragment for parameters, secrets, profiles and outputs."""
+		return self.label if self.is_parameterized else camel_case(self.name)
+
+	@property
+	def resource_id(self):
+		"""Logical ID fragment for IAM users, roles and Lake Formation permissions."""
+		return str(self.index) if self.is_parameterized else camel_case(self.name)
+
+def camel_case(name):
+	return "".join(part[:1].upper() + part[1:] for part in re.split(r"[^a-zA-Z0-9]+", name))
+
+def load_user_manifest(path = USER_MANIFEST_PATH):
+	with open(path) as fp:
+		manifest = json.load(fp)
+
+	users = []
+	for index, entry in enumerate(manifest["users"], start = 1):
+		users.append(DataScientistUser(index, **entry))
+
+	names = [user.name for user in users]
+	if len(set(names)) != len(names):
+		raise ValueError("Duplicate user names in manifest %s" % path)
+
+	for ids in [[user.resource_id for user in users], [user.parameter_id for user in users]]:
+		if len(set(ids)) != len(ids):
+			raise ValueError("User names or labels in manifest %s map to the same logical IDs" % path)
+
+	return users
@@ -26,10 +26,12 @@ setuptools.setup(
         "aws-cdk.aws-iam",
         "aws-cdk.aws_lakeformation",
         "aws-cdk.aws_glue",
+        "aws-cdk.aws_lambda",
         "aws-cdk.aws_s3",
         "aws-cdk.aws_secretsmanager",
 		# "aws-cdk.aws_sagemaker",
-        "aws-cdk.aws_sso"
+        "aws-cdk.aws_sso",
+        "boto3"
     ],
 
     python_requires=">=3.6",
@@ -0,0 +1,76 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import sys
+import types
+
+import pytest
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+LAMBDA_DIR = os.path.join(ROOT_DIR, "lambda")
+
+# The Lambda handlers import their modules from the root of the deployment package.
+for path in [ROOT_DIR, LAMBDA_DIR]:
+	if path not in sys.path:
+		sys.path.insert(0, path)
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+# cfnresponse is only provided by the Lambda runtime for inline code.
+cfnresponse = types.ModuleType("cfnresponse")
+cfnresponse.SUCCESS = "SUCCESS"
+cfnresponse.FAILED = "FAILED"
+cfnresponse.responses = []
+
+def send(event, context, status, data, physical_resource_id = None, noEcho = False, reason = None):
+	cfnresponse.responses.append({
+		"Status": status,
+		"Data": data,
+		"PhysicalResourceId": physical_resource_id,
+		"Reason": reason
+	})
+
+cfnresponse.send = send
+sys.modules.setdefault("cfnresponse", cfnresponse)
+
+class FakeContext(object):
+	"""Lambda context whose remaining time runs down with a fake clock."""
+
+	def __init__(self, remaining_millis = 900000):
+		self.remaining_millis = remaining_millis
+		self.invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:handler"
+		self.function_name = "handler"
+
+	def get_remaining_time_in_millis(self):
+		return self.remaining_millis
+
+	def sleep(self, seconds):
+		self.remaining_millis -= int(seconds * 1000)
+
+@pytest.fixture
+def context():
+	return FakeContext()
+
+@pytest.fixture
+def responses():
+	"""cfnresponse.send calls made by the test."""
+	del sys.modules["cfnresponse"].responses[:]
+	return sys.modules["cfnresponse"].responses
+
+SIMULATION_START = "2021-03-01"
+
+@pytest.fixture(scope = "session")
+def trail(tmp_path_factory):
+	"""CloudTrail log files of one simulated day with duplicated and late deliveries, in delivery order."""
+	from sagemaker_studio_audit_control.audit.simulator import TrafficSimulator, parse_date
+	directory = str(tmp_path_factory.mktemp("trail"))
+	start = parse_date(SIMULATION_START)
+	simulator = TrafficSimulator(sessions_per_day = 8, queries_per_session = 10, duplicate_rate = 0.1, violation_rate = 0.2, seed = 7)
+	return simulator.write(directory, start, start + 24 * 3600)
+
+@pytest.fixture(scope = "session")
+def trail_records(trail):
+	"""Audited records of the simulated trail, in delivery order."""
+	from sagemaker_studio_audit_control.audit.reader import read_files
+	return list(read_files(trail, processes = 1))
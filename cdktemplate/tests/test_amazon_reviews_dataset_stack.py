@@ -0,0 +1,52 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import re
+
+import pytest
+
+pytest.importorskip("aws_cdk.core")
+
+from sagemaker_studio_audit_control.amazon_reviews_dataset_stack import AmazonReviewsDatasetStack
+from sagemaker_studio_audit_control.amazon_reviews_schema import PARTITION_LIST
+from sagemaker_studio_audit_control.config import AuditControlConfig
+from sagemaker_studio_audit_control.lambda_code import inline_code
+from sagemaker_studio_audit_control.sharding import synth_template
+
+def synth(**kwargs):
+	return synth_template(lambda app: AmazonReviewsDatasetStack(app, "amazon-reviews-dataset-stack", **kwargs))
+
+def resources(template, resource_type):
+	return { name: r for name, r in template["Resources"].items() if r["Type"] == resource_type }
+
+def test_partitions_custom_resource():
+	template = synth()
+	assert resources(template, "AWS::Glue::Partition") == {}
+	partitions = resources(template, "Custom::GluePartitions")["GluePartitions"]
+	assert partitions["Properties"]["Partitions"] == [[p] for p in PARTITION_LIST]
+
+def test_retain_legacy_partitions():
+	template = synth(config = AuditControlConfig(retain_legacy_resources = True))
+	legacy = resources(template, "AWS::Glue::Partition")
+	# Same logical IDs as the per-partition resources of earlier releases.
+	assert sorted(legacy) == sorted("Partition" + re.sub("[^A-Za-z0-9]", "", p) for p in PARTITION_LIST)
+	assert all(r["DeletionPolicy"] == "Retain" for r in legacy.values())
+	assert set(legacy) <= set(resources(template, "Custom::GluePartitions")["GluePartitions"]["DependsOn"])
+
+def test_discovered_partition_locations():
+	template = synth(partitions = [["Books"], ["Health_&_Personal_Care"]],
+		partition_locations = { "Health_&_Personal_Care": "product_category=Health_%26_Personal_Care" })
+	properties = resources(template, "Custom::GluePartitions")["GluePartitions"]["Properties"]
+	assert properties["Partitions"] == [["Books"], ["Health_&_Personal_Care"]]
+	assert properties["PartitionLocations"] == { "Health_&_Personal_Care": "product_category=Health_%26_Personal_Care" }
+
+	# Projected values are substituted into the location template as they are: they must be the listed ones.
+	table = resources(template, "AWS::Glue::Table")["GlueTableAmazonReviews"]["Properties"]["TableInput"]["Parameters"]
+	assert table["projection.product_category.values"] == "Books,Health_%26_Personal_Care"
+	assert table["storage.location.template"].endswith("/parquet/product_category=${product_category}")
+
+def test_partition_loader_inline_code():
+	template = synth()
+	[loader] = [r for name, r in resources(template, "AWS::Lambda::Function").items() if name.startswith("GluePartitionLoader")]
+	assert loader["Properties"]["Code"]["ZipFile"] == inline_code("glue_partition_loader")
+	assert loader["Properties"]["Handler"] == "index.handler"
@@ -0,0 +1,40 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("aws_cdk.core")
+
+from conftest import ROOT_DIR
+
+def synth(tmp_path, **context):
+	"""Runs app.py as cdk synth does; returns the stack names and the report_timing lines."""
+	env = dict(os.environ, CDK_CONTEXT_JSON = json.dumps(dict(context, report_timing = "true")), CDK_OUTDIR = str(tmp_path),
+		JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION = "1")
+	result = subprocess.run([sys.executable, "app.py"], cwd = ROOT_DIR, env = env, check = True,
+		stdout = subprocess.PIPE, stderr = subprocess.PIPE, universal_newlines = True)
+	timing = dict(re.findall(r"^(.+): ([\d.]+)s$", result.stderr, re.MULTILINE))
+	stacks = sorted(name[:-len(".template.json")] for name in os.listdir(str(tmp_path)) if name.endswith(".template.json"))
+	return stacks, { name: float(seconds) for name, seconds in timing.items() }
+
+def test_default_synth_does_not_measure_shards(tmp_path):
+	stacks, timing = synth(tmp_path / "default")
+	assert stacks == ["amazon-reviews-dataset-stack", "data-scientist-users-stack", "sagemaker-studio-audit-control", "sagemaker-studio-stack"]
+	_, measured_timing = synth(tmp_path / "measured", measure_shards = "true")
+
+	shard_timing = timing["shards data-scientist-users-stack"] + timing["shards sagemaker-studio-stack"]
+	measured_shard_timing = measured_timing["shards data-scientist-users-stack"] + measured_timing["shards sagemaker-studio-stack"]
+	# Measuring takes four throwaway synths, planning the default manifest none.
+	assert shard_timing < 0.05 <= measured_shard_timing
+
+def test_selected_stacks(tmp_path):
+	stacks, timing = synth(tmp_path, stacks = "sagemaker-studio-stack")
+	assert stacks == ["sagemaker-studio-stack"]
+	assert "shards sagemaker-studio-stack" in timing
+	assert "import amazon_reviews_dataset_stack" not in timing
@@ -0,0 +1,54 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+
+import pytest
+
+import audit
+from sagemaker_studio_audit_control.audit.correlation import correlate
+
+from test_rollups import trail_directory
+
+def report(capsys, db, *args):
+	audit.main(["--db", db, "report"] + list(args))
+	lines = capsys.readouterr().out.splitlines()
+	return lines[0].split("\t"), [line.split("\t") for line in lines[1:]]
+
+def test_ingest_and_report(trail, trail_records, tmp_path, capsys):
+	db = str(tmp_path / "audit.db")
+	audit.main(["--db", db, "ingest", trail_directory(trail), "--processes", "1"])
+	assert "audit records ingested" in capsys.readouterr().err
+
+	records = list(correlate(trail_records))
+	columns, rows = report(capsys, db, "daily-access")
+	assert columns == ["day", "user_name", "principal", "database_name", "table_name", "accesses"]
+	assert sum(int(row[-1]) for row in rows) == len({ r.access_event_id for r in records })
+	assert { row[1] for row in rows } == { r.user_name for r in records }
+
+	columns, rows = report(capsys, db, "top-queries", "--limit", "3")
+	assert columns == ["executions", "principal", "last_seen", "sample"]
+	assert len(rows) == 3
+	assert [int(row[0]) for row in rows] == sorted((int(row[0]) for row in rows), reverse = True)
+
+	# Days outside the range have no rows, and ingesting the trail again adds nothing.
+	assert report(capsys, db, "daily-access", "--start", "2021-04-01")[1] == []
+	audit.main(["--db", db, "ingest", trail_directory(trail), "--processes", "1"])
+	assert capsys.readouterr().err.startswith("0 audit records ingested")
+	assert sum(int(row[-1]) for row in report(capsys, db, "daily-access")[1]) == len({ r.access_event_id for r in records })
+
+def test_compact_results(monkeypatch, capsys):
+	pytest.importorskip("pyarrow")
+	import boto3
+	from test_results import FakeS3, add_results
+
+	s3 = FakeS3()
+	today = datetime.datetime.utcnow().date()
+	for days in [30, 20, 1]:
+		add_results(s3, today - datetime.timedelta(days = days), 4)
+	monkeypatch.setattr(boto3, "client", lambda service: s3)
+
+	audit.main(["compact-results", "bucket", "--older-than-days", "7"])
+	assert capsys.readouterr().err.strip() == "8 query results (16 objects) of 2 days compacted"
+	audit.main(["compact-results", "bucket"])
+	assert capsys.readouterr().err.strip() == "0 query results (0 objects) of 0 days compacted"
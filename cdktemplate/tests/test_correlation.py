@@ -0,0 +1,73 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import copy
+
+from sagemaker_studio_audit_control.audit import cloudtrail
+from sagemaker_studio_audit_control.audit.correlation import Correlator, correlate, correlate_files
+
+def unique_events(records, is_event):
+	return { r["eventID"] for r in records if is_event(r) }
+
+def test_trail_has_duplicates(trail_records):
+	accesses = [r for r in trail_records if cloudtrail.is_get_data_access(r)]
+	assert len(accesses) > len(unique_events(trail_records, cloudtrail.is_get_data_access))
+
+def test_one_record_per_access(trail_records):
+	records = list(correlate(trail_records))
+	access_ids = unique_events(trail_records, cloudtrail.is_get_data_access)
+	assert len(records) == len(access_ids)
+	assert { r.access_event_id for r in records } == access_ids
+	assert all(r.query_time is not None for r in records)
+
+def test_correlate_files(trail, trail_records):
+	assert list(correlate_files(trail, processes = 1)) == list(correlate(trail_records))
+
+def test_duplicates_are_counted(trail_records):
+	correlator = Correlator()
+	records = []
+	for record in trail_records:
+		records.extend(correlator.add(record))
+	records.extend(correlator.flush())
+	audited = [r for r in trail_records if cloudtrail.is_get_data_access(r) or cloudtrail.is_start_query_execution(r)]
+	unique = unique_events(audited, lambda r: True)
+	assert correlator.duplicates == len(audited) - len(unique)
+
+def test_redelivery_of_a_joined_access(trail_records):
+	# An access delivered again after its query was joined is not joined twice.
+	query = next(r for r in trail_records if cloudtrail.is_start_query_execution(r))
+	query_id = cloudtrail.query_execution_id(query)
+	access = next(r for r in trail_records if cloudtrail.is_get_data_access(r) and cloudtrail.access_query_id(r) == query_id)
+	correlator = Correlator()
+	assert len(correlator.add(query)) == 0
+	assert len(correlator.add(access)) == 1
+	assert correlator.add(copy.deepcopy(access)) == []
+	assert correlator.duplicates == 1
+
+def test_seen_event_ids_are_bounded(trail_records):
+	correlator = Correlator(window = 600)
+	largest = 0
+	for record in trail_records:
+		correlator.add(record)
+		largest = max(largest, len(correlator.seen))
+	audited = unique_events(trail_records, lambda r: cloudtrail.is_get_data_access(r) or cloudtrail.is_start_query_execution(r))
+	assert largest < len(audited) / 4
+
+def test_emit_unmatched(trail_records):
+	accesses = [r for r in trail_records if cloudtrail.is_get_data_access(r)]
+	records = list(correlate(accesses, emit_unmatched = True))
+	assert len(records) == len(unique_events(accesses, lambda r: True))
+	assert all(r.query_time is None for r in records)
+
+def test_state_restores_seen_event_ids(trail_records):
+	accesses = [r for r in trail_records if cloudtrail.is_get_data_access(r)][:5]
+	correlator = Correlator()
+	for record in accesses:
+		correlator.add(record)
+	state = list(correlator.state())
+	assert state
+	restored = Correlator()
+	restored.restore(state, correlator.watermark)
+	for _, _, _, record in state:
+		assert restored.add(copy.deepcopy(record)) == []
+	assert restored.duplicates == len(state)
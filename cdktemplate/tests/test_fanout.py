@@ -0,0 +1,155 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import asyncio
+import hashlib
+import heapq
+import random
+import re
+import sqlite3
+import threading
+
+import pytest
+
+from sagemaker_studio_audit_control.amazon_reviews_schema import AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE
+from sagemaker_studio_audit_control.query.athena import QueryResult
+from sagemaker_studio_audit_control.query.fanout import SKETCH_SIZE, FanOutFailed, FanOutQuery, athena_runner, fan_out
+
+PARTITIONS = ["Apparel", "Baby", "Books", "Camera", "Electronics", "Grocery", "Home", "Kitchen", "Music", "Shoes", "Toys", "Video"]
+PARTITION_PATTERN = re.compile(r"product_category = '((?:[^']|'')*)'")
+
+class FakeClient(object):
+	"""AthenaClient returning one review per partition, counting the threads it runs in."""
+
+	def __init__(self):
+		self.threads = set()
+
+	def execute(self, query):
+		self.threads.add(threading.get_ident())
+		return QueryResult("q", ["a0"], [(1,)], False)
+
+def test_athena_runner_runs_in_a_worker_thread():
+	client = FakeClient()
+	query = FanOutQuery([("reviews", "count", "*")])
+	partials = asyncio.run(fan_out(query, athena_runner(client), partitions = ["Books", "Music", "Video"], retry_delay = 0))
+	assert partials.rows() == (["reviews"], [(3,)])
+	assert threading.get_ident() not in client.threads
+
+class LocalEngine(object):
+	"""
+	Stand-in for Athena: runs the shard queries on a SQLite sample of the reviews table, with the
+	Presto functions of the sketch hash. Queries of a partition fail as many times as failures
+	says, and the queries in flight at a time are tracked.
+	"""
+
+	def __init__(self, rows: list, latency: float = 0.001):
+		self.db = sqlite3.connect(":memory:")
+		self.db.execute("ATTACH ':memory:' AS %s" % AMAZON_REVIEWS_DATABASE)
+		self.db.execute("CREATE TABLE %s.%s (product_category TEXT, marketplace TEXT, customer_id TEXT, star_rating INTEGER, helpful_votes INTEGER)" %
+			(AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE))
+		self.db.executemany("INSERT INTO %s.%s VALUES (?, ?, ?, ?, ?)" % (AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE), rows)
+		self.db.create_function("to_utf8", 1, lambda value: value.encode())
+		self.db.create_function("xxhash64", 1, lambda data: hashlib.blake2b(data, digest_size = 8).digest())
+		self.db.create_function("from_big_endian_64", 1, lambda data: int.from_bytes(data, "big", signed = True))
+		self.latency = latency
+		self.failures = {}
+		self.queries = []
+		self.running = 0
+		self.peak = 0
+
+	async def run(self, query: str) -> list:
+		partition = PARTITION_PATTERN.search(query).group(1).replace("''", "'")
+		self.queries.append(partition)
+		self.running += 1
+		self.peak = max(self.peak, self.running)
+		try:
+			await asyncio.sleep(self.latency)
+			if self.failures.get(partition, 0) > 0:
+				self.failures[partition] -= 1
+				raise RuntimeError("Query of %s failed" % partition)
+			return self.db.execute(query).fetchall()
+		finally:
+			self.running -= 1
+
+	def exact(self, select: str, partitions: list, where: str = "1 = 1") -> list:
+		"""Rows of select over the whole sample of the partitions, grouped by marketplace."""
+		return self.db.execute("SELECT marketplace, %s FROM %s.%s WHERE product_category IN (%s) AND (%s) GROUP BY marketplace ORDER BY marketplace" % (
+			select, AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE, ", ".join("?" * len(partitions)), where), partitions).fetchall()
+
+def sketch_hash(value) -> int:
+	return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size = 8).digest(), "big", signed = True)
+
+def review_rows(count: int = 20000, customers: int = 8000, seed: int = 0) -> list:
+	rng = random.Random(seed)
+	return [(rng.choice(PARTITIONS), rng.choice(["DE", "UK", "US"]), "C%d" % rng.randrange(customers), rng.randint(1, 5),
+		rng.randrange(50) if rng.random() < 0.9 else None) for _ in range(count)]
+
+@pytest.fixture
+def engine():
+	return LocalEngine(review_rows())
+
+SCALAR_AGGREGATES = [("reviews", "count", "*"), ("votes", "sum", "helpful_votes"), ("lowest", "min", "star_rating"), ("most_votes", "max", "helpful_votes")]
+EXACT_SCALARS = "count(*), sum(helpful_votes), min(star_rating), max(helpful_votes)"
+
+def run(query, engine, **kwargs):
+	kwargs.setdefault("partitions", PARTITIONS)
+	return asyncio.run(fan_out(query, engine.run, retry_delay = 0, **kwargs))
+
+def test_partials_merge_per_group(engine):
+	query = FanOutQuery(SCALAR_AGGREGATES, group_by = ["marketplace"], where = "star_rating >= 2")
+	columns, rows = run(query, engine).rows()
+	assert columns == ["marketplace", "reviews", "votes", "lowest", "most_votes"]
+	assert rows == engine.exact(EXACT_SCALARS, PARTITIONS, "star_rating >= 2")
+	assert sorted(engine.queries) == sorted(PARTITIONS)
+
+def test_approx_distinct_merges_sketches(engine):
+	query = FanOutQuery([("customers", "approx_distinct", "customer_id"), ("ratings", "approx_distinct", "star_rating")], group_by = ["marketplace"])
+	partials = run(query, engine)
+	customers = {}
+	for _, marketplace, customer_id, _, _ in review_rows():
+		customers.setdefault(marketplace, set()).add(customer_id)
+	for marketplace, ids in customers.items():
+		# The merged sketch is the sketch of the whole group: the smallest hashes of its distinct values.
+		sketch, ratings = partials.groups[(marketplace,)]
+		assert sketch == heapq.nsmallest(SKETCH_SIZE, { sketch_hash(i) for i in ids })
+		assert len(ratings) == 5
+
+	exact = dict(engine.exact("count(DISTINCT customer_id)", PARTITIONS))
+	columns, rows = partials.rows()
+	assert columns == ["marketplace", "customers", "ratings"]
+	for marketplace, estimate, distinct_ratings in rows:
+		assert exact[marketplace] > SKETCH_SIZE
+		assert abs(estimate - exact[marketplace]) / exact[marketplace] < 3 / SKETCH_SIZE ** 0.5
+		# Fewer distinct values than the sketch size are counted exactly.
+		assert distinct_ratings == 5
+
+def test_failed_shard_is_retried(engine):
+	engine.failures = { "Books": 2 }
+	query = FanOutQuery(SCALAR_AGGREGATES, group_by = ["marketplace"])
+	assert run(query, engine, retries = 2).rows()[1] == engine.exact(EXACT_SCALARS, PARTITIONS)
+	assert engine.queries.count("Books") == 3
+	assert all(engine.queries.count(p) == 1 for p in PARTITIONS if p != "Books")
+
+def test_failed_shards_are_resumed_from_the_partials(engine):
+	engine.failures = { "Books": 10, "Music": 10 }
+	query = FanOutQuery(SCALAR_AGGREGATES + [("customers", "approx_distinct", "customer_id")], group_by = ["marketplace"])
+	with pytest.raises(FanOutFailed) as failure:
+		run(query, engine, retries = 1)
+	assert sorted(failure.value.failed) == ["Books", "Music"]
+	assert failure.value.partials.partitions == set(PARTITIONS) - { "Books", "Music" }
+	done = [p for p in PARTITIONS if p not in ["Books", "Music"]]
+	assert [row[:5] for row in failure.value.partials.rows()[1]] == engine.exact(EXACT_SCALARS, done)
+
+	engine.failures = {}
+	engine.queries = []
+	partials = run(query, engine, partials = failure.value.partials)
+	assert sorted(engine.queries) == ["Books", "Books", "Music", "Music"]
+	assert partials.rows() == run(query, LocalEngine(review_rows())).rows()
+	assert [row[:5] for row in partials.rows()[1]] == engine.exact(EXACT_SCALARS, PARTITIONS)
+
+@pytest.mark.parametrize("max_concurrency", [1, 3, 10])
+def test_max_concurrency(engine, max_concurrency):
+	query = FanOutQuery(SCALAR_AGGREGATES)
+	run(query, engine, max_concurrency = max_concurrency)
+	assert len(engine.queries) == len(PARTITIONS) > max_concurrency
+	assert engine.peak == max_concurrency
@@ -0,0 +1,125 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+
+import pytest
+
+import glue_partition_loader as loader
+
+class FakeGlue(object):
+	"""Partitions of one table, keyed by their values."""
+
+	def __init__(self, partitions = (), fail = ()):
+		self.partitions = { tuple(values): None for values in partitions }
+		self.fail = set(fail)
+		self.calls = []
+		self.lock = threading.Lock()
+
+	def error(self, values, code):
+		return { "PartitionValues": values, "ErrorDetail": { "ErrorCode": code, "ErrorMessage": code } }
+
+	def batch_create_partition(self, CatalogId, DatabaseName, TableName, PartitionInputList):
+		errors = []
+		with self.lock:
+			self.calls.append(("create", len(PartitionInputList)))
+			for partition in PartitionInputList:
+				values = tuple(partition["Values"])
+				if values in self.fail:
+					errors.append(self.error(partition["Values"], "InternalServiceException"))
+				elif values in self.partitions:
+					errors.append(self.error(partition["Values"], "AlreadyExistsException"))
+				else:
+					self.partitions[values] = partition["StorageDescriptor"]["Location"]
+		return { "Errors": errors }
+
+	def batch_delete_partition(self, CatalogId, DatabaseName, TableName, PartitionsToDelete):
+		errors = []
+		with self.lock:
+			self.calls.append(("delete", len(PartitionsToDelete)))
+			for partition in PartitionsToDelete:
+				values = tuple(partition["Values"])
+				if values not in self.partitions:
+					errors.append(self.error(partition["Values"], "EntityNotFoundException"))
+				else:
+					del self.partitions[values]
+		return { "Errors": errors }
+
+@pytest.fixture
+def glue(monkeypatch):
+	def install(*args, **kwargs):
+		fake = FakeGlue(*args, **kwargs)
+		monkeypatch.setattr(loader, "glue", fake)
+		return fake
+	return install
+
+def properties(partitions, table = "amazon_reviews_parquet"):
+	return {
+		"CatalogId": "123456789012",
+		"DatabaseName": "amazon_reviews_db",
+		"TableName": table,
+		"Location": "s3://amazon-reviews-pds/parquet/",
+		"PartitionKeys": ["product_category"],
+		"Partitions": partitions,
+		"InputFormat": "org.apache.hadoop.mapred.TextInputFormat",
+		"SerializationLibrary": "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe"
+	}
+
+def event(request_type, partitions, old_partitions = None, **kwargs):
+	event = { "RequestType": request_type, "ResourceProperties": properties(partitions, **kwargs) }
+	if old_partitions is not None:
+		event["OldResourceProperties"] = properties(old_partitions)
+	return event
+
+CATEGORIES = [["Category%03d" % i] for i in range(250)]
+
+def test_create_in_batches(glue, context, responses):
+	fake = glue()
+	loader.handler(event("Create", CATEGORIES), context)
+	assert len(fake.partitions) == 250
+	assert sorted(fake.calls) == [("create", 50), ("create", 100), ("create", 100)]
+	assert fake.partitions[("Category000",)] == "s3://amazon-reviews-pds/parquet/product_category=Category000"
+	assert responses[0]["Status"] == "SUCCESS"
+	assert responses[0]["Data"] == { "Added": 250, "Removed": 0 }
+	assert responses[0]["PhysicalResourceId"] == "123456789012:amazon_reviews_db.amazon_reviews_parquet"
+
+def test_create_adopts_existing_partitions(glue, context, responses):
+	# Partitions registered by the per-partition resources of an earlier release.
+	fake = glue(partitions = CATEGORIES[:43])
+	loader.handler(event("Create", CATEGORIES[:50]), context)
+	assert len(fake.partitions) == 50
+	assert responses[0]["Status"] == "SUCCESS"
+
+def test_update_adds_and_removes_the_difference(glue, context, responses):
+	fake = glue(partitions = CATEGORIES[:10])
+	loader.handler(event("Update", CATEGORIES[5:15], old_partitions = CATEGORIES[:10]), context)
+	assert sorted(fake.partitions) == [tuple(p) for p in CATEGORIES[5:15]]
+	assert responses[0]["Data"] == { "Added": 5, "Removed": 5 }
+
+def test_update_to_another_table_keeps_the_old_partitions(glue, context, responses):
+	fake = glue(partitions = CATEGORIES[:10])
+	loader.handler(event("Update", CATEGORIES[:10], old_partitions = CATEGORIES[:10], table = "other"), context)
+	assert responses[0]["Data"] == { "Added": 10, "Removed": 0 }
+	assert responses[0]["PhysicalResourceId"] == "123456789012:amazon_reviews_db.other"
+
+def test_delete(glue, context, responses):
+	fake = glue(partitions = CATEGORIES[:30])
+	loader.handler(event("Delete", CATEGORIES[:40]), context)
+	assert fake.partitions == {}
+	assert sorted(fake.calls) == [("delete", 15)] + [("delete", 25)]
+	assert responses[0]["Status"] == "SUCCESS"
+
+def test_partition_errors_fail_the_resource(glue, context, responses):
+	glue(fail = [("Category007",)])
+	loader.handler(event("Create", CATEGORIES[:10]), context)
+	assert responses[0]["Status"] == "FAILED"
+
+def test_partition_locations(glue, context, responses):
+	fake = glue()
+	e = event("Create", [["Books"], ["Health_&_Personal_Care"]])
+	e["ResourceProperties"]["PartitionLocations"] = { "Health_&_Personal_Care": "product_category=Health_%26_Personal_Care" }
+	loader.handler(e, context)
+	assert fake.partitions == {
+		("Books",): "s3://amazon-reviews-pds/parquet/product_category=Books",
+		("Health_&_Personal_Care",): "s3://amazon-reviews-pds/parquet/product_category=Health_%26_Personal_Care"
+	}
@@ -0,0 +1,103 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import shutil
+
+import pytest
+
+from sagemaker_studio_audit_control.audit import cloudtrail
+from sagemaker_studio_audit_control.audit.ingest import IngestManifest, LogObject, ingest, list_local_objects, s3_fetcher
+
+def trail_objects(trail):
+	"""Log objects of the simulated trail in delivery order."""
+	directory = trail[0][:trail[0].index(os.sep + "AWSLogs" + os.sep)]
+	objects = { o.path: o for o in list_local_objects(directory) }
+	return [objects[path] for path in trail]
+
+def run(manifest, objects):
+	return list(ingest(manifest, objects, processes = 1))
+
+def test_runs_in_delivery_order(trail, trail_records, tmp_path):
+	objects = trail_objects(trail)
+	access_ids = { r["eventID"] for r in trail_records if cloudtrail.is_get_data_access(r) }
+	manifest = IngestManifest(str(tmp_path / "audit.db"))
+	records = []
+	# Each run lists all the objects delivered so far.
+	for end in [len(objects) // 3, 2 * len(objects) // 3, len(objects)]:
+		records.extend(run(manifest, objects[:end]))
+	single = run(IngestManifest(str(tmp_path / "single.db")), objects)
+	assert { r.access_event_id for r in records } == { r.access_event_id for r in single }
+	# Accesses whose query comes at the very end are still waiting for it.
+	assert len(access_ids - { r.access_event_id for r in records }) <= manifest.db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+def test_ingested_objects_are_skipped(trail, tmp_path):
+	objects = trail_objects(trail)
+	manifest = IngestManifest(str(tmp_path / "audit.db"))
+	assert run(manifest, objects)
+	assert manifest.new_objects(objects) == []
+	assert run(manifest, objects) == []
+
+def test_manifest_persists(trail, tmp_path):
+	objects = trail_objects(trail)
+	path = str(tmp_path / "audit.db")
+	manifest = IngestManifest(path)
+	run(manifest, objects)
+	manifest.close()
+	assert IngestManifest(path).new_objects(objects) == []
+
+def test_interrupted_run_is_repeated(trail, tmp_path):
+	objects = trail_objects(trail)
+	manifest = IngestManifest(str(tmp_path / "audit.db"))
+	records = ingest(manifest, objects, processes = 1)
+	next(records)
+	records.close()
+	assert manifest.new_objects(objects) == objects
+	assert len(run(manifest, objects)) == len(run(IngestManifest(str(tmp_path / "single.db")), objects))
+
+def test_changed_object_is_ingested_again(trail, tmp_path):
+	objects = trail_objects(trail)
+	manifest = IngestManifest(str(tmp_path / "audit.db"))
+	run(manifest, objects)
+	changed = objects[0]._replace(etag = "changed")
+	assert manifest.new_objects(objects[1:] + [changed]) == [changed]
+
+class FakeS3(object):
+	"""Downloads of the objects of the simulated trail."""
+
+	def __init__(self, objects):
+		self.paths = { o.key: o.path for o in objects }
+		self.downloads = []
+
+	def download_file(self, bucket, key, path):
+		self.downloads.append(key)
+		shutil.copyfile(self.paths[key], path)
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_fetched_objects_are_deleted_once_read(trail, tmp_path, processes):
+	objects = trail_objects(trail)
+	s3 = FakeS3(objects)
+	download_dir = tmp_path / "downloads"
+	fetch = s3_fetcher("trail-bucket", str(download_dir), s3 = s3)
+	kept = []
+
+	def fetch_and_count(o: LogObject) -> str:
+		# At most two files per process are downloaded and not read yet.
+		kept.append(sum(len(names) for _, _, names in os.walk(str(download_dir))))
+		return fetch(o)
+
+	manifest = IngestManifest(str(tmp_path / "audit.db"))
+	records = list(ingest(manifest, [o._replace(path = None) for o in objects], fetch = fetch_and_count, processes = processes))
+	assert s3.downloads == [o.key for o in objects]
+	assert len(records) == len(run(IngestManifest(str(tmp_path / "single.db")), objects))
+	assert max(kept) <= 2 * processes
+	assert [names for _, _, names in os.walk(str(download_dir)) if names] == []
+	# Objects with a local path are not deleted.
+	assert all(os.path.exists(path) for path in trail)
+
+def test_before_save_runs_in_the_run(trail, tmp_path):
+	objects = trail_objects(trail)
+	manifest = IngestManifest(str(tmp_path / "audit.db"))
+	calls = []
+	list(ingest(manifest, objects, processes = 1, before_save = lambda: calls.append(len(manifest.new_objects(objects)))))
+	assert calls == [len(objects)]
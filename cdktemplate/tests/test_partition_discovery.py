@@ -0,0 +1,84 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from sagemaker_studio_audit_control.partition_discovery import (
+	cached_discover_partitions, discover_partitions, partition_locations, partition_values, projection_values
+)
+
+class FakeS3(object):
+	"""Bucket listing of the given keys, with one page per 2 prefixes."""
+
+	def __init__(self, keys, etags = None):
+		self.keys = keys
+		self.etags = etags or {}
+		self.listings = 0
+
+	def get_paginator(self, operation):
+		return self
+
+	def paginate(self, Bucket, Prefix, Delimiter):
+		self.listings += 1
+		prefixes = sorted({Prefix + key[len(Prefix):].split(Delimiter, 1)[0] + Delimiter
+			for key in self.keys if key.startswith(Prefix) and Delimiter in key[len(Prefix):]})
+		for i in range(0, len(prefixes), 2):
+			yield { "CommonPrefixes": [{ "Prefix": p } for p in prefixes[i:i + 2]] }
+
+	def head_object(self, Bucket, Key):
+		return { "ETag": self.etags[Key] }
+
+KEYS = [
+	"parquet/product_category=Books/part-0.parquet",
+	"parquet/product_category=Books/part-1.parquet",
+	"parquet/product_category=Health_%26_Personal_Care/part-0.parquet",
+	"parquet/product_category=Toys/part-0.parquet",
+	"parquet/_SUCCESS",
+	"parquet/tmp/part-0.parquet",
+	"tsv/amazon_reviews_us_Books.tsv.gz"
+]
+
+def test_discover_partitions():
+	partitions = discover_partitions("bucket", "parquet/", ["product_category"], s3 = FakeS3(KEYS))
+	assert partition_values(partitions) == [["Books"], ["Health_&_Personal_Care"], ["Toys"]]
+	# The location keeps the listed path of values that had to be unquoted.
+	assert partition_locations(partitions, ["product_category"]) == {
+		"Health_&_Personal_Care": "product_category=Health_%26_Personal_Care"
+	}
+
+def test_projection_values_are_listed_paths():
+	partitions = discover_partitions("bucket", "parquet/", ["product_category"], s3 = FakeS3(KEYS))
+	values = projection_values(partition_values(partitions), partition_locations(partitions, ["product_category"]), ["product_category"])
+	assert values == [["Books", "Health_%26_Personal_Care", "Toys"]]
+
+	keys = ["data/year=2020/month=01/a", "data/year=2021/month=02/a"]
+	partitions = discover_partitions("bucket", "data/", ["year", "month"], s3 = FakeS3(keys))
+	assert projection_values(partition_values(partitions), {}, ["year", "month"]) == [["2020", "2021"], ["01", "02"]]
+
+def test_discover_nested_partitions():
+	keys = ["data/year=2020/month=01/a", "data/year=2020/month=02/a", "data/year=2021/month=01/a", "data/year=2021/other/a"]
+	partitions = discover_partitions("bucket", "data/", ["year", "month"], s3 = FakeS3(keys))
+	assert partition_values(partitions) == [["2020", "01"], ["2020", "02"], ["2021", "01"]]
+	assert partition_locations(partitions, ["year", "month"]) == {}
+
+def test_cache(tmp_path):
+	cache_path = str(tmp_path / "cache.json")
+	s3 = FakeS3(KEYS)
+	first = cached_discover_partitions("bucket", "parquet/", ["product_category"], s3 = s3, cache_path = cache_path)
+	listings = s3.listings
+	assert cached_discover_partitions("bucket", "parquet/", ["product_category"], s3 = s3, cache_path = cache_path) == first
+	assert s3.listings == listings
+
+	cached_discover_partitions("bucket", "parquet/", ["product_category"], s3 = s3, cache_path = cache_path, ttl = 0)
+	assert s3.listings == 2 * listings
+
+def test_cache_invalidated_by_etag(tmp_path):
+	cache_path = str(tmp_path / "cache.json")
+	s3 = FakeS3(KEYS, etags = { "parquet/_SUCCESS": '"1"' })
+	cached_discover_partitions("bucket", "parquet/", ["product_category"], s3 = s3, cache_path = cache_path, etag_key = "parquet/_SUCCESS")
+	cached_discover_partitions("bucket", "parquet/", ["product_category"], s3 = s3, cache_path = cache_path, etag_key = "parquet/_SUCCESS")
+	assert s3.listings == 1
+
+	s3.keys = KEYS + ["parquet/product_category=Video/part-0.parquet"]
+	s3.etags["parquet/_SUCCESS"] = '"2"'
+	partitions = cached_discover_partitions("bucket", "parquet/", ["product_category"], s3 = s3, cache_path = cache_path, etag_key = "parquet/_SUCCESS")
+	assert s3.listings == 2
+	assert ["Video"] in partition_values(partitions)
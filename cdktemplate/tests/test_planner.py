@@ -0,0 +1,92 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+
+import pytest
+
+pytest.importorskip("aws_cdk.core")
+
+from sagemaker_studio_audit_control.amazon_reviews_schema import amazon_reviews_column_names
+from sagemaker_studio_audit_control.audit.grants import GrantIndex
+from sagemaker_studio_audit_control.config import ROLE_NAME_PREFIX
+from sagemaker_studio_audit_control.data_scientist_users_stack import DataScientistUsersStack
+from sagemaker_studio_audit_control.query.planner import PermissionDenied, QueryPlanner
+from sagemaker_studio_audit_control.sharding import synth_template
+from sagemaker_studio_audit_control.user_manifest import load_user_manifest
+
+TABLE = "amazon_reviews_db.amazon_reviews_parquet"
+
+def role_arn(user_name):
+	return "arn:aws:sts::123456789012:assumed-role/%s%s/SageMaker" % (ROLE_NAME_PREFIX, user_name)
+
+FULL = role_arn("data-scientist-full")
+LIMITED = role_arn("data-scientist-limited")
+
+@pytest.fixture(scope = "module")
+def grants_template(tmp_path_factory):
+	"""Template of DataScientistUsersStack for the users of the manifest."""
+	path = tmp_path_factory.mktemp("templates") / "data-scientist-users-stack.template.json"
+	path.write_text(json.dumps(synth_template(lambda app: DataScientistUsersStack(app, "data-scientist-users-stack"))))
+	return str(path)
+
+@pytest.fixture
+def planner(grants_template):
+	loads = []
+	index = GrantIndex.from_templates([grants_template])
+
+	def load_grants(principal_arn):
+		loads.append(principal_arn)
+		return index
+
+	planner = QueryPlanner(load_grants)
+	planner.loads = loads
+	return planner
+
+def limited_columns():
+	return next(u for u in load_user_manifest() if u.name == "data-scientist-limited").columns
+
+def selected_columns(query):
+	return [c.strip() for c in query[len("SELECT "):query.index(" FROM")].split(",")]
+
+def test_full_persona_star_is_every_column(planner):
+	assert selected_columns(planner.plan(FULL, "SELECT * FROM %s" % TABLE)) == amazon_reviews_column_names()
+
+def test_limited_persona_star_is_the_granted_columns(planner):
+	columns = selected_columns(planner.plan(LIMITED, "SELECT * FROM %s" % TABLE))
+	assert len(columns) == 8
+	assert columns == [c for c in amazon_reviews_column_names() if c in limited_columns()]
+
+def test_limited_persona_qualified_star(planner):
+	query = planner.plan(LIMITED, "SELECT r.* FROM %s r WHERE r.star_rating > 4" % TABLE)
+	assert selected_columns(query) == ["r.%s" % c for c in amazon_reviews_column_names() if c in limited_columns()]
+
+def test_limited_persona_star_in_a_subquery(planner):
+	query = planner.plan(LIMITED, "SELECT * FROM (SELECT * FROM %s) s" % TABLE)
+	assert query.startswith("SELECT * FROM (SELECT product_id, ")
+
+def test_limited_persona_ungranted_column_is_rejected(planner):
+	with pytest.raises(PermissionDenied) as e:
+		planner.plan(LIMITED, "SELECT customer_id, star_rating FROM %s" % TABLE)
+	assert e.value.columns == [("amazon_reviews_db", "amazon_reviews_parquet", "customer_id")]
+	planner.plan(FULL, "SELECT customer_id, star_rating FROM %s" % TABLE)
+
+def test_ungranted_principal_is_rejected(planner):
+	with pytest.raises(PermissionDenied) as e:
+		planner.plan(role_arn("someone-else"), "SELECT * FROM %s" % TABLE)
+	assert e.value.columns == [("amazon_reviews_db", "amazon_reviews_parquet", None)]
+
+def test_unqualified_table_uses_the_database(planner):
+	query = planner.plan(LIMITED, "SELECT * FROM amazon_reviews_parquet", database = "amazon_reviews_db")
+	assert len(selected_columns(query)) == 8
+
+def test_grants_are_loaded_once_per_principal(planner):
+	for _ in range(3):
+		planner.plan(LIMITED, "SELECT * FROM %s" % TABLE)
+		planner.plan(FULL, "SELECT * FROM %s" % TABLE)
+	assert planner.loads == [LIMITED, FULL]
+
+def test_manifest_grants_match_the_template(planner):
+	from_users = QueryPlanner.from_users()
+	for principal in [FULL, LIMITED]:
+		assert from_users.plan(principal, "SELECT * FROM %s" % TABLE) == planner.plan(principal, "SELECT * FROM %s" % TABLE)
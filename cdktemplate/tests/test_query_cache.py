@@ -0,0 +1,112 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from sagemaker_studio_audit_control.query.athena import AthenaClient, is_cacheable
+from sagemaker_studio_audit_control.query.cache import ResultCache
+
+ROLE_ARN = "arn:aws:sts::123456789012:assumed-role/SageMakerStudioUser-alice/SageMaker"
+
+class FakeClock(object):
+
+	def __init__(self):
+		self.now = 1000.0
+
+	def __call__(self):
+		return self.now
+
+class FakePaginator(object):
+
+	def paginate(self, QueryExecutionId):
+		yield { "ResultSet": {
+			"ResultSetMetadata": { "ColumnInfo": [{ "Name": "vine", "Type": "varchar" }, { "Name": "n", "Type": "bigint" }] },
+			"Rows": [{ "Data": [{ "VarCharValue": "vine" }, { "VarCharValue": "n" }] }, { "Data": [{ "VarCharValue": "Y" }, { "VarCharValue": "3" }] }]
+		} }
+
+class FakeAthena(object):
+
+	def __init__(self):
+		self.queries = []
+
+	def start_query_execution(self, **request):
+		self.queries.append(request["QueryString"])
+		return { "QueryExecutionId": "q%d" % len(self.queries) }
+
+	def get_query_execution(self, QueryExecutionId):
+		return { "QueryExecution": { "QueryExecutionId": QueryExecutionId, "StatementType": "DML", "Status": { "State": "SUCCEEDED" } } }
+
+	def get_paginator(self, name):
+		return FakePaginator()
+
+class FakeSts(object):
+
+	def get_caller_identity(self):
+		return { "Arn": ROLE_ARN }
+
+def cache(clock = None, **kwargs):
+	return ResultCache(":memory:", clock = clock or FakeClock(), **kwargs)
+
+def test_results_are_kept_per_role():
+	results = cache()
+	results.put("alice", "db", "select 1", "q1", ["c"], [[1]])
+	assert results.get("alice", "db", "select 1") == ("q1", ["c"], [[1]])
+	assert results.get("bob", "db", "select 1") is None
+	assert results.get("alice", "other", "select 1") is None
+
+def test_results_expire_after_the_ttl():
+	clock = FakeClock()
+	results = cache(clock, ttl = 60)
+	results.put("alice", "db", "select 1", "q1", ["c"], [[1]])
+	clock.now += 59
+	assert results.get("alice", "db", "select 1") is not None
+	clock.now += 1
+	assert results.get("alice", "db", "select 1") is None
+	assert results.db.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
+
+def test_least_recently_used_results_are_evicted():
+	clock = FakeClock()
+	size = len('{"columns":["c"],"rows":[[1]]}')
+	results = cache(clock, max_bytes = 2 * size)
+	for i, query in enumerate(["select 1", "select 2"]):
+		clock.now += 1
+		results.put("alice", "db", query, "q%d" % i, ["c"], [[1]])
+	clock.now += 1
+	assert results.get("alice", "db", "select 1") is not None
+	clock.now += 1
+	results.put("alice", "db", "select 3", "q3", ["c"], [[1]])
+	assert results.get("alice", "db", "select 2") is None
+	assert results.get("alice", "db", "select 1") is not None
+	assert results.get("alice", "db", "select 3") is not None
+
+def test_results_larger_than_the_cache_are_not_stored():
+	results = cache(max_bytes = 10)
+	results.put("alice", "db", "select 1", "q1", ["c"], [[1]])
+	assert results.get("alice", "db", "select 1") is None
+
+def test_clear_a_role():
+	results = cache()
+	results.put("alice", "db", "select 1", "q1", ["c"], [[1]])
+	results.put("bob", "db", "select 1", "q2", ["c"], [[1]])
+	results.clear("alice")
+	assert results.get("alice", "db", "select 1") is None
+	assert results.get("bob", "db", "select 1") is not None
+
+def test_is_cacheable():
+	assert is_cacheable("SELECT vine FROM t")
+	assert is_cacheable("WITH t AS (SELECT 1) SELECT * FROM t")
+	assert not is_cacheable("SELECT now()")
+	assert not is_cacheable("CREATE TABLE t AS SELECT 1")
+
+def test_client_reuses_cached_results():
+	clock = FakeClock()
+	athena = FakeAthena()
+	client = AthenaClient(athena = athena, sts = FakeSts(), database = "db", cache = cache(clock, ttl = 60))
+	first = client.execute("SELECT vine, count(*) AS n FROM t")
+	assert not first.cached
+	assert first.rows == [("Y", 3)]
+	again = client.execute("select VINE, count(*) as n\nfrom t -- same query")
+	assert again.cached
+	assert again.rows == first.rows and again.query_execution_id == first.query_execution_id
+	assert not client.execute("SELECT vine, count(*) AS n FROM t", use_cache = False).cached
+	clock.now += 60
+	assert not client.execute("SELECT vine, count(*) AS n FROM t").cached
+	assert len(athena.queries) == 3
@@ -0,0 +1,66 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import gzip
+import io
+import json
+
+import pytest
+
+from sagemaker_studio_audit_control.audit import cloudtrail
+from sagemaker_studio_audit_control.audit.cloudtrail import iter_records
+from sagemaker_studio_audit_control.audit.reader import AUDIT_EVENTS, filter_records, read_files
+
+def records(document, chunk_size = cloudtrail.CHUNK_SIZE):
+	return list(iter_records(io.StringIO(document), chunk_size = chunk_size))
+
+def file_records(path):
+	with gzip.open(path, "rt") as fp:
+		return json.load(fp)["Records"]
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 4096])
+def test_records_across_chunk_boundaries(trail, chunk_size):
+	with gzip.open(trail[0], "rt") as fp:
+		document = fp.read()
+	assert records(document, chunk_size) == json.loads(document)["Records"]
+
+def test_number_across_chunk_boundary():
+	document = '{"Records": [{"a": 1234567}, 89012]}'
+	for chunk_size in range(1, len(document) + 1):
+		assert records(document, chunk_size) == [{ "a": 1234567 }, 89012]
+
+@pytest.mark.parametrize("document", ['{"Records": []}', '{ "Records" : [ ] }', '{}', '', '{"Other": 1}'])
+def test_no_records(document):
+	assert records(document, 3) == []
+
+def test_only_top_level_records():
+	document = json.dumps({
+		"digest": { "Records": [{ "nested": True }] },
+		"Note": '"Records": [',
+		"Records": [{ "eventName": "GetDataAccess", "requestParameters": { "Records": [1, 2] } }]
+	})
+	for chunk_size in [1, 5, 4096]:
+		assert records(document, chunk_size) == [{ "eventName": "GetDataAccess", "requestParameters": { "Records": [1, 2] } }]
+
+def test_truncated_document():
+	with pytest.raises(json.JSONDecodeError):
+		records('{"Records": [{"eventName": "GetDataAccess"}, {"eventName": ', 4)
+
+def test_filter_records():
+	events = [
+		{ "eventSource": cloudtrail.LAKE_FORMATION_SOURCE, "eventName": cloudtrail.GET_DATA_ACCESS },
+		{ "eventSource": cloudtrail.LAKE_FORMATION_SOURCE, "eventName": "GetDataLakeSettings" },
+		{ "eventSource": cloudtrail.ATHENA_SOURCE, "eventName": cloudtrail.START_QUERY_EXECUTION },
+		{ "eventSource": "s3.amazonaws.com", "eventName": cloudtrail.GET_DATA_ACCESS },
+		{ "eventName": cloudtrail.GET_DATA_ACCESS }
+	]
+	assert list(filter_records(events)) == [events[0], events[2]]
+	assert list(filter_records(events, { cloudtrail.ATHENA_SOURCE: { cloudtrail.START_QUERY_EXECUTION } })) == [events[2]]
+
+def test_read_files_in_file_order(trail, trail_records):
+	expected = [r for path in trail for r in file_records(path)
+		if r["eventName"] in AUDIT_EVENTS.get(r["eventSource"], ())]
+	assert trail_records == expected
+	assert list(read_files(trail, processes = 3)) == expected
+	# More processes than files.
+	assert list(read_files(trail[:2], processes = 4)) == list(read_files(trail[:2], processes = 1))
@@ -0,0 +1,181 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+import hashlib
+import io
+import uuid
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from botocore.exceptions import ClientError
+
+from sagemaker_studio_audit_control.query.results import ARCHIVE_PREFIX, INDEX_PREFIX, RESULTS_PREFIX, ResultCompactor
+
+TODAY = datetime.date(2021, 3, 31)
+
+class FakeS3(object):
+	"""S3 client with the listing, reads, conditional writes and deletes the compactor makes."""
+
+	class exceptions(object):
+		ClientError = ClientError
+
+		class NoSuchKey(ClientError):
+			pass
+
+	def __init__(self):
+		self.objects = {}
+		self.reads = []
+		self.before_put = None
+
+	def store(self, key, body):
+		self.objects[key] = (body, '"%s"' % hashlib.md5(body).hexdigest())
+
+	def get_paginator(self, operation):
+		return self
+
+	def paginate(self, Bucket, Prefix, Delimiter = None):
+		contents = []
+		prefixes = set()
+		for key in sorted(self.objects):
+			if not key.startswith(Prefix):
+				continue
+			rest = key[len(Prefix):]
+			if Delimiter and Delimiter in rest:
+				prefixes.add(Prefix + rest[:rest.index(Delimiter) + 1])
+			else:
+				contents.append({ "Key": key, "Size": len(self.objects[key][0]), "LastModified": datetime.datetime(2021, 3, 1, tzinfo = datetime.timezone.utc) })
+		yield { "Contents": contents, "CommonPrefixes": [{ "Prefix": p } for p in sorted(prefixes)] }
+
+	def get_object(self, Bucket, Key):
+		if Key not in self.objects:
+			raise self.exceptions.NoSuchKey({ "Error": { "Code": "NoSuchKey" } }, "GetObject")
+		self.reads.append(Key)
+		body, etag = self.objects[Key]
+		return { "Body": io.BytesIO(body), "ETag": etag }
+
+	def put_object(self, Bucket, Key, Body, IfMatch = None, IfNoneMatch = None):
+		if self.before_put is not None:
+			self.before_put(Key)
+		if (IfNoneMatch == "*" and Key in self.objects) or (IfMatch is not None and self.objects.get(Key, (None, None))[1] != IfMatch):
+			raise ClientError({ "Error": { "Code": "PreconditionFailed" } }, "PutObject")
+		self.store(Key, Body)
+
+	def upload_file(self, path, bucket, key):
+		with open(path, "rb") as fp:
+			self.store(key, fp.read())
+
+	def delete_objects(self, Bucket, Delete):
+		for o in Delete["Objects"]:
+			self.objects.pop(o["Key"], None)
+
+def add_results(s3, day, count, size = 100):
+	"""Result and metadata files of count queries run on day; returns their IDs."""
+	query_ids = [str(uuid.UUID(int = day.toordinal() * 1000 + i)) for i in range(count)]
+	for query_id in query_ids:
+		prefix = "%s%s/%s" % (RESULTS_PREFIX, day.strftime("%Y/%m/%d"), query_id)
+		s3.store(prefix + ".csv", query_id.encode() * (size // len(query_id) + 1))
+		s3.store(prefix + ".csv.metadata", b"metadata")
+	return query_ids
+
+def index_keys(s3):
+	return [key for key in s3.objects if key.startswith(INDEX_PREFIX)]
+
+def test_compact_and_lookup():
+	s3 = FakeS3()
+	days = [datetime.date(2021, 3, d) for d in [1, 2, 30]]
+	query_ids = { day: add_results(s3, day, 20) for day in days }
+	stats = ResultCompactor("bucket", s3 = s3).compact(today = TODAY)
+	assert stats == { "Days": 2, "Queries": 40, "Objects": 80 }
+	assert not [key for key in s3.objects if key.startswith(RESULTS_PREFIX + "2021/03/0")]
+	assert len([key for key in s3.objects if key.startswith(RESULTS_PREFIX)]) == 40
+
+	compactor = ResultCompactor("bucket", s3 = s3)
+	for day in days[:2]:
+		for query_id in query_ids[day][:3]:
+			files = compactor.lookup(query_id)
+			assert sorted(files) == [query_id + ".csv", query_id + ".csv.metadata"]
+			assert files[query_id + ".csv"].startswith(query_id.encode())
+			assert compactor.lookup(query_id, day) == files
+	assert compactor.lookup(query_ids[days[2]][0]) is None
+
+def test_index_is_partitioned_by_day_and_prefix():
+	s3 = FakeS3()
+	for day in [datetime.date(2021, 3, d) for d in range(1, 11)]:
+		add_results(s3, day, 5)
+	ResultCompactor("bucket", s3 = s3).compact(today = TODAY)
+	for key in index_keys(s3):
+		prefix, name = key[len(INDEX_PREFIX):].split("/")
+		assert len(prefix) == 2 and name.startswith("2021-03-")
+	# An index object only holds the queries of its day.
+	assert max(len(s3.objects[key][0]) for key in index_keys(s3)) < 1000
+
+def test_lookup_with_the_day_reads_one_index_object():
+	s3 = FakeS3()
+	day = datetime.date(2021, 3, 1)
+	query_id = add_results(s3, day, 3)[0]
+	for other in range(2, 10):
+		add_results(s3, datetime.date(2021, 3, other), 3)
+	compactor = ResultCompactor("bucket", s3 = s3)
+	compactor.compact(today = TODAY)
+	s3.reads = []
+	compactor.lookup(query_id, day)
+	assert len(s3.reads) == 2
+
+def test_archive_is_written_in_row_groups():
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+
+	s3 = FakeS3()
+	query_ids = add_results(s3, datetime.date(2021, 3, 1), 50, size = 1000)
+	ResultCompactor("bucket", s3 = s3, row_group_bytes = 10000).compact(today = TODAY)
+	archive = next(body for key, (body, _) in s3.objects.items() if key.startswith(ARCHIVE_PREFIX + "2021/03/01/"))
+	parquet = pq.ParquetFile(pa.BufferReader(archive))
+	assert parquet.num_row_groups >= 5
+	assert parquet.read().column("query_execution_id").to_pylist() == sorted(q for q in query_ids for _ in range(2))
+
+def test_concurrent_index_update_is_merged():
+	s3 = FakeS3()
+	compactor = ResultCompactor("bucket", s3 = s3)
+	day = datetime.date(2021, 3, 1)
+	compactor.update_index(day, { "aa000001": "archive/a.parquet" })
+	key = compactor.index_key(day, "aa000002")
+
+	def concurrent_update(put_key):
+		# Another run updates the index object between the read and the write, once.
+		s3.before_put = None
+		compactor.update_index(day, { "aa000003": "archive/c.parquet" })
+
+	s3.before_put = concurrent_update
+	compactor.update_index(day, { "aa000002": "archive/b.parquet" })
+	assert compactor.read_index(key)[0] == {
+		"aa000001": "archive/a.parquet", "aa000002": "archive/b.parquet", "aa000003": "archive/c.parquet" }
+
+def test_index_is_created_only_if_missing():
+	s3 = FakeS3()
+	compactor = ResultCompactor("bucket", s3 = s3)
+	day = datetime.date(2021, 3, 1)
+	key = compactor.index_key(day, "aa000001")
+	# Another run creates the index object after it was found missing.
+	s3.before_put = lambda put_key: (setattr(s3, "before_put", None), s3.store(key, b'{"aa000009": "archive/z.parquet"}'))
+	compactor.update_index(day, { "aa000001": "archive/a.parquet" })
+	assert compactor.read_index(key)[0] == { "aa000001": "archive/a.parquet", "aa000009": "archive/z.parquet" }
+
+def test_interrupted_run_is_completed():
+	s3 = FakeS3()
+	day = datetime.date(2021, 3, 1)
+	query_ids = add_results(s3, day, 10)
+	delete_objects = s3.delete_objects
+
+	def fail(**kwargs):
+		raise ClientError({ "Error": { "Code": "InternalError" } }, "DeleteObjects")
+
+	s3.delete_objects = fail
+	with pytest.raises(ClientError):
+		ResultCompactor("bucket", s3 = s3).compact(today = TODAY)
+	s3.delete_objects = delete_objects
+	assert ResultCompactor("bucket", s3 = s3).compact(today = TODAY)["Queries"] == 10
+	assert not [key for key in s3.objects if key.startswith(RESULTS_PREFIX)]
+	assert ResultCompactor("bucket", s3 = s3).lookup(query_ids[0]) is not None
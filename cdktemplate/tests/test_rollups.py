@@ -0,0 +1,85 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import shutil
+
+from sagemaker_studio_audit_control.audit import cloudtrail
+from sagemaker_studio_audit_control.audit.correlation import correlate
+from sagemaker_studio_audit_control.audit.ingest import IngestManifest, ingest, list_local_objects
+from sagemaker_studio_audit_control.audit.reader import read_files
+from sagemaker_studio_audit_control.audit.rollups import AuditRollups
+from sagemaker_studio_audit_control.audit.sessions import sessionize
+from sagemaker_studio_audit_control.audit.sql import ColumnExtractor
+
+def trail_directory(trail):
+	return trail[0][:trail[0].index(os.sep + "AWSLogs" + os.sep)]
+
+def ingest_into(manifest, rollups, directory):
+	for record in ingest(manifest, list_local_objects(directory), processes = 1, before_save = rollups.flush,
+			column_resolver = ColumnExtractor().columns):
+		rollups.add(record)
+
+def totals(rollups):
+	db = rollups.db
+	return {
+		"Accesses": db.execute("SELECT SUM(accesses) FROM table_access").fetchone()[0],
+		"Columns": db.execute("SELECT SUM(accesses) FROM column_access").fetchone()[0],
+		"Executions": db.execute("SELECT SUM(executions) FROM query_shape").fetchone()[0]
+	}
+
+def test_duplicates_are_counted_once(trail, trail_records, tmp_path):
+	# The trail has duplicated deliveries, and is ingested twice: once more under another
+	# prefix, as if it was delivered again, and once more after its objects changed.
+	copy = str(tmp_path / "copy")
+	shutil.copytree(trail_directory(trail), copy)
+	manifest = IngestManifest(str(tmp_path / "audit.db"))
+	rollups = AuditRollups(manifest.db)
+	ingest_into(manifest, rollups, trail_directory(trail))
+	once = totals(rollups)
+	ingest_into(manifest, rollups, copy)
+	manifest.db.execute("UPDATE objects SET etag = 'changed'")
+	ingest_into(manifest, rollups, copy)
+
+	access_ids = { r.access_event_id for r in correlate(trail_records) }
+	assert len(access_ids) < len([r for r in trail_records if cloudtrail.is_get_data_access(r)])
+	assert totals(rollups) == once
+	assert once["Accesses"] == once["Executions"] == len(access_ids)
+	assert manifest.db.execute("SELECT COUNT(*) FROM audited_access").fetchone()[0] == len(access_ids)
+
+def test_add_returns_whether_the_access_is_new(trail_records, tmp_path):
+	record = next(correlate(trail_records))
+	manifest = IngestManifest(str(tmp_path / "audit.db"))
+	rollups = AuditRollups(manifest.db)
+	assert rollups.add(record)
+	assert not rollups.add(record)
+	rollups.flush()
+	assert totals(rollups)["Accesses"] == 1
+
+def test_sessions_count_duplicates_once(trail, trail_records):
+	sessions = sessionize(trail_records)
+	# Every log file is delivered twice in a row, i.e. within the window.
+	again = sessionize(read_files([p for path in trail for p in (path, path)], processes = 1))
+	assert [(s.session_id, len(s.logins), len(s.apps), len(s.accesses)) for s in again] == \
+		[(s.session_id, len(s.logins), len(s.apps), len(s.accesses)) for s in sessions]
+	logins = [e["eventID"] for s in sessions for e in s.logins]
+	assert len(logins) == len(set(logins))
+
+def test_prune_keeps_the_retention(trail_records, tmp_path):
+	record = next(correlate(trail_records))
+	manifest = IngestManifest(str(tmp_path / "audit.db"))
+	rollups = AuditRollups(manifest.db)
+	days = ["2021-03-%02d" % day for day in range(1, 11)]
+	for day in days:
+		assert rollups.add(record._replace(access_event_id = day, access_time = day + record.access_time[10:]))
+	assert rollups.prune(retention_days = 3) == 6
+	assert [row[0] for row in manifest.db.execute("SELECT day FROM audited_access ORDER BY day")] == days[6:]
+	assert rollups.prune(retention_days = 3) == 0
+
+	# Accesses before the horizon are not counted again, and the horizon is kept with the rollups.
+	manifest.db.commit()
+	rollups = AuditRollups(IngestManifest(str(tmp_path / "audit.db")).db)
+	assert rollups.horizon == "2021-03-07"
+	assert not rollups.add(record._replace(access_event_id = days[0], access_time = days[0] + record.access_time[10:]))
+	assert not rollups.add(record._replace(access_event_id = days[-1], access_time = days[-1] + record.access_time[10:]))
+	assert rollups.add(record._replace(access_event_id = "new", access_time = days[-1] + record.access_time[10:]))
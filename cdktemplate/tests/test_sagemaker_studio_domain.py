@@ -0,0 +1,164 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import copy
+import functools
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+import sagemaker_studio_domain as domain
+
+class FakeSageMaker(object):
+	def __init__(self, statuses):
+		self.statuses = list(statuses)
+
+	def create_domain(self, **kwargs):
+		return { "DomainArn": "arn:aws:sagemaker:us-east-1:123456789012:domain/d-example" }
+
+	def describe_domain(self, DomainId):
+		status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+		return { "DomainId": DomainId, "Status": status }
+
+class FakeEvents(object):
+	def __init__(self):
+		self.rules = {}
+		self.targets = {}
+
+	def put_rule(self, Name, ScheduleExpression):
+		self.rules[Name] = ScheduleExpression
+		return { "RuleArn": "arn:aws:events:us-east-1:123456789012:rule/" + Name }
+
+	def put_targets(self, Rule, Targets):
+		self.targets[Rule] = Targets
+
+	def remove_targets(self, Rule, Ids):
+		if Rule not in self.rules:
+			raise ClientError({ "Error": { "Code": "ResourceNotFoundException", "Message": "" } }, "RemoveTargets")
+		self.targets.pop(Rule, None)
+
+	def delete_rule(self, Name):
+		del self.rules[Name]
+
+class FakeLambda(object):
+	def __init__(self):
+		self.permissions = set()
+		self.invocations = []
+
+	def add_permission(self, StatementId, **kwargs):
+		self.permissions.add(StatementId)
+
+	def remove_permission(self, FunctionName, StatementId):
+		if StatementId not in self.permissions:
+			raise ClientError({ "Error": { "Code": "ResourceNotFoundException", "Message": "" } }, "RemovePermission")
+		self.permissions.remove(StatementId)
+
+	def invoke(self, FunctionName, InvocationType, Payload):
+		self.invocations.append(json.loads(Payload))
+
+@pytest.fixture
+def clients(monkeypatch):
+	def install(statuses, mode = "schedule"):
+		fakes = (FakeSageMaker(statuses), FakeEvents(), FakeLambda())
+		monkeypatch.setattr(domain, "sm", fakes[0])
+		monkeypatch.setattr(domain, "events", fakes[1])
+		monkeypatch.setattr(domain, "lambda_client", fakes[2])
+		monkeypatch.setattr(domain, "CONTINUATION_MODE", mode)
+		return fakes
+	return install
+
+def create_event():
+	return {
+		"RequestType": "Create",
+		"RequestId": "request-1",
+		"ResourceProperties": { "SubnetIds": ["subnet-1"], "VpcId": "vpc-1", "DefaultExecutionRole": "arn:aws:iam::123456789012:role/Default" }
+	}
+
+def test_default_mode_is_schedule():
+	assert domain.CONTINUATION_MODE == "schedule"
+
+def test_create_in_service(clients, context, responses):
+	clients(["InService"])
+	domain.handler(create_event(), context)
+	assert [r["Status"] for r in responses] == ["SUCCESS"]
+	assert responses[0]["Data"] == { "DomainId": "d-example" }
+
+def test_schedule_continuation(clients, context, responses):
+	sm, events, lambda_client = clients(["Pending", "Pending", "InService"])
+	domain.handler(create_event(), context)
+
+	# The first invocation checks once, without sleeping, and leaves the rest to the rule.
+	assert responses == []
+	assert context.remaining_millis == 900000
+	assert events.rules == { "sagemaker-domain-request-1": domain.CONTINUATION_SCHEDULE }
+	assert lambda_client.permissions == { "sagemaker-domain-request-1" }
+	scheduled_event = json.loads(events.targets["sagemaker-domain-request-1"][0]["Input"])
+
+	# A fire while the domain is pending neither responds nor adds rules.
+	domain.handler(copy.deepcopy(scheduled_event), context)
+	assert responses == []
+	assert len(events.rules) == 1
+
+	domain.handler(copy.deepcopy(scheduled_event), context)
+	assert [r["Status"] for r in responses] == ["SUCCESS"]
+	assert events.rules == {} and events.targets == {} and lambda_client.permissions == set()
+
+	# A duplicate delivery of the fire does not send a second response.
+	domain.handler(copy.deepcopy(scheduled_event), context)
+	assert len(responses) == 1
+
+def test_schedule_failure(clients, context, responses):
+	sm, events, lambda_client = clients(["Pending", "Failed"])
+	domain.handler(create_event(), context)
+	scheduled_event = json.loads(events.targets["sagemaker-domain-request-1"][0]["Input"])
+	domain.handler(scheduled_event, context)
+	assert [r["Status"] for r in responses] == ["FAILED"]
+	assert events.rules == {}
+
+def test_schedule_deadline(clients, context, responses):
+	sm, events, lambda_client = clients(["Pending"])
+	domain.handler(create_event(), context)
+	scheduled_event = json.loads(events.targets["sagemaker-domain-request-1"][0]["Input"])
+	scheduled_event["Continuation"]["Deadline"] = 0
+	domain.handler(scheduled_event, context)
+	assert [r["Status"] for r in responses] == ["FAILED"]
+	assert events.rules == {}
+
+def test_reinvoke_continuation(clients, context, responses, monkeypatch):
+	monkeypatch.setattr(domain, "wait_for_status", functools.partial(domain.wait_for_status, sleep = context.sleep))
+	sm, events, lambda_client = clients(["Pending"] * 8 + ["InService"], mode = "reinvoke")
+	context.remaining_millis = 30000
+	domain.handler(create_event(), context)
+
+	# Polls until the invocation is about to time out, then invokes the function again.
+	assert responses == []
+	assert len(lambda_client.invocations) == 1
+	assert events.rules == {}
+
+	context.remaining_millis = 900000
+	domain.handler(lambda_client.invocations[0], context)
+	assert [r["Status"] for r in responses] == ["SUCCESS"]
+
+def fail(operation):
+	def call(**kwargs):
+		raise ClientError({ "Error": { "Code": "AccessDeniedException", "Message": "not allowed" } }, operation)
+	return call
+
+@pytest.mark.parametrize("client, method", [(1, "put_rule"), (2, "add_permission"), (1, "put_targets")])
+def test_schedule_error_fails_the_resource(clients, context, responses, client, method):
+	fakes = clients(["Pending"])
+	setattr(fakes[client], method, fail(method))
+	domain.handler(create_event(), context)
+	assert [r["Status"] for r in responses] == ["FAILED"]
+	assert "not allowed" in responses[0]["Reason"]
+	assert fakes[1].rules == {} and fakes[1].targets == {} and fakes[2].permissions == set()
+
+def test_reinvoke_error_fails_the_resource(clients, context, responses, monkeypatch):
+	monkeypatch.setattr(domain, "wait_for_status", functools.partial(domain.wait_for_status, sleep = context.sleep))
+	sm, events, lambda_client = clients(["Pending"], mode = "reinvoke")
+	lambda_client.invoke = fail("Invoke")
+	context.remaining_millis = 30000
+	domain.handler(create_event(), context)
+	assert [r["Status"] for r in responses] == ["FAILED"]
+	assert "not allowed" in responses[0]["Reason"]
@@ -0,0 +1,123 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+import sagemaker_studio_profile_batch as batch
+
+def client_error(code):
+	return ClientError({ "Error": { "Code": code, "Message": code } }, "UserProfile")
+
+class FakeSageMaker(object):
+	"""User profiles of one domain; operations on names in fail raise fail[name]."""
+
+	def __init__(self, profiles = (), fail = None):
+		self.profiles = { name: "InService" for name in profiles }
+		self.fail = fail or {}
+		self.lock = threading.Lock()
+
+	def check(self, name):
+		if name in self.fail:
+			raise self.fail[name]
+
+	def create_user_profile(self, DomainId, UserProfileName, Tags, UserSettings):
+		self.check(UserProfileName)
+		with self.lock:
+			if UserProfileName in self.profiles:
+				raise client_error("ResourceInUse")
+			self.profiles[UserProfileName] = "InService"
+		return { "UserProfileArn": "arn:" + UserProfileName }
+
+	def update_user_profile(self, DomainId, UserProfileName, UserSettings):
+		self.check(UserProfileName)
+		if UserProfileName not in self.profiles:
+			raise client_error("ResourceNotFound")
+		return { "UserProfileArn": "arn:" + UserProfileName }
+
+	def add_tags(self, ResourceArn, Tags):
+		pass
+
+	def delete_user_profile(self, DomainId, UserProfileName):
+		self.check(UserProfileName)
+		with self.lock:
+			if UserProfileName not in self.profiles:
+				raise client_error("ResourceNotFound")
+			del self.profiles[UserProfileName]
+
+	def describe_user_profile(self, DomainId, UserProfileName):
+		raise client_error("ResourceNotFound")
+
+@pytest.fixture
+def sagemaker(monkeypatch):
+	def install(*args, **kwargs):
+		fake = FakeSageMaker(*args, **kwargs)
+		monkeypatch.setattr(batch, "client", fake)
+		monkeypatch.setattr(batch, "rate_limiter", batch.RateLimiter(1000))
+		return fake
+	return install
+
+def profile(name):
+	return { "UserProfileName": name, "StudioUserId": name, "ExecutionRole": "arn:aws:iam::123456789012:role/SageMakerStudio_" + name }
+
+def event(request_type, names, domain_id = "d-1", old_names = None, old_domain_id = "d-1"):
+	event = {
+		"RequestType": request_type,
+		"ResourceProperties": { "DomainId": domain_id, "UserProfiles": [profile(n) for n in names] }
+	}
+	if request_type != "Create":
+		event["PhysicalResourceId"] = "d-1/user-profiles"
+	if request_type == "Update":
+		event["OldResourceProperties"] = { "DomainId": old_domain_id, "UserProfiles": [profile(n) for n in old_names] }
+	return event
+
+def test_create(sagemaker, context, responses):
+	fake = sagemaker()
+	batch.handler(event("Create", ["a", "b", "c"]), context)
+	assert sorted(fake.profiles) == ["a", "b", "c"]
+	assert responses[0]["Status"] == "SUCCESS"
+	assert responses[0]["PhysicalResourceId"] == "d-1/user-profiles"
+	assert responses[0]["Data"]["Succeeded"] == 3
+
+def test_create_adopts_existing_profiles(sagemaker, context, responses):
+	fake = sagemaker(profiles = ["a"])
+	batch.handler(event("Create", ["a", "b"]), context)
+	assert sorted(fake.profiles) == ["a", "b"]
+	assert responses[0]["Status"] == "SUCCESS"
+
+def test_update(sagemaker, context, responses):
+	fake = sagemaker(profiles = ["a", "b"])
+	batch.handler(event("Update", ["b", "c"], old_names = ["a", "b"]), context)
+	assert sorted(fake.profiles) == ["b", "c"]
+	assert responses[0]["Status"] == "SUCCESS"
+	assert responses[0]["PhysicalResourceId"] == "d-1/user-profiles"
+
+def test_update_to_another_domain_replaces_the_resource(sagemaker, context, responses):
+	sagemaker()
+	batch.handler(event("Update", ["a"], domain_id = "d-2", old_names = ["a"]), context)
+	assert responses[0]["PhysicalResourceId"] == "d-2/user-profiles"
+
+def test_delete(sagemaker, context, responses):
+	fake = sagemaker(profiles = ["a", "b"])
+	batch.handler(event("Delete", ["a", "b", "c"]), context)
+	assert fake.profiles == {}
+	assert responses[0]["Status"] == "SUCCESS"
+	assert responses[0]["PhysicalResourceId"] == "d-1/user-profiles"
+
+def test_failed_profiles(sagemaker, context, responses):
+	sagemaker(fail = { "b": client_error("ValidationException"), "c": KeyError("UserProfileArn") })
+	batch.handler(event("Create", ["a", "b", "c"]), context)
+	assert responses[0]["Status"] == "FAILED"
+	assert responses[0]["Data"]["FailedUserProfiles"] == "b,c"
+
+def test_unexpected_errors_fail_the_resource(sagemaker, context, responses):
+	sagemaker()
+	batch.handler({ "RequestType": "Create", "ResourceProperties": { "DomainId": "d-1" } }, context)
+	assert [r["Status"] for r in responses] == ["FAILED"]
+
+def test_unknown_request_type(sagemaker, context, responses):
+	sagemaker()
+	batch.handler({ "RequestType": "Other", "ResourceProperties": {} }, context)
+	assert [r["Status"] for r in responses] == ["FAILED"]
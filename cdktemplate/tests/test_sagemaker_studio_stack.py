@@ -0,0 +1,66 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+pytest.importorskip("aws_cdk.core")
+
+from sagemaker_studio_audit_control.config import AuditControlConfig
+from sagemaker_studio_audit_control.sagemaker_studio_stack import SageMakerStudioStack
+from sagemaker_studio_audit_control.sharding import synth_template
+from sagemaker_studio_audit_control.user_manifest import load_user_manifest
+
+def synth(**kwargs):
+	return synth_template(lambda app: SageMakerStudioStack(app, "sagemaker-studio-stack", users = load_user_manifest(), **kwargs))
+
+def resources(template, resource_type):
+	return { name: r for name, r in template["Resources"].items() if r["Type"] == resource_type }
+
+def actions(template):
+	granted = set()
+	for policy in resources(template, "AWS::IAM::Policy").values():
+		for statement in policy["Properties"]["PolicyDocument"]["Statement"]:
+			granted.update(statement["Action"] if isinstance(statement["Action"], list) else [statement["Action"]])
+	for role in resources(template, "AWS::IAM::Role").values():
+		for policy in role["Properties"].get("Policies", []):
+			for statement in policy["PolicyDocument"]["Statement"]:
+				granted.update(statement["Action"] if isinstance(statement["Action"], list) else [statement["Action"]])
+	return granted
+
+def test_native_domain():
+	template = synth()
+	assert list(resources(template, "AWS::SageMaker::Domain")) == ["SageMakerDomain"]
+	assert resources(template, "Custom::SageMakerDomain") == {}
+
+def test_lambda_domain_permissions():
+	template = synth(config = AuditControlConfig(domain_resource = "lambda"))
+	assert resources(template, "AWS::SageMaker::Domain") == {}
+	assert list(resources(template, "Custom::SageMakerDomain")) == ["SageMakerDomain"]
+
+	function = [f for name, f in resources(template, "AWS::Lambda::Function").items() if name.startswith("SageMakerDomainFunction")][0]
+	assert function["Properties"]["Environment"]["Variables"]["CONTINUATION_MODE"] == "schedule"
+	assert "def wait_for_status" in function["Properties"]["Code"]["ZipFile"]
+	assert {
+		"sagemaker:CreateDomain", "sagemaker:DescribeDomain", "sagemaker:DeleteDomain", "sagemaker:ListDomains", "iam:PassRole",
+		"events:PutRule", "events:PutTargets", "events:RemoveTargets", "events:DeleteRule",
+		"lambda:InvokeFunction", "lambda:AddPermission", "lambda:RemovePermission"
+	} <= actions(template)
+
+def test_unknown_domain_resource():
+	with pytest.raises(ValueError):
+		AuditControlConfig(domain_resource = "other")
+
+def test_user_profiles_custom_resource():
+	template = synth()
+	assert resources(template, "AWS::SageMaker::UserProfile") == {}
+	profiles = resources(template, "Custom::SageMakerUserProfiles")["SageMakerUserProfiles"]
+	assert len(profiles["Properties"]["UserProfiles"]) == len(load_user_manifest())
+	assert "SageMakerDomain" in profiles["DependsOn"]
+	assert {"sagemaker:CreateUserProfile", "sagemaker:DeleteUserProfile", "iam:PassRole"} <= actions(template)
+
+def test_retain_legacy_user_profiles():
+	template = synth(config = AuditControlConfig(retain_legacy_resources = True))
+	legacy = resources(template, "AWS::SageMaker::UserProfile")
+	assert len(legacy) == len(load_user_manifest())
+	assert all(r["DeletionPolicy"] == "Retain" for r in legacy.values())
+	assert set(legacy) <= set(resources(template, "Custom::SageMakerUserProfiles")["SageMakerUserProfiles"]["DependsOn"])
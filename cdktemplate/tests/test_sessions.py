@@ -0,0 +1,129 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import copy
+
+from sagemaker_studio_audit_control.audit import cloudtrail
+from sagemaker_studio_audit_control.audit.correlation import Correlator, correlate
+from sagemaker_studio_audit_control.audit.sessions import CREATE_APP, SESSION_GAP, Sessionizer, sessionize
+
+def event_times(session):
+	return sorted(cloudtrail.parse_event_time(e["eventTime"]) for e in session.logins + session.apps) + \
+		sorted(cloudtrail.parse_event_time(a.access_time) for a in session.accesses)
+
+def test_every_access_is_in_one_session(trail_records):
+	sessions = sessionize(trail_records)
+	accesses = [a.access_event_id for s in sessions for a in s.accesses]
+	assert len(accesses) == len(set(accesses))
+	assert set(accesses) == { r.access_event_id for r in correlate(trail_records, emit_unmatched = True) }
+
+def test_sessions_start_with_a_login(trail_records):
+	sessions = sessionize(trail_records)
+	assert sessions
+	for session in sessions:
+		assert session.logins
+		assert session.start == min(event_times(session))
+		assert session.end == max(event_times(session))
+		assert all(a.user_name == session.user_profile_name for a in session.accesses)
+
+def test_sessions_are_split_at_gaps(trail_records):
+	sessions = sessionize(trail_records)
+	by_profile = {}
+	for session in sessions:
+		by_profile.setdefault(session.user_profile_name, []).append(session)
+	for profile_sessions in by_profile.values():
+		for previous, session in zip(profile_sessions, profile_sessions[1:]):
+			assert session.start - previous.end > SESSION_GAP
+	for session in sessions:
+		times = sorted(event_times(session))
+		assert all(b - a <= SESSION_GAP for a, b in zip(times, times[1:]))
+
+def test_shared_role_accesses_follow_the_session(trail_records):
+	# A second profile launches apps with the role of the first one, hours later: the accesses
+	# of the role go to the session of the profile active at their time.
+	app = next(r for r in trail_records if r.get("eventName") == CREATE_APP)
+	access = next(correlate(trail_records))
+	role = cloudtrail.role_name(cloudtrail.principal_arn(app))
+	access = access._replace(role_name = role)
+	later = cloudtrail.parse_event_time(app["eventTime"]) + 6 * 3600
+
+	shared_app = copy.deepcopy(app)
+	shared_app["eventID"] = "shared-app"
+	shared_app["eventTime"] = cloudtrail.format_event_time(later)
+	shared_app["requestParameters"]["userProfileName"] = "shared"
+
+	sessionizer = Sessionizer()
+	sessionizer.add_event(app)
+	sessionizer.add_event(shared_app)
+	sessionizer.add_access(access._replace(access_event_id = "early", access_time = app["eventTime"]))
+	sessionizer.add_access(access._replace(access_event_id = "late", access_time = cloudtrail.format_event_time(later + 60)))
+	sessions = { s.user_profile_name: s for s in sessionizer.sessions() }
+	assert [a.access_event_id for a in sessions[app["requestParameters"]["userProfileName"]].accesses] == ["early"]
+	assert [a.access_event_id for a in sessions["shared"].accesses] == ["late"]
+
+def sessionizer_of(trail_records, sessionizer = None):
+	sessionizer = sessionizer or Sessionizer()
+	for record in trail_records:
+		sessionizer.add_event(record)
+	for access in correlate(trail_records, emit_unmatched = True):
+		sessionizer.add_access(access)
+	return sessionizer
+
+def summary(sessions):
+	return [(s.session_id, len(s.logins), len(s.apps), [a.access_event_id for a in s.accesses]) for s in sessions]
+
+def test_sessions_can_be_read_again(trail_records):
+	half = len(trail_records) // 2
+	sessionizer = Sessionizer()
+	for record in trail_records[:half]:
+		sessionizer.add_event(record)
+	first = summary(sessionizer.sessions())
+	assert first
+	assert summary(sessionizer.sessions()) == first
+
+	# Events added after a read are sessionized with the earlier ones.
+	sessionizer_of(trail_records[half:], sessionizer)
+	for access in correlate(trail_records[:half], emit_unmatched = True):
+		sessionizer.add_access(access)
+	assert summary(sessionizer.sessions()) == summary(sessionize(trail_records))
+
+def test_accesses_without_profile_are_unattributed(trail_records):
+	sessionizer = sessionizer_of(trail_records)
+	access = next(correlate(trail_records))
+	orphan = access._replace(access_event_id = "orphan", role_name = "AnalyticsJobRole", user_name = None)
+	sessionizer.add_access(orphan)
+	sessions = sessionizer.sessions()
+	assert "orphan" not in [a.access_event_id for s in sessions for a in s.accesses]
+	assert [a.access_event_id for a in sessionizer.unattributed()] == ["orphan"]
+
+def test_shared_role_accesses_outside_sessions_are_unattributed(trail_records):
+	app = next(r for r in trail_records if r.get("eventName") == CREATE_APP)
+	role = cloudtrail.role_name(cloudtrail.principal_arn(app))
+	shared_app = copy.deepcopy(app)
+	shared_app["eventID"] = "shared-app"
+	shared_app["requestParameters"]["userProfileName"] = "shared"
+
+	sessionizer = Sessionizer()
+	sessionizer.add_event(app)
+	sessionizer.add_event(shared_app)
+	later = cloudtrail.parse_event_time(app["eventTime"]) + 6 * 3600
+	access = next(correlate(trail_records))._replace(role_name = role, access_event_id = "outside",
+		access_time = cloudtrail.format_event_time(later))
+	sessionizer.add_access(access)
+	assert [a.access_event_id for s in sessionizer.sessions() for a in s.accesses] == []
+	assert [a.access_event_id for a in sessionizer.unattributed()] == ["outside"]
+
+def test_seen_event_ids_expire_with_the_watermark(trail_records):
+	# Events and accesses interleaved as sessionize adds them, in the order of the trail.
+	sessionizer = Sessionizer()
+	correlator = Correlator(emit_unmatched = True)
+	for record in trail_records:
+		sessionizer.add_event(record)
+		for access in correlator.add(record):
+			sessionizer.add_access(access)
+	for access in correlator.flush():
+		sessionizer.add_access(access)
+	ids = { r["eventID"] for r in trail_records if r.get("eventSource") == cloudtrail.SAGEMAKER_SOURCE }
+	ids |= { a.access_event_id for a in correlate(trail_records, emit_unmatched = True) }
+	assert 0 < len(sessionizer.seen) < len(ids) / 4
+	assert all(expiry >= sessionizer.watermark - sessionizer.window for expiry in sessionizer.seen.values())
@@ -0,0 +1,48 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+pytest.importorskip("aws_cdk.core")
+
+from sagemaker_studio_audit_control.data_scientist_users_stack import DataScientistUsersStack
+from sagemaker_studio_audit_control.sagemaker_studio_stack import SageMakerStudioStack
+from sagemaker_studio_audit_control.sharding import (
+	MAX_TEMPLATE_RESOURCES, MAX_TEMPLATE_SIZE, PROFILES_PER_TEMPLATE, USERS_PER_TEMPLATE,
+	measure_template, plan_shards, shard, synth_template
+)
+from sagemaker_studio_audit_control.user_manifest import DataScientistUser
+from sagemaker_studio_audit_control.amazon_reviews_schema import AMAZON_REVIEWS_COLUMNS
+
+def test_shard():
+	assert shard([], 2) == [[]]
+	assert shard([1, 2, 3], 2) == [[1, 2], [3]]
+
+def test_small_manifests_are_not_measured():
+	def build_stack(app, items):
+		raise AssertionError("synthesized")
+	assert plan_shards(list(range(10)), build_stack, 0, 10) == [list(range(10))]
+	assert plan_shards([], build_stack, None, 10) == [[]]
+
+def test_large_manifests_are_measured():
+	from aws_cdk import core
+	def build_stack(app, items):
+		stack = core.Stack(app, "stack")
+		for item in items:
+			core.CfnWaitConditionHandle(stack, "Handle%d" % item)
+		return stack
+	shards = plan_shards(list(range(1000)), build_stack, 0, 10)
+	assert [len(s) for s in shards] == [450, 450, 100]
+
+def widest_users(count):
+	"""count users granted every column, the most expensive kind."""
+	return [DataScientistUser(i + 1, name = "data-scientist-%d" % i, description = "data scientist %d" % i, access = "columns",
+		columns = [c["name"] for c in AMAZON_REVIEWS_COLUMNS]) for i in range(count)]
+
+@pytest.mark.parametrize("stack_class, static_capacity", [
+	(DataScientistUsersStack, USERS_PER_TEMPLATE),
+	(SageMakerStudioStack, PROFILES_PER_TEMPLATE)
+])
+def test_static_capacity_fits(stack_class, static_capacity):
+	size = measure_template(synth_template(lambda app: stack_class(app, "stack", users = widest_users(static_capacity))))
+	assert size.resources <= MAX_TEMPLATE_RESOURCES and size.size <= MAX_TEMPLATE_SIZE
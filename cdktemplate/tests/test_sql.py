@@ -0,0 +1,47 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from sagemaker_studio_audit_control.amazon_reviews_schema import amazon_reviews_column_names
+from sagemaker_studio_audit_control.audit.sql import ColumnExtractor, TableSchemas, default_schemas, fingerprint, parse
+
+TABLE = ("amazon_reviews_db", "amazon_reviews_parquet")
+
+def columns(query):
+	return set(parse(query, TableSchemas(default_schemas())).columns)
+
+def test_star_expands_the_schema():
+	assert columns("SELECT * FROM amazon_reviews_db.amazon_reviews_parquet") == { TABLE + (c,) for c in amazon_reviews_column_names() }
+
+def test_star_over_a_subquery():
+	assert columns("SELECT * FROM (SELECT vine FROM amazon_reviews_db.amazon_reviews_parquet) s") == { TABLE + ("vine",) }
+
+def test_star_over_a_cte():
+	assert columns("WITH t AS (SELECT vine FROM amazon_reviews_db.amazon_reviews_parquet) SELECT * FROM t") == { TABLE + ("vine",) }
+
+def test_star_over_nested_subqueries():
+	query = "SELECT * FROM (SELECT * FROM (SELECT vine, star_rating FROM amazon_reviews_db.amazon_reviews_parquet) a) b"
+	assert columns(query) == { TABLE + ("star_rating",), TABLE + ("vine",) }
+
+def test_qualified_star_over_a_subquery():
+	query = "SELECT s.* FROM (SELECT vine FROM amazon_reviews_db.amazon_reviews_parquet) s JOIN other o ON s.vine = o.vine"
+	assert TABLE + ("vine",) in columns(query)
+	assert (None, "other", "*") not in columns(query)
+
+def test_star_of_each_set_operand():
+	query = "SELECT vine FROM amazon_reviews_db.amazon_reviews_parquet UNION SELECT * FROM other"
+	assert columns(query) == { (None, "other", "*"), TABLE + ("vine",) }
+
+def test_star_over_a_subquery_of_an_unknown_table():
+	assert columns("SELECT * FROM (SELECT a FROM other) s") == { (None, "other", "a") }
+
+def test_count_star_reads_no_column():
+	assert columns("SELECT count(*) FROM amazon_reviews_db.amazon_reviews_parquet") == set()
+
+def test_fingerprint_ignores_literals_and_formatting():
+	assert fingerprint("select VINE from t where x = 'a'") == fingerprint("SELECT vine\n FROM t -- c\n WHERE x = 'b'")
+
+def test_extractor_parses_each_fingerprint_once():
+	extractor = ColumnExtractor()
+	for rating in range(5):
+		assert extractor.columns("SELECT vine FROM amazon_reviews_parquet WHERE star_rating = %d" % rating, *TABLE) == ["star_rating", "vine"]
+	assert extractor.cache_info()["Parse"].misses == 1
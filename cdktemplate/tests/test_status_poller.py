@@ -0,0 +1,75 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+from botocore.exceptions import ClientError
+
+from status_poller import MAX_DELAY, PollTimeout, next_delay, wait_for_status
+
+def client_error(code):
+	return ClientError({"Error": {"Code": code, "Message": code}}, "Describe")
+
+def describer(*results):
+	"""describe() returning (or raising) results in order, then the last one forever."""
+	results = list(results)
+	def describe():
+		result = results.pop(0) if len(results) > 1 else results[0]
+		if isinstance(result, Exception):
+			raise result
+		return result
+	return describe
+
+def upper(low, high):
+	return high
+
+def test_next_delay_backs_off_and_caps():
+	assert [next_delay(a, upper) for a in range(7)] == [1, 2, 4, 8, 16, MAX_DELAY, MAX_DELAY]
+	assert next_delay(3, lambda low, high: low) == 4
+
+def test_returns_success_without_sleeping(context):
+	sleeps = []
+	assert wait_for_status(describer("InService"), context, ["InService"], ["Pending"], sleep = sleeps.append) == "InService"
+	assert sleeps == []
+
+def test_waits_through_pending_states(context):
+	sleeps = []
+	describe = describer("Pending", "Pending", "Updating", "InService")
+	status = wait_for_status(describe, context, ["InService"], ["Pending", "Updating"], sleep = sleeps.append, rand = upper)
+	assert status == "InService"
+	assert sleeps == [1, 2, 4]
+
+def test_returns_failure_states(context):
+	assert wait_for_status(describer("Pending", "Failed"), context, ["InService"], ["Pending"],
+		sleep = context.sleep, rand = upper) == "Failed"
+
+def test_retries_throttling(context):
+	sleeps = []
+	describe = describer(client_error("ThrottlingException"), client_error("TooManyRequestsException"), "InService")
+	assert wait_for_status(describe, context, ["InService"], ["Pending"], sleep = sleeps.append, rand = upper) == "InService"
+	assert sleeps == [1, 2]
+
+def test_raises_other_errors(context):
+	with pytest.raises(ClientError):
+		wait_for_status(describer(client_error("AccessDeniedException")), context, ["InService"], ["Pending"], sleep = context.sleep)
+
+def test_not_found_status(context):
+	describe = describer("Deleting", client_error("ResourceNotFound"))
+	assert wait_for_status(describe, context, ["Deleted"], ["Deleting"], not_found_status = "Deleted",
+		sleep = context.sleep, rand = upper) == "Deleted"
+	with pytest.raises(ClientError):
+		wait_for_status(describer(client_error("ResourceNotFound")), context, ["InService"], ["Pending"], sleep = context.sleep)
+
+def test_max_attempts(context):
+	sleeps = []
+	with pytest.raises(PollTimeout) as e:
+		wait_for_status(describer("Pending"), context, ["InService"], ["Pending"], max_attempts = 3, sleep = sleeps.append, rand = upper)
+	assert e.value.last_status == "Pending"
+	assert sleeps == [1, 2]
+
+def test_stops_before_the_lambda_deadline(context):
+	context.remaining_millis = 60000
+	with pytest.raises(PollTimeout) as e:
+		wait_for_status(describer("Pending"), context, ["InService"], ["Pending"], sleep = context.sleep, rand = upper)
+	assert e.value.last_status == "Pending"
+	# 1 + 2 + 4 + 8 + 16 s slept; the next 30 s wait would leave less than the offset.
+	assert context.remaining_millis == 29000
@@ -0,0 +1,106 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import pyarrow.dataset as ds
+
+import audit
+from sagemaker_studio_audit_control.audit.correlation import correlate
+from sagemaker_studio_audit_control.audit.simulator import TrafficSimulator, parse_date
+from sagemaker_studio_audit_control.audit.sql import ColumnExtractor
+from sagemaker_studio_audit_control.audit.store import OTHER_ROLES, AuditStore
+
+from test_rollups import trail_directory
+
+MONTHS = ["2021-03", "2021-04", "2021-05"]
+LIMITED_ROLE = "SageMakerStudio_data-scientist-limited"
+
+@pytest.fixture(scope = "module")
+def audit_records():
+	"""Audit records of three months of simulated traffic."""
+	simulator = TrafficSimulator(sessions_per_day = 2, queries_per_session = 4, noise_ratio = 0, duplicate_rate = 0.1, seed = 3)
+	start = parse_date("2021-03-01")
+	records = (record for _, record in simulator.events(start, parse_date("2021-06-01")))
+	return list(correlate(records, column_resolver = ColumnExtractor().columns))
+
+@pytest.fixture(scope = "module")
+def store(audit_records, tmp_path_factory):
+	store = AuditStore(str(tmp_path_factory.mktemp("store")))
+	# Several batches, so that a partition holds several files.
+	assert store.write(audit_records, batch_size = 500) == len(audit_records)
+	return store
+
+def stored_files(store):
+	return sorted(os.path.join(root, name) for root, _, names in os.walk(store.path) for name in names)
+
+def test_partitions(store, audit_records):
+	partitions = { os.path.relpath(os.path.dirname(path), store.path) for path in stored_files(store) }
+	assert { p.split(os.sep)[0][len("event_date="):][:7] for p in partitions } == set(MONTHS)
+	assert { p.split(os.sep)[1] for p in partitions } <= { "role=" + LIMITED_ROLE, "role=SageMakerStudio_data-scientist-full", "role=" + OTHER_ROLES }
+	assert store.read().num_rows == len(audit_records)
+
+def test_partition_pruning(store, audit_records):
+	files = store.scanned_files(start_date = "2021-04-01", end_date = "2021-04-30", roles = [LIMITED_ROLE])
+	assert files and len(files) < len(stored_files(store))
+	assert all("event_date=2021-04-" in path and "role=" + LIMITED_ROLE in path for path in files)
+
+	table = store.read(["user_name", "access_time"], start_date = "2021-04-01", end_date = "2021-04-30", roles = [LIMITED_ROLE])
+	expected = [r for r in audit_records if r.access_time.startswith("2021-04") and r.role_name == LIMITED_ROLE]
+	assert table.num_rows == len(expected)
+	assert set(table.column("user_name").to_pylist()) == { "data-scientist-limited" }
+	assert store.last_scan["Files"] == len(files)
+	assert store.last_scan["Rows"] == len(expected)
+
+def test_column_pruning_and_scan_report(store):
+	everything = store.read()
+	full_scan = dict(store.last_scan)
+	assert full_scan["Files"] == len(stored_files(store))
+	# Every column chunk of every file, without the Parquet footers.
+	assert 0 < full_scan["Bytes"] < sum(os.path.getsize(path) for path in stored_files(store))
+	assert full_scan["Seconds"] > 0
+
+	pruned = store.read(["query_id"])
+	assert pruned.column_names == ["query_id"]
+	assert pruned.num_rows == everything.num_rows
+	assert 0 < store.last_scan["Bytes"] < full_scan["Bytes"] / 4
+	assert store.last_scan["Files"] == full_scan["Files"]
+
+	# Partition and column pruning together read a fraction of the bytes.
+	store.read(["query_id"], start_date = "2021-05-01", end_date = "2021-05-01")
+	assert 0 < store.last_scan["Bytes"] < full_scan["Bytes"] / 100
+	assert store.last_scan["Seconds"] > 0
+
+def test_pushed_down_filter(store, audit_records):
+	table = store.read(["query_id", "columns"], start_date = "2021-03-01", end_date = "2021-05-31",
+		expression = ds.field("user_name") == "data-scientist-limited")
+	assert table.num_rows == len([r for r in audit_records if r.user_name == "data-scientist-limited"])
+
+def test_writes_are_idempotent(store, audit_records):
+	files = stored_files(store)
+	assert store.write(audit_records) == 0
+	assert store.write(audit_records[:10] + audit_records[:10], batch_size = 3) == 0
+	assert stored_files(store) == files
+	assert store.read(["access_event_id"]).num_rows == len(audit_records)
+
+def test_duplicates_in_a_batch(audit_records, tmp_path):
+	store = AuditStore(str(tmp_path / "store"))
+	assert store.write(audit_records[:50] + audit_records[:50]) == 50
+	assert store.read().num_rows == 50
+
+def test_ingest_writes_the_store(trail, tmp_path):
+	db = str(tmp_path / "audit.db")
+	store_path = str(tmp_path / "store")
+	audit.main(["--db", db, "ingest", trail_directory(trail), "--processes", "1", "--store", store_path])
+	rows = AuditStore(store_path).read().num_rows
+	assert rows > 0
+
+	# A new manifest ingests the trail again: the store keeps one row per access.
+	os.remove(db)
+	audit.main(["--db", db, "ingest", trail_directory(trail), "--processes", "1", "--store", store_path])
+	table = AuditStore(store_path).read(["access_event_id"])
+	assert table.num_rows == rows == len(set(table.column("access_event_id").to_pylist()))
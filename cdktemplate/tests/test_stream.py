@@ -0,0 +1,105 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import queue
+import time
+
+from sagemaker_studio_audit_control.audit import cloudtrail
+from sagemaker_studio_audit_control.audit.correlation import JOIN_WINDOW, correlate
+from sagemaker_studio_audit_control.audit.reader import read_files
+from sagemaker_studio_audit_control.audit.stream import IDLE_DELAY, FileTailSource, QueueSource, StreamProcessor
+
+class FakeClock(object):
+	"""Wall clock of a replay, starting now."""
+
+	def __init__(self):
+		self.now = time.time()
+
+	def __call__(self):
+		return self.now
+
+def replay(trail, gap, clock = None):
+	"""Replays the trail file by file, with gap seconds of idle ticks between files; returns the processor and its audit records."""
+	clock = clock or FakeClock()
+	records = []
+	processor = StreamProcessor(records.append, clock = clock)
+	for path in trail:
+		for record in read_files([path], processes = 1):
+			clock.now += 0.01
+			processor.process(record)
+		for _ in range(int(gap)):
+			clock.now += 1
+			processor.tick()
+	processor.emit(processor.correlator.flush())
+	return processor, records
+
+def test_replay_joins_as_the_batch(trail, trail_records):
+	_, records = replay(trail, 0)
+	assert sorted(r.access_event_id for r in records) == sorted(r.access_event_id for r in correlate(trail_records))
+
+def test_replay_gaps_do_not_change_the_joins(trail):
+	joined = replay(trail, 0)[0].stats["Joined"]
+	assert joined > 0
+	for gap in [1, IDLE_DELAY // 2, IDLE_DELAY]:
+		processor, _ = replay(trail, gap)
+		assert processor.stats["Joined"] == joined
+		assert processor.stats["Late"] == 0
+
+def test_idle_stream_expires_state(trail):
+	clock = FakeClock()
+	processor = StreamProcessor(lambda record: None, clock = clock)
+	for record in read_files(trail[:len(trail) // 2], processes = 1):
+		processor.process(record)
+	assert processor.correlator.size() > 0
+	clock.now += IDLE_DELAY
+	processor.tick()
+	assert processor.correlator.size() > 0
+	clock.now += JOIN_WINDOW + 1
+	processor.tick()
+	assert processor.correlator.size() == 0
+	assert processor.correlator.watermark == processor.max_event_time + JOIN_WINDOW + 1
+
+def test_duplicates_and_late_records(trail_records):
+	processor = StreamProcessor(lambda record: None, clock = FakeClock())
+	for record in trail_records:
+		processor.process(record)
+	assert processor.stats["Duplicates"] == processor.correlator.duplicates > 0
+	late = dict(trail_records[0], eventID = "late", eventTime = "2021-02-01T00:00:00Z")
+	processor.process(late)
+	assert processor.stats["Late"] == 1
+
+def test_state_is_capped(trail_records):
+	processor = StreamProcessor(lambda record: None, max_state = 3, clock = FakeClock())
+	for record in trail_records:
+		processor.process(record)
+		assert processor.correlator.size() <= 3
+	assert processor.stats["Evicted"] > 0
+
+def test_evicted_counts_the_entries_removed(trail_records):
+	access = next(r for r in trail_records if cloudtrail.is_get_data_access(r))
+	processor = StreamProcessor(lambda record: None, max_state = 2, clock = FakeClock())
+	# Three queries whose accesses share an event time are evicted in one step.
+	for i in range(3):
+		parameters = dict(access["requestParameters"], auditContext = { "additionalAuditContext": "{queryId: q-%d}" % i })
+		processor.process(dict(access, eventID = "e-%d" % i, eventTime = "2021-03-01T00:00:00Z", requestParameters = parameters))
+	assert processor.correlator.size() == 0
+	assert processor.stats["Evicted"] == 3
+
+def test_queue_source(trail_records):
+	records = queue.Queue()
+	for record in trail_records:
+		records.put(record)
+	records.put(None)
+	joined = []
+	StreamProcessor(joined.append).run(QueueSource(records, poll_interval = 0.01))
+	assert len(joined) == len(list(correlate(trail_records)))
+
+def test_file_tail_source(trail_records, tmp_path):
+	path = tmp_path / "events.jsonl"
+	with open(path, "w") as fp:
+		for record in trail_records:
+			fp.write(json.dumps({ "detail-type": "AWS API Call via CloudTrail", "detail": record }) + "\n")
+	source = FileTailSource(str(path), follow = False)
+	assert list(source) == trail_records
+	assert source.offset == path.stat().st_size
@@ -0,0 +1,88 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+
+import pytest
+
+pytest.importorskip("aws_cdk.core")
+
+from aws_cdk import core
+from botocore.exceptions import ClientError
+
+from sagemaker_studio_audit_control.template_assets import PROJECT_DIR, TemplateAssets, input_hash, package_versions, s3_location, source_files
+
+def relative(files):
+	return { os.path.relpath(path, PROJECT_DIR) for path in files }
+
+def test_source_files_cover_all_inputs(tmp_path):
+	manifest = tmp_path / "users.json"
+	manifest.write_text("{}")
+	files = relative(source_files([str(manifest)]))
+	for path in [
+		"app.py",
+		"data_scientist_users.json",
+		"cdk.json",
+		"lambda/sagemaker_studio_profile_batch.py",
+		"sagemaker_studio_audit_control/sagemaker_studio_stack.py",
+		os.path.join("sagemaker_studio_audit_control", "audit", "grants.py"),
+		os.path.join("sagemaker_studio_audit_control", "query", "planner.py")
+	]:
+		assert path in files
+	assert os.path.relpath(str(manifest), PROJECT_DIR) in files
+
+def test_package_versions_change_the_hash():
+	assert "aws-cdk.core" in package_versions()
+	assert input_hash([], { "aws-cdk.core": "1.90.0" }) != input_hash([], { "aws-cdk.core": "1.91.0" })
+
+def build_stack(count):
+	def build(app):
+		stack = core.Stack(app, "stack")
+		for i in range(count):
+			core.CfnWaitConditionHandle(stack, "Handle%d" % i)
+		return stack
+	return build
+
+def test_build_reuses_unchanged_templates(tmp_path):
+	assets = TemplateAssets(str(tmp_path))
+	first = assets.build("Stack", build_stack(1), count = 1)
+	assert (tmp_path / first).exists()
+
+	def fail(app):
+		raise AssertionError("synthesized")
+	assert TemplateAssets(str(tmp_path)).build("Stack", fail, count = 1) == first
+
+	second = TemplateAssets(str(tmp_path)).build("Stack", build_stack(2), count = 2)
+	assert second != first
+
+class FakeS3(object):
+	def __init__(self, keys):
+		self.keys = set(keys)
+		self.uploads = []
+
+	class exceptions(object):
+		ClientError = ClientError
+
+	def head_object(self, Bucket, Key):
+		if Key not in self.keys:
+			raise ClientError({ "Error": { "Code": "404", "Message": "Not Found" } }, "HeadObject")
+
+	def upload_file(self, path, bucket, key):
+		self.uploads.append((bucket, key))
+		self.keys.add(key)
+
+def test_publish_uploads_new_templates(tmp_path):
+	assets = TemplateAssets(str(tmp_path))
+	first = assets.build("First", build_stack(1), count = 1)
+	second = assets.build("Second", build_stack(2), count = 2)
+	s3 = FakeS3(["prefix/" + first])
+	assets.publish("bucket", "prefix/", s3 = s3)
+	assert s3.uploads == [("bucket", "prefix/" + second)]
+
+def test_s3_location():
+	assert s3_location("https://aws-ml-blog.s3.amazonaws.com/artifacts/sagemaker-studio-audit-control/") == \
+		("aws-ml-blog", "artifacts/sagemaker-studio-audit-control/")
+	assert s3_location("https://my-bucket.s3.eu-west-1.amazonaws.com/templates/") == ("my-bucket", "templates/")
+	assert s3_location("https://s3.amazonaws.com/my-bucket/templates/") == ("my-bucket", "templates/")
+	with pytest.raises(ValueError):
+		s3_location("https://example.com/templates/")
@@ -0,0 +1,178 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import io
+import os
+import random
+import re
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as fs
+import pyarrow.parquet as pq
+
+from sagemaker_studio_audit_control.query.athena import AthenaClient
+from sagemaker_studio_audit_control.query import unload
+
+from test_query_cache import FakeSts
+
+ROWS = 1000
+ROW_GROUP_SIZE = 300
+UNLOAD_PATTERN = re.compile(r"^UNLOAD \((.*)\) TO '((?:[^']|'')*)' WITH \(format = 'PARQUET', compression = 'SNAPPY'\)$", re.DOTALL)
+
+def fixture_table():
+	return pa.table({
+		"product_id": ["P%04d" % i for i in range(ROWS)],
+		"star_rating": [i % 5 + 1 for i in range(ROWS)],
+		# Incompressible text, so that review_body makes most of the bytes of the files.
+		"review_body": [random.Random(i).getrandbits(4000).to_bytes(500, "big").hex() for i in range(ROWS)],
+		"vine": ["Y" if i % 7 == 0 else "N" for i in range(ROWS)]
+	})
+
+class UnloadingAthena(object):
+	"""Athena client that runs an UNLOAD by writing the fixture as Parquet files (without extension, as Athena names them) under its location."""
+
+	def __init__(self):
+		self.queries = []
+		self.locations = []
+
+	def start_query_execution(self, **request):
+		self.queries.append(request["QueryString"])
+		match = UNLOAD_PATTERN.match(request["QueryString"])
+		assert match, request["QueryString"]
+		location = match.group(2).replace("''", "'")
+		os.makedirs(location)
+		table = fixture_table()
+		half = ROWS // 2
+		for part, rows in enumerate([table.slice(0, half), table.slice(half)]):
+			pq.write_table(rows, os.path.join(location, "part-%d" % part), row_group_size = ROW_GROUP_SIZE)
+		self.locations.append(location)
+		return { "QueryExecutionId": "q%d" % len(self.queries) }
+
+	def get_query_execution(self, QueryExecutionId):
+		return { "QueryExecution": { "QueryExecutionId": QueryExecutionId, "StatementType": "DML", "Status": { "State": "SUCCEEDED" } } }
+
+	def get_paginator(self, name):
+		raise AssertionError("Unloaded results are not paged")
+
+@pytest.fixture
+def athena():
+	return UnloadingAthena()
+
+@pytest.fixture
+def client(athena, tmp_path):
+	return AthenaClient(s3_staging_dir = str(tmp_path / "results"), athena = athena, sts = FakeSts(), database = "db")
+
+def test_unload_statement():
+	assert unload.unload_statement("  SELECT product_id FROM t WHERE vine = 'Y';\n", "s3://bucket/unload/it's/") == \
+		"UNLOAD (SELECT product_id FROM t WHERE vine = 'Y') TO 's3://bucket/unload/it''s/' WITH (format = 'PARQUET', compression = 'SNAPPY')"
+	assert unload.unload_statement("with r AS (SELECT 1 AS x) SELECT x FROM r", "s3://b/p/", compression = "GZIP").endswith("compression = 'GZIP')")
+
+@pytest.mark.parametrize("query", ["", "DROP TABLE t", "INSERT INTO t SELECT * FROM u", "SHOW TABLES", "-- only a comment"])
+def test_only_select_queries_are_unloaded(query, client, athena):
+	with pytest.raises(ValueError):
+		unload.unload_statement(query, "s3://bucket/unload/")
+	with pytest.raises(ValueError):
+		client.read_arrow(query)
+	assert athena.queries == []
+
+def test_unload_location():
+	first = unload.unload_location("s3://bucket/queries/")
+	assert re.match(r"^s3://bucket/queries/unload/[0-9a-f]{32}/$", first)
+	assert unload.unload_location("s3://bucket/queries") != first
+
+def test_unload_needs_a_location(athena):
+	with pytest.raises(ValueError):
+		AthenaClient(athena = athena, sts = FakeSts()).unload("SELECT 1")
+
+def test_read_arrow(client, athena, tmp_path):
+	table = client.read_arrow("SELECT * FROM amazon_reviews")
+	assert table.num_rows == ROWS
+	assert sorted(table.to_pylist(), key = lambda r: r["product_id"]) == fixture_table().to_pylist()
+	assert athena.queries == ["UNLOAD (SELECT * FROM amazon_reviews) TO '%s' WITH (format = 'PARQUET', compression = 'SNAPPY')" % athena.locations[0]]
+	assert athena.locations[0].startswith(str(tmp_path / "results" / "unload") + os.sep)
+
+class CountingHandler(fs.FileSystemHandler):
+	"""Read-only local file system counting the bytes read from the files."""
+
+	def __init__(self):
+		self.local = fs.LocalFileSystem()
+		self.bytes_read = 0
+
+	def get_type_name(self):
+		return "counting"
+
+	def normalize_path(self, path):
+		return self.local.normalize_path(path)
+
+	def get_file_info(self, paths):
+		return self.local.get_file_info(paths)
+
+	def get_file_info_selector(self, selector):
+		return self.local.get_file_info(selector)
+
+	def open_input_file(self, path):
+		handler = self
+
+		class CountingFile(io.FileIO):
+
+			def readinto(self, buffer):
+				count = super().readinto(buffer)
+				handler.bytes_read += count or 0
+				return count
+
+		return pa.PythonFile(io.BufferedReader(CountingFile(path), buffer_size = 1), mode = "r")
+
+	def open_input_stream(self, path):
+		return self.open_input_file(path)
+
+	def read_only(self, *args):
+		raise NotImplementedError("Read-only file system")
+
+	create_dir = delete_dir = delete_dir_contents = delete_root_dir_contents = delete_file = move = copy_file = \
+		open_output_stream = open_append_stream = read_only
+
+def test_columns_are_pruned(client, monkeypatch):
+	handler = CountingHandler()
+	monkeypatch.setattr(unload, "filesystem", lambda location: (fs.PyFileSystem(handler), os.path.abspath(location)))
+	everything = client.read_arrow("SELECT * FROM amazon_reviews")
+	all_columns = handler.bytes_read
+	handler.bytes_read = 0
+	table = client.read_arrow("SELECT * FROM amazon_reviews", columns = ["star_rating", "product_id"])
+	assert table.column_names == ["star_rating", "product_id"]
+	assert table.to_pylist() == everything.select(["star_rating", "product_id"]).to_pylist()
+	# The column chunks of review_body are not read.
+	assert 0 < handler.bytes_read < all_columns / 4
+
+def test_iter_batches(client, athena):
+	batches = list(client.iter_batches("SELECT * FROM amazon_reviews", columns = ["product_id", "vine"], batch_size = 128))
+	assert all(batch.schema.names == ["product_id", "vine"] for batch in batches)
+	assert all(0 < batch.num_rows <= 128 for batch in batches)
+	assert sum(batch.num_rows for batch in batches) == ROWS
+	# Batches do not span row groups: each file of 500 rows has row groups of 300 and 200 rows.
+	assert len(batches) == 2 * (3 + 2)
+	assert len(athena.queries) == 1
+
+def test_read_sql_unload(client, athena):
+	pytest.importorskip("pandas")
+	df = client.read_sql("SELECT * FROM amazon_reviews", unload = True, columns = ["product_id", "star_rating"])
+	assert list(df.columns) == ["product_id", "star_rating"]
+	assert len(df) == ROWS
+	assert df["star_rating"].sum() == sum(i % 5 + 1 for i in range(ROWS))
+	assert athena.queries[0].startswith("UNLOAD (SELECT * FROM amazon_reviews) TO ")
+
+def test_read_local_directory(tmp_path):
+	pq.write_table(fixture_table(), str(tmp_path / "result"), row_group_size = ROW_GROUP_SIZE)
+	filtered = unload.read_table(str(tmp_path), columns = ["product_id"], filter = ds.field("vine") == "Y")
+	assert filtered.column_names == ["product_id"]
+	assert filtered.num_rows == len([i for i in range(ROWS) if i % 7 == 0])
+
+def test_quotes_in_the_location_are_escaped(athena, tmp_path):
+	client = AthenaClient(s3_staging_dir = str(tmp_path / "it's results"), athena = athena, sts = FakeSts())
+	assert client.read_arrow("SELECT product_id FROM amazon_reviews").num_rows == ROWS
+	assert "it''s results" in athena.queries[0]
+	assert "it's results" in athena.locations[0]
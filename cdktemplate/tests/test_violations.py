@@ -0,0 +1,108 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+
+pytest.importorskip("aws_cdk.core")
+
+from sagemaker_studio_audit_control.amazon_reviews_schema import AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE
+from sagemaker_studio_audit_control.audit.correlation import AuditRecord
+from sagemaker_studio_audit_control.audit.grants import Grant, GrantIndex
+from sagemaker_studio_audit_control.audit.violations import COLUMNS_NOT_GRANTED, NO_GRANT, ViolationDetector
+from sagemaker_studio_audit_control.config import ROLE_NAME_PREFIX
+from sagemaker_studio_audit_control.data_scientist_users_stack import DataScientistUsersStack
+from sagemaker_studio_audit_control.sharding import synth_template
+
+FULL_ROLE = ROLE_NAME_PREFIX + "data-scientist-full"
+LIMITED_ROLE = ROLE_NAME_PREFIX + "data-scientist-limited"
+
+@pytest.fixture(scope = "module")
+def grants():
+	index = GrantIndex()
+	index.add_template(synth_template(lambda app: DataScientistUsersStack(app, "data-scientist-users-stack")))
+	return index
+
+@pytest.fixture(scope = "module")
+def detector(grants):
+	return ViolationDetector(grants)
+
+def record(role, columns, database = AMAZON_REVIEWS_DATABASE, table = AMAZON_REVIEWS_TABLE):
+	return AuditRecord(
+		query_id = "q-1",
+		principal_arn = "arn:aws:iam::123456789012:role/" + role,
+		role_name = role,
+		user_name = role[len(ROLE_NAME_PREFIX):],
+		database = database,
+		table = table,
+		columns = tuple(columns),
+		query_string = "SELECT %s FROM %s.%s" % (", ".join(columns), database, table),
+		output_location = None,
+		work_group = "primary",
+		access_time = "2021-03-01T12:00:00Z",
+		query_time = "2021-03-01T11:59:59Z",
+		access_event_id = "e-1",
+		query_event_id = "e-2")
+
+def test_template_grants(grants):
+	assert grants.tables() == { (AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE) }
+	full = grants.get(FULL_ROLE, AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE)
+	limited = grants.get(LIMITED_ROLE, AMAZON_REVIEWS_DATABASE, AMAZON_REVIEWS_TABLE)
+	assert full.allows("customer_id") and full.allows("vine")
+	assert limited.allows("product_title") and not limited.allows("customer_id")
+
+def test_unknown_role_has_no_grant(detector):
+	violation = detector.check(record(ROLE_NAME_PREFIX + "someone-else", ["product_id", "star_rating"]))
+	assert violation.kind == NO_GRANT
+	assert violation.columns == ("product_id", "star_rating")
+
+def test_limited_role_reads_columns_not_granted(detector):
+	violation = detector.check(record(LIMITED_ROLE, ["product_id", "customer_id", "Vine", "star_rating"]))
+	assert violation.kind == COLUMNS_NOT_GRANTED
+	assert violation.columns == ("customer_id", "Vine")
+
+def test_granted_columns(detector):
+	assert detector.check(record(LIMITED_ROLE, ["product_id", "star_rating", "review_body"])) is None
+	assert detector.check(record(FULL_ROLE, ["customer_id", "vine", "product_id", "review_body"])) is None
+
+def test_tables_without_grants_are_ignored(detector):
+	assert detector.check(record(LIMITED_ROLE, ["customer_id"], table = "other_table")) is None
+
+def test_detect(detector):
+	records = [record(FULL_ROLE, ["customer_id"]), record(LIMITED_ROLE, ["vine"]), record("Other", ["vine"])]
+	assert [(v.kind, v.record.role_name) for v in detector.detect(records)] == [(COLUMNS_NOT_GRANTED, LIMITED_ROLE), (NO_GRANT, "Other")]
+
+def test_column_wildcard_template():
+	index = GrantIndex()
+	index.add_template({ "Resources": {
+		"Wildcard": { "Type": "AWS::LakeFormation::Permissions", "Properties": {
+			"DataLakePrincipal": { "DataLakePrincipalIdentifier": "arn:aws:iam::123456789012:role/Analyst" },
+			"Resource": { "TableWithColumnsResource": { "DatabaseName": "db", "Name": "t",
+				"ColumnWildcard": { "ExcludedColumnNames": ["Customer_Id"] } } },
+			"Permissions": ["SELECT"] } },
+		"Describe": { "Type": "AWS::LakeFormation::Permissions", "Properties": {
+			"DataLakePrincipal": { "DataLakePrincipalIdentifier": "arn:aws:iam::123456789012:role/Other" },
+			"Resource": { "TableResource": { "DatabaseName": "db", "Name": "t" } },
+			"Permissions": ["DESCRIBE"] } }
+	} })
+	assert index.get("Analyst", "db", "t") == Grant(None, frozenset(["customer_id"]))
+	assert index.get("Other", "db", "t") is None
+	violation = ViolationDetector(index).check(record("Analyst", ["product_id", "customer_id"], database = "db", table = "t"))
+	assert violation.kind == COLUMNS_NOT_GRANTED and violation.columns == ("customer_id",)
+
+@pytest.mark.parametrize("first, second, merged", [
+	(Grant(frozenset(["a"]), frozenset()), Grant(frozenset(["b"]), frozenset()), Grant(frozenset(["a", "b"]), frozenset())),
+	(Grant(None, frozenset(["a", "b"])), Grant(None, frozenset(["b", "c"])), Grant(None, frozenset(["b"]))),
+	(Grant(None, frozenset(["a", "b"])), Grant(frozenset(["a"]), frozenset()), Grant(None, frozenset(["b"]))),
+	(Grant(frozenset(["a"]), frozenset()), Grant(None, frozenset(["a", "b"])), Grant(None, frozenset(["b"])))
+])
+def test_grant_merge(first, second, merged):
+	assert first.merge(second) == merged
+	assert second.merge(first) == merged
+
+def test_grants_of_a_principal_are_merged():
+	index = GrantIndex()
+	index.add("Analyst", "db", "t", ["A", "b"])
+	index.add("Analyst", "db", "t", None, ["B", "c"])
+	grant = index.get("Analyst", "db", "t")
+	assert grant == Grant(None, frozenset(["c"]))
+	assert grant.allows("a") and grant.allows("b") and not grant.allows("c")